@@ -1,33 +1,112 @@
 import logging
 import json
 from kafka import KafkaConsumer
-from aiokafka import AIOKafkaConsumer
+from aiokafka import AIOKafkaConsumer, AIOKafkaProducer, ConsumerRebalanceListener
+from aiokafka.coordinator.assignors.range import RangePartitionAssignor
+from aiokafka.coordinator.assignors.roundrobin import RoundRobinPartitionAssignor
 
 # Import necessary services and utilities
-from app.services.db_service import save_transaction_to_db
-from app.services.fraud_detection_service import load_fraud_model
-from app.utils.preprocessing import preprocess_transaction
-from app.utils.config import KAFKA_BROKER, POSTGRES_USER
-from prometheus_client import Counter, Gauge, start_http_server
+from app.services.db_service import (
+    save_transactions_batch,
+    build_transaction,
+    get_committed_offsets,
+    transaction_exists,
+    recent_idempotency_keys,
+    recent_user_activity,
+)
+from app.services.fraud_detection_service import get_fraud_model, warm_up_model
+from app.services.rule_engine import load_rule_set, FRAUD, UNDECIDED
+from app.utils.preprocessing import preprocess_transactions, FREQUENCY_WINDOW
+from app.utils.schemas import TransactionSchema, parse_transaction_time
+from app.consumers.retry_lanes import FailureRouter, retry_topics, not_before_of
+from app.utils.config import (
+    KAFKA_BROKER,
+    KAFKA_TOPIC,
+    KAFKA_CONSUMER_GROUP,
+    CONSUMER_BATCH_SIZE,
+    CONSUMER_POLL_TIMEOUT_MS,
+    CONSUMER_RETRY_BACKOFF_SECONDS,
+    CONSUMER_LAG_INTERVAL_SECONDS,
+    USER_ACTIVITY_ENABLED,
+    USER_ACTIVITY_PRUNE_SECONDS,
+    RETRY_LANES_ENABLED,
+    KAFKA_RETRY_GROUP,
+    RATE_LIMIT_OVERFLOW,
+    KAFKA_LOW_PRIORITY_TOPIC,
+)
+from prometheus_client import Counter, Gauge
 import time
+from datetime import datetime
 import asyncio  # Import asyncio for async handling
-from app.utils.websocket_manager import notify_clients  # WebSocket client notification utility
-from app.utils.logging_config import setup_logging
+import numpy as np
+from app.utils.event_bus import get_event_bus  # Broadcasts scored transactions to the WebSocket fan-out
+from app.utils.dedup import DuplicateCache, compute_idempotency_key
+from app.utils.user_activity import UserActivityStore
+from app.utils.response_cache import DATA_VERSION_KEY, bump_data_version
+from app.utils.offload import offload
+from app.utils.tracing import TRACE_KEY, trace_from_headers, record_persisted
+from app.utils.logging_config import setup_logging, PER_TRANSACTION
 
 # Initialize logging at the start of the application
 setup_logging()
 logger = logging.getLogger(__name__)
 
-# Load the trained fraud detection model and scaler into memory
-fraud_model, scaler = load_fraud_model()
-
-# Start Prometheus metrics server on port 8001
-start_http_server(8001)
+# Scoring state, populated by `bootstrap_consumer` so importing this module has no side effects
+fraud_model = None  # The trained fraud detection model
+fraud_rules = None  # The rule stage that decides clear-cut transactions ahead of the model
+duplicate_cache = None  # Recently processed idempotency keys, used to skip redelivered messages before scoring
+user_activity = None  # Recent transactions of the users of the assigned partitions, while `consume_transactions` runs
 
 # Define Prometheus metrics for monitoring transaction processing
 transactions_processed = Counter('transactions_processed_total', 'Total number of transactions processed')
 fraudulent_transactions = Counter('fraudulent_transactions_total', 'Total number of fraudulent transactions')
-transaction_processing_time = Gauge('transaction_processing_time', 'Time taken to process a transaction')
+transaction_processing_time = Gauge('transaction_processing_time', 'Time taken to process a transaction', multiprocess_mode='livemostrecent')
+duplicate_transactions = Counter('duplicate_transactions_total', 'Redelivered transactions skipped by idempotency checks')
+batch_persist_failures = Counter('batch_persist_failures_total', 'Batches that failed to score or persist and were replayed')
+# Backlog for autoscaling; the most recent value wins, i.e. the one from the consumer that currently owns the partition
+consumer_lag = Gauge('kafka_consumer_lag', 'Messages between the consumer position and the end of each assigned partition', ['topic', 'partition'], multiprocess_mode='livemostrecent')
+consumer_processing_rate = Gauge('kafka_consumer_processing_rate', 'Messages per second consumed since the previous lag update', multiprocess_mode='livesum')
+
+
+def bootstrap_consumer(warm_up=False):
+    """
+    Load everything the consumer needs to score transactions.
+
+    This is called explicitly at startup (or lazily by `consume_transactions`) rather than at import time,
+    so importing the module stays cheap. Already loaded state is kept.
+
+    Args:
+        warm_up (bool): Run a dummy prediction after loading the model.
+    """
+    global fraud_model, fraud_rules, duplicate_cache
+    if fraud_model is None:
+        fraud_model, _ = get_fraud_model()
+        if warm_up:
+            warm_up_model(fraud_model)
+    if fraud_rules is None:
+        fraud_rules = load_rule_set()
+    if duplicate_cache is None:
+        duplicate_cache = DuplicateCache()
+
+
+def is_duplicate(idempotency_key):
+    """
+    Decide whether a transaction has already been processed.
+
+    The in-memory cache answers most lookups; only keys it cannot rule out are checked against the database.
+
+    Args:
+        idempotency_key (str): The idempotency key of the transaction.
+
+    Returns:
+        bool: True if the transaction was already processed.
+    """
+    seen = duplicate_cache.check(idempotency_key)
+    if seen is None:
+        seen = transaction_exists(idempotency_key)
+        if seen:
+            duplicate_cache.add(idempotency_key)
+    return seen
 
 
 def safe_json_deserializer(m):
@@ -45,83 +124,583 @@ def safe_json_deserializer(m):
             return None
         return json.loads(m.decode('utf-8'))
     except (json.JSONDecodeError, AttributeError) as e:
-        logger.error(f"Failed to deserialize message: {m}, Error: {e}")
+        logger.error("Failed to deserialize message: %r, Error: %s", m, e)
         return None  # Return None for invalid or malformed messages
 
 
-async def consume_transactions():
+class OffsetSeekListener(ConsumerRebalanceListener):
+    """
+    Rebalance listener that positions newly assigned partitions at the offsets recorded in the database.
+
+    The database offsets are written together with the persisted rows, so they are never behind the data.
+    Partitions without a recorded offset keep the position from Kafka's committed offset (or `auto_offset_reset`).
+    On every assignment the duplicate cache is also warmed with the recently persisted idempotency keys, which
+    may have been written by the consumer that owned the partitions before, and the per-user history of the
+    users of the gained partitions is loaded in bulk; the history of lost partitions is dropped.
+    """
+
+    def __init__(self, consumer, group_id):
+        self.consumer = consumer
+        self.group_id = group_id
+
+    async def on_partitions_revoked(self, revoked):
+        # Offsets are committed after every persisted batch, so there is nothing left to flush here.
+        # The lag of revoked partitions is reported by their next owner.
+        for tp in revoked:
+            try:
+                consumer_lag.remove(tp.topic, str(tp.partition))
+            except KeyError:
+                pass
+
+        if user_activity is not None:
+            user_activity.drop(tp.partition for tp in revoked if tp.topic == KAFKA_TOPIC)
+
+    async def on_partitions_assigned(self, assigned):
+        db_offsets = await offload("consumer", get_committed_offsets, self.group_id)
+        for tp in assigned:
+            offset = db_offsets.get((tp.topic, tp.partition))
+            if offset is not None:
+                self.consumer.seek(tp, offset)
+                logger.info(f"Seeking {tp.topic}[{tp.partition}] to DB-recorded offset {offset}")
+
+        if duplicate_cache is not None:
+            duplicate_cache.warm_up(await offload("consumer", recent_idempotency_keys, duplicate_cache.max_size))
+
+        if user_activity is not None:
+            await self.load_user_activity([tp.partition for tp in assigned if tp.topic == KAFKA_TOPIC])
+
+    async def load_user_activity(self, partitions):
+        partition_count = len(self.consumer.partitions_for_topic(KAFKA_TOPIC) or ())
+        if not partitions or not partition_count:
+            return
+        since = datetime.utcnow() - user_activity.window
+        try:
+            rows = await offload("consumer", recent_user_activity, since)
+        except Exception as e:
+            # Without the history the partitions are not owned and frequencies come from the database
+            logger.error(f"Failed to load user activity for partitions {partitions}: {e}")
+            return
+        user_activity.load(partitions, partition_count, rows, since)
+        logger.info(f"Loaded the activity of {len(user_activity.times)} users for partitions {partitions}")
+
+
+def validate_transaction(transaction_data):
+    """
+    Check that a consumed message is a well-formed transaction before any scoring work is done.
+
+    Args:
+        transaction_data (dict): The deserialized message value.
+
+    Raises:
+        ValueError: If required fields are missing or invalid, or the time is not an ISO 8601 timestamp.
+        TypeError: If the message is not a JSON object.
+    """
+    if not isinstance(transaction_data, dict):
+        raise TypeError(f"Expected a transaction object, got {type(transaction_data).__name__}")
+    TransactionSchema(**transaction_data)
+    parse_transaction_time(transaction_data['time'])
+
+
+def score_transactions(transactions):
+    """
+    Decide whether each transaction of a batch is fraudulent.
+
+    The rule stage evaluates the whole batch at once and decides clear-cut cases; only the undecided
+    transactions are preprocessed and passed to the model, in a single `predict` call.
+
+    Args:
+        transactions (list[dict]): Validated transactions.
+
+    Returns:
+        list[bool]: The fraud decision for each transaction, in order.
+    """
+    decisions = fraud_rules.evaluate(transactions)
+    is_fraud = decisions == FRAUD
+
+    undecided = np.flatnonzero(decisions == UNDECIDED)
+    if len(undecided):
+        # Preprocess the undecided transactions and run the fraud detection model once for all of them
+        is_fraud[undecided] = predict_fraud([transactions[i] for i in undecided], user_activity)
+
+    return is_fraud.tolist()
+
+
+def score_with_probability(transactions):
+    """
+    Score transactions like `score_transactions` and also report the fraud probability and the deciding stage.
+
+    Transactions decided by a rule get a probability of 1.0 (fraud) or 0.0 (legit). The others get the
+    model's probability of the fraud class; their decision is the model's predicted class, as with `predict`.
+
+    Args:
+        transactions (list[dict]): Validated transactions.
+
+    Returns:
+        list[dict]: One {'is_fraud', 'probability', 'decided_by'} result per transaction, in order.
+    """
+    decisions = fraud_rules.evaluate(transactions)
+    is_fraud = decisions == FRAUD
+    probability = is_fraud.astype(float)
+
+    undecided = np.flatnonzero(decisions == UNDECIDED)
+    if len(undecided):
+        features = preprocess_transactions([transactions[i] for i in undecided], user_activity)
+        probabilities = fraud_model.predict_proba(features)
+        classes = np.asarray(fraud_model.classes_)
+        is_fraud[undecided] = classes[probabilities.argmax(axis=1)].astype(bool)
+        probability[undecided] = probabilities[:, np.flatnonzero(classes.astype(bool))[0]]
+
+    model_decided = decisions == UNDECIDED
+    return [
+        {"is_fraud": bool(fraud), "probability": float(p), "decided_by": "model" if by_model else "rules"}
+        for fraud, p, by_model in zip(is_fraud, probability, model_decided)
+    ]
+
+
+def predict_fraud(transactions, user_activity=None):
+    """
+    Score transactions with the fraud detection model, bypassing the rule stage.
+
+    Args:
+        transactions (list[dict]): Validated transactions.
+        user_activity (UserActivityStore, optional): In-memory per-user history for the frequency feature.
+
+    Returns:
+        np.ndarray: Boolean fraud decision per transaction.
+    """
+    features = preprocess_transactions(transactions, user_activity)
+    return np.asarray(fraud_model.predict(features)).astype(bool)
+
+
+def prepare_batch(batch, rejected=None, sources=None):
+    """
+    Validate, deduplicate and score the messages of a batch and build the rows to persist.
+
+    Malformed messages (invalid JSON, missing fields, unparseable values) are logged and skipped: replaying
+    them would fail the same way. Any other error, such as a database error during the duplicate or frequency
+    lookups, is raised so the caller can replay the whole batch.
+
+    Args:
+        batch (dict): Messages returned by `getmany`, keyed by TopicPartition.
+        rejected (list, optional): Receives a (TopicPartition, message, error) tuple for every malformed message.
+        sources (dict, optional): Receives the (TopicPartition, message) of every row, by idempotency key.
+
+    Returns:
+        list[Transaction]: The rows to persist, in batch order.
+    """
+    rejected = rejected if rejected is not None else []
+    sources = sources if sources is not None else {}
+    candidates = []
+    batch_keys = set()
+
+    for tp, messages in batch.items():
+        for message in messages:
+            try:
+                # Extract and log the transaction data from the Kafka message
+                transaction_data = message.value
+                logger.info("Consumed transaction: %s", transaction_data, extra=PER_TRANSACTION)
+
+                # Reject malformed messages before they reach the rule stage, the model or the database
+                validate_transaction(transaction_data)
+                idempotency_key = transaction_data.get('idempotency_key') or compute_idempotency_key(transaction_data)
+            except (ValueError, TypeError, KeyError) as e:
+                # Log malformed messages and move on; they are committed past with the rest of the batch
+                logger.error("Skipping malformed transaction at %s[%d]@%d: %s", tp.topic, tp.partition, message.offset, e)
+                rejected.append((tp, message, e))
+                continue
+
+            # Skip redelivered messages before doing any scoring work
+            transaction_data['idempotency_key'] = idempotency_key
+            if idempotency_key in batch_keys or is_duplicate(idempotency_key):
+                duplicate_transactions.inc()
+                logger.info("Skipping duplicate transaction: %s", idempotency_key, extra=PER_TRANSACTION)
+                continue
+            batch_keys.add(idempotency_key)
+            sources[idempotency_key] = (tp, message)
+            candidates.append(transaction_data)
+
+    if not candidates:
+        return []
+
+    # Track start time for transaction processing time metric
+    start_time = time.time()
+    decisions = score_transactions(candidates)
+
+    # Calculate and update the average time taken to process a transaction of this batch
+    transaction_processing_time.set((time.time() - start_time) / len(decisions))
+
+    transactions = []
+    for transaction_data, is_fraud in zip(candidates, decisions):
+        try:
+            transactions.append(build_transaction(transaction_data, is_fraud))
+        except (ValueError, TypeError, KeyError) as e:
+            logger.error("Skipping transaction that cannot be stored: %s", e)
+            rejected.append((*sources.pop(transaction_data['idempotency_key']), e))
+    return transactions
+
+
+async def process_batch(consumer, batch, failures=None, group_id=KAFKA_CONSUMER_GROUP):
+    """
+    Score, persist and publish one batch of Kafka messages, then commit its offsets.
+
+    The transaction rows and the next offsets are saved in one database transaction. Kafka offsets are only
+    committed once that transaction succeeded.
+
+    With a failure router, messages that cannot be processed leave the partition instead of blocking it:
+    malformed messages and rows rejected by the database are dead-lettered, and when scoring or persisting
+    fails as a whole (e.g. the database is unavailable), the batch is sent to the delayed retry topics and the
+    partition moves on. Without a router, or if the router cannot produce, the consumer seeks back to the start
+    of the batch so no message is lost.
+
+    Args:
+        consumer (AIOKafkaConsumer): The running consumer.
+        batch (dict): Messages returned by `getmany`, keyed by TopicPartition.
+        failures (FailureRouter, optional): Routes failed messages to the retry and dead-letter topics.
+        group_id (str): The consumer group whose offsets are recorded with the rows.
+
+    Returns:
+        bool: True if the batch was persisted, False if it was rewound or handed to the retry topics.
+    """
+    received = time.time()  # Consumed stage of the traces of the batch
+
+    # Next offset to consume for every partition in the batch
+    offsets = {tp: messages[-1].offset + 1 for tp, messages in batch.items() if messages}
+    db_offsets = {(tp.topic, tp.partition): offset for tp, offset in offsets.items()}
+
+    transactions = []
+    rejected, sources, db_rejected = [], {}, []
+    try:
+        # Preprocessing, scoring and the database round trips block, so they run in the consumer pool
+        transactions = await offload("consumer", prepare_batch, batch, rejected, sources)
+
+        # Save the rows and the consumed positions atomically
+        saved_transactions = await offload("consumer", save_transactions_batch, transactions, db_offsets, group_id,
+                                           rejected=db_rejected)
+    except Exception as e:
+        # Nothing was persisted
+        batch_persist_failures.inc()
+        logger.error(f"Failed to process batch of {len(transactions)} transactions: {e}", exc_info=True)
+        if failures is not None and await route_failed_batch(consumer, batch, e, rejected, failures, offsets, db_offsets, group_id):
+            return False
+
+        # Rewind so the whole batch is replayed
+        for tp, messages in batch.items():
+            if messages:
+                consumer.seek(tp, messages[0].offset)
+        await asyncio.sleep(CONSUMER_RETRY_BACKOFF_SECONDS)
+        return False
+
+    # Count only what was persisted, so replayed batches are not counted twice
+    transactions_processed.inc(len(saved_transactions))  # Increment transaction counter
+    fraudulent_transactions.inc(sum(1 for t in saved_transactions if t.is_fraud))  # Increment fraud counter
+
+    rejected.extend((*sources[transaction.idempotency_key], e) for transaction, e in db_rejected)
+    if failures is not None and rejected:
+        try:
+            await failures.route(rejected)
+        except Exception as e:
+            # The rows and offsets are already persisted; these messages are only in the logs now
+            logger.error(f"Failed to dead-letter {len(rejected)} rejected messages: {e}", exc_info=True)
+
+    try:
+        await consumer.commit(offsets)
+    except Exception as e:
+        # The database already holds these offsets and will be used to reposition after a restart
+        logger.warning(f"Failed to commit offsets to Kafka: {e}")
+
+    persisted = time.time()
+    for saved_transaction in saved_transactions:
+        duplicate_cache.add(saved_transaction.idempotency_key)
+        if user_activity is not None:
+            user_activity.record(saved_transaction.user_id, saved_transaction.time)
+        logger.info("Saved transaction to DB: %s", saved_transaction, extra=PER_TRANSACTION)
+
+        # Publish the transaction status to every API process, which notifies its WebSocket clients
+        event = {
+            "id": saved_transaction.id,
+            "amount": saved_transaction.amount,
+            "location": saved_transaction.location,
+            "user_id": saved_transaction.user_id,
+            "time": saved_transaction.time.isoformat(),  # Convert to ISO format for frontend compatibility
+            "is_fraud": saved_transaction.is_fraud,
+            "idempotency_key": saved_transaction.idempotency_key,
+        }
+        source = sources.get(saved_transaction.idempotency_key)
+        trace = trace_from_headers(source[1].headers) if source is not None else None
+        if trace is not None:
+            # The record timestamp is the producer's send time: the gap to `received` is time in the broker
+            timestamp = source[1].timestamp
+            event[TRACE_KEY] = record_persisted(trace, timestamp / 1000 if timestamp and timestamp > 0 else None,
+                                                received, persisted)
+        await get_event_bus().publish(event)
+
+    if saved_transactions:
+        # Invalidate the read caches of every API process
+        await get_event_bus().publish({DATA_VERSION_KEY: bump_data_version()})
+    return True
+
+
+async def route_failed_batch(consumer, batch, error, rejected, failures, offsets, db_offsets, group_id):
+    """
+    Hand a batch that failed as a whole to the failure lanes and move the partitions past it.
+
+    Messages already found malformed are dead-lettered with their own error; all others are routed according
+    to `error`. The database offsets are recorded on a best-effort basis: if the database is what failed, a
+    rebalance may deliver the routed messages again, and the idempotency keys skip the second copy.
+
+    Returns:
+        bool: True if every message was routed, False if the batch must be replayed instead.
+    """
+    malformed = {id(message) for _, message, _ in rejected}
+    failed = list(rejected) + [
+        (tp, message, error) for tp, messages in batch.items() for message in messages if id(message) not in malformed
+    ]
+    try:
+        await failures.route(failed)
+    except Exception as e:
+        logger.error(f"Failed to route batch of {len(failed)} messages to the failure lanes: {e}")
+        return False
+
+    try:
+        await offload("consumer", save_transactions_batch, [], db_offsets, group_id)
+    except Exception as e:
+        logger.warning(f"Failed to record the offsets of a routed batch: {e}")
+    try:
+        await consumer.commit(offsets)
+    except Exception as e:
+        logger.warning(f"Failed to commit offsets to Kafka: {e}")
+    return True
+
+
+class LagMonitor:
+    """
+    Exports the consumer lag of every assigned partition and the processing rate every `interval` seconds.
+
+    The lag is the end offset of the partition minus the consumer's position. Positions only move past a batch
+    once it has been persisted (failed batches are rewound), so the lag is the real backlog of this consumer.
+    """
+
+    def __init__(self, consumer, interval=CONSUMER_LAG_INTERVAL_SECONDS):
+        self.consumer = consumer
+        self.interval = interval
+        self.messages = 0
+        self.last_update = time.monotonic()
+
+    def record(self, messages):
+        self.messages += messages
+
+    async def maybe_update(self):
+        """
+        Update the metrics if `interval` seconds passed since the previous update.
+        """
+        now = time.monotonic()
+        if now - self.last_update < self.interval:
+            return
+        consumer_processing_rate.set(self.messages / (now - self.last_update))
+        self.messages = 0
+        self.last_update = now
+        await self.update_lag()
+
+    async def update_lag(self):
+        assigned = list(self.consumer.assignment())
+        if not assigned:
+            return
+        end_offsets = await self.consumer.end_offsets(assigned)
+        for tp in assigned:
+            position = await self.consumer.position(tp)
+            consumer_lag.labels(topic=tp.topic, partition=str(tp.partition)).set(max(0, end_offsets[tp] - position))
+
+
+async def fetch_prioritized(consumer, timeout_ms=CONSUMER_POLL_TIMEOUT_MS, max_records=CONSUMER_BATCH_SIZE):
+    """
+    Fetch the next batch, serving the low-priority topic only with the capacity the main topic leaves unused.
+
+    Over-limit users are demoted to `KAFKA_LOW_PRIORITY_TOPIC`: their messages are fetched only when the main
+    partitions return less than a full batch, so a user flooding the ingest route cannot delay everybody else.
+
+    Args:
+        consumer (AIOKafkaConsumer): The started consumer.
+        timeout_ms (int): How long to wait for messages of the main topic.
+        max_records (int): Most messages returned.
+
+    Returns:
+        dict: Messages per TopicPartition, as returned by `getmany`.
+    """
+    assignment = consumer.assignment()
+    low = [tp for tp in assignment if tp.topic == KAFKA_LOW_PRIORITY_TOPIC]
+    if not low:
+        return await consumer.getmany(timeout_ms=timeout_ms, max_records=max_records)
+
+    main = [tp for tp in assignment if tp.topic != KAFKA_LOW_PRIORITY_TOPIC]
+    batch = await consumer.getmany(*main, timeout_ms=timeout_ms, max_records=max_records) if main else {}
+    spare = max_records - sum(len(messages) for messages in batch.values())
+    if spare > 0:
+        # Do not wait twice: the main topic already waited for the poll timeout
+        batch.update(await consumer.getmany(*low, timeout_ms=0 if main else timeout_ms, max_records=spare))
+    return batch
+
+
+async def consume_transactions(stop_event=None, failures=None):
     """
     Consume transaction messages from a Kafka topic, process the data for fraud detection,
     and save the transactions to the database while notifying connected clients via WebSockets.
+
+    Messages are handled in batches. Auto-commit is disabled: offsets are committed explicitly once a batch has
+    been persisted, and on (re)assignment the consumer seeks to the offsets recorded in the database.
+
+    Args:
+    With `RATE_LIMIT_OVERFLOW=low_priority` the low-priority topic is consumed as well, from the spare capacity
+    of each batch. Partitions are then assigned by range, so a consumer owns the same partition numbers of both
+    topics and the per-user history stays with the consumer of the user's partition. Both topics must have the
+    same number of partitions.
+
+    Args:
+        stop_event (asyncio.Event, optional): When set, the consumer finishes the current batch and stops.
+        failures (FailureRouter, optional): Routes failed messages to the retry and dead-letter topics instead
+            of replaying failed batches in place.
     """
-    
-    # Parse Kafka broker list from config (in case of multiple brokers)
-    kafka_brokers_list = KAFKA_BROKER.split(",")
+    global user_activity
+
+    # Make sure the model, rules and duplicate cache are loaded
+    bootstrap_consumer()
+    if USER_ACTIVITY_ENABLED:
+        user_activity = UserActivityStore(window=FREQUENCY_WINDOW)
 
     logger.info("Initializing Kafka Consumer...")
     logger.info(f"Kafka broker URL Consumer: {KAFKA_BROKER}")
 
     # Create an asynchronous Kafka consumer
+    low_priority = RATE_LIMIT_OVERFLOW == "low_priority"
     consumer = AIOKafkaConsumer(
-        'transactions',  # Kafka topic name
         bootstrap_servers=[KAFKA_BROKER],
         value_deserializer=safe_json_deserializer,  # Deserialization for message value
-        group_id='transaction-consumers',  # Consumer group to ensure messages are consumed once per group
+        group_id=KAFKA_CONSUMER_GROUP,  # Consumer group to ensure messages are consumed once per group
+        enable_auto_commit=False,  # Offsets are committed only after the batch is persisted
         auto_offset_reset='earliest',  # Start consuming from the earliest message
         session_timeout_ms=60000,  # Kafka session timeout settings
         heartbeat_interval_ms=10000,
         fetch_max_bytes=2000000000,
         max_partition_fetch_bytes=2000000000,
         request_timeout_ms=65000,
+        # Range assignment co-partitions the main and low-priority topics
+        partition_assignment_strategy=(RangePartitionAssignor,) if low_priority else (RoundRobinPartitionAssignor,),
     )
+    topics = [KAFKA_TOPIC, KAFKA_LOW_PRIORITY_TOPIC] if low_priority else [KAFKA_TOPIC]
+    consumer.subscribe(topics, listener=OffsetSeekListener(consumer, KAFKA_CONSUMER_GROUP))
 
     # Start the Kafka consumer
     await consumer.start()
+    lag_monitor = LagMonitor(consumer)
+    last_prune = time.monotonic()
     try:
-        # Consume messages asynchronously
-        async for message in consumer:
+        while stop_event is None or not stop_event.is_set():
+            # Fetch up to a full batch across all assigned partitions, low-priority ones last
+            batch = await fetch_prioritized(consumer)
+            if batch:
+                try:
+                    if await process_batch(consumer, batch, failures):
+                        lag_monitor.record(sum(len(messages) for messages in batch.values()))
+                except Exception as e:
+                    # process_batch replays batches it failed to persist; never let anything else stop consumption
+                    logger.error(f"Unexpected error after processing batch: {e}", exc_info=True)
+
             try:
-                # Track start time for transaction processing time metric
-                start_time = time.time()
+                await lag_monitor.maybe_update()
+            except Exception as e:
+                logger.warning(f"Failed to update consumer lag: {e}")
 
-                # Extract and log the transaction data from the Kafka message
-                transaction_data = message.value
-                logger.info(f"Consumed transaction: {transaction_data}")
+            if user_activity is not None and time.monotonic() - last_prune >= USER_ACTIVITY_PRUNE_SECONDS:
+                user_activity.prune()
+                last_prune = time.monotonic()
+    finally:
+        # Stop the Kafka consumer gracefully when finished
+        await consumer.stop()
+        user_activity = None
+        logger.info("Kafka consumer stopped")
 
-                # Preprocess the transaction for fraud detection model
-                preprocessed_transaction = preprocess_transaction(transaction_data)
 
-                # Run fraud detection model to predict if the transaction is fraudulent
-                is_fraud = fraud_model.predict(preprocessed_transaction)[0]
+async def consume_retries(stop_event=None, failures=None):
+    """
+    Process the messages of the retry topics once their backoff has elapsed.
 
-                # Update Prometheus metrics
-                transactions_processed.inc()  # Increment transaction counter
-                if is_fraud:
-                    fraudulent_transactions.inc()  # Increment fraud counter if detected
+    The retry lane is its own consumer group and task, so waiting for a retry never holds up the partitions of
+    the transactions topic. Within a retry topic every message has the same delay, so messages become due in
+    offset order: the first message that is not due yet pauses its partition until it is. Messages that fail
+    again move on to the next retry topic, and to the dead-letter topic after the last one.
 
-                # Calculate and update the time taken to process the transaction
-                processing_duration = time.time() - start_time
-                transaction_processing_time.set(processing_duration)
+    Args:
+        stop_event (asyncio.Event, optional): When set, the lane finishes the current batch and stops.
+        failures (FailureRouter): Routes messages that fail again.
+    """
+    bootstrap_consumer()
 
-                # Save the transaction data to the database and retrieve the saved record
-                saved_transaction = save_transaction_to_db(transaction_data, is_fraud)
-                logger.info(f"Saved transaction to DB: {saved_transaction}")
+    consumer = AIOKafkaConsumer(
+        bootstrap_servers=[KAFKA_BROKER],
+        value_deserializer=safe_json_deserializer,
+        group_id=KAFKA_RETRY_GROUP,
+        enable_auto_commit=False,
+        auto_offset_reset='earliest',
+    )
+    consumer.subscribe(retry_topics(), listener=OffsetSeekListener(consumer, KAFKA_RETRY_GROUP))
 
-                # Notify WebSocket clients of the transaction status
-                await notify_clients({
-                    "id": saved_transaction.id,
-                    "amount": saved_transaction.amount,
-                    "location": saved_transaction.location,
-                    "user_id": saved_transaction.user_id,
-                    "time": saved_transaction.time.isoformat(),  # Convert to ISO format for frontend compatibility
-                    "is_fraud": saved_transaction.is_fraud
-                })
+    def resume(tp):
+        if tp in consumer.assignment():
+            consumer.resume(tp)
 
-            except Exception as e:
-                # Log any errors during message consumption and processing
-                logger.error(f"Error processing transaction: {e}", exc_info=True)
+    await consumer.start()
+    loop = asyncio.get_running_loop()
+    try:
+        while stop_event is None or not stop_event.is_set():
+            batch = await consumer.getmany(timeout_ms=CONSUMER_POLL_TIMEOUT_MS, max_records=CONSUMER_BATCH_SIZE)
+            now = time.time()
+            due = {}
+            for tp, messages in batch.items():
+                ready = []
+                for message in messages:
+                    wait = not_before_of(message) - now
+                    if wait > 0:
+                        # Hold the partition at this message until it is due
+                        consumer.seek(tp, message.offset)
+                        consumer.pause(tp)
+                        loop.call_later(wait, resume, tp)
+                        break
+                    ready.append(message)
+                if ready:
+                    due[tp] = ready
+
+            if due:
+                try:
+                    await process_batch(consumer, due, failures, KAFKA_RETRY_GROUP)
+                except Exception as e:
+                    logger.error(f"Unexpected error after processing retried batch: {e}", exc_info=True)
     finally:
-        # Stop the Kafka consumer gracefully when finished
         await consumer.stop()
-        logger.info("Kafka consumer stopped")
+        logger.info("Kafka retry lane stopped")
+
+
+async def consume_with_retry_lanes(stop_event=None):
+    """
+    Run the transactions consumer together with the retry lane, sharing one producer for the failure lanes.
+
+    With `RETRY_LANES_ENABLED` off, this is `consume_transactions` alone and failed batches are replayed in place.
 
+    Args:
+        stop_event (asyncio.Event, optional): When set, both consumers finish their current batch and stop.
+    """
+    if not RETRY_LANES_ENABLED:
+        await consume_transactions(stop_event)
+        return
+
+    failures = FailureRouter(AIOKafkaProducer(bootstrap_servers=[KAFKA_BROKER], acks='all', enable_idempotence=True))
+    await failures.start()
+    tasks = [
+        asyncio.create_task(consume_transactions(stop_event, failures)),
+        asyncio.create_task(consume_retries(stop_event, failures)),
+    ]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await failures.stop()
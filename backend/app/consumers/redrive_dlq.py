@@ -0,0 +1,149 @@
+import argparse
+import asyncio
+import json
+import signal
+from collections import Counter
+from aiokafka import AIOKafkaConsumer, AIOKafkaProducer, TopicPartition
+from app.consumers.retry_lanes import header
+from app.utils.config import (
+    KAFKA_BROKER,
+    KAFKA_TOPIC,
+    KAFKA_DLQ_TOPIC,
+    KAFKA_DLQ_REDRIVE_GROUP,
+)
+from app.utils.logging_config import setup_logging
+import logging
+
+# Initialize logging for this module
+setup_logging()
+logger = logging.getLogger(__name__)
+
+
+def redrive_headers(message):
+    """
+    Headers of a re-driven message: where it was dead-lettered from and why, without the retry state, so it
+    starts over as a fresh transaction.
+    """
+    return [
+        ("x-redriven-from", f"{message.topic}[{message.partition}]@{message.offset}".encode('utf-8')),
+        ("x-redriven-error-type", (header(message, "x-error-type") or "").encode('utf-8')),
+    ]
+
+
+async def redrive(limit=None, failure=None, error_type=None, dry_run=False, stop_event=None):
+    """
+    Publish dead-lettered messages back to the transactions topic, e.g. after fixing the bug or outage that
+    made them fail.
+
+    The DLQ is read with its own consumer group, so every message is re-driven once: a run resumes after the
+    last message the previous run committed and stops at the end of the DLQ as it was when the run started.
+    Messages whose value could not be deserialized are skipped (their headers say where the original bytes
+    are). Re-driven messages keep their key and value, so the consumer's idempotency keys still reject
+    transactions that were persisted in the meantime.
+
+    Args:
+        limit (int, optional): Stop after re-driving this many messages.
+        failure (str, optional): Only re-drive messages dead-lettered with this classification
+            ('permanent' or 'transient'); the others are committed past.
+        error_type (str, optional): Only re-drive messages that failed with this exception type.
+        dry_run (bool): Log what would be re-driven without producing or committing anything.
+        stop_event (asyncio.Event, optional): When set, the re-drive stops after the current batch.
+
+    Returns:
+        collections.Counter: Number of messages per outcome ('redriven', 'filtered', 'undeserializable').
+    """
+    consumer = AIOKafkaConsumer(
+        bootstrap_servers=[KAFKA_BROKER],
+        group_id=KAFKA_DLQ_REDRIVE_GROUP,
+        enable_auto_commit=False,
+        auto_offset_reset='earliest',
+    )
+    producer = AIOKafkaProducer(bootstrap_servers=[KAFKA_BROKER], acks='all', enable_idempotence=True)
+    await consumer.start()
+    if not dry_run:
+        await producer.start()
+
+    counts = Counter()
+    try:
+        await consumer.topics()  # Load the topic metadata
+        tps = [TopicPartition(KAFKA_DLQ_TOPIC, p) for p in sorted(consumer.partitions_for_topic(KAFKA_DLQ_TOPIC) or ())]
+        consumer.assign(tps)
+        end_offsets = await consumer.end_offsets(tps)
+        remaining = {tp for tp in tps if await consumer.position(tp) < end_offsets[tp]}
+
+        while remaining and (limit is None or counts['redriven'] < limit):
+            if stop_event is not None and stop_event.is_set():
+                break
+            batch = await consumer.getmany(*remaining, timeout_ms=1000)
+            positions = {}
+            deliveries = []
+            for tp, messages in batch.items():
+                for message in messages:
+                    if message.offset >= end_offsets[tp] or (limit is not None and counts['redriven'] >= limit):
+                        break
+                    positions[tp] = message.offset + 1
+                    if message.value is None:
+                        counts['undeserializable'] += 1
+                        logger.warning("Skipping %s[%d]@%d: the original value could not be deserialized (origin %s[%s]@%s)",
+                                       tp.topic, tp.partition, message.offset, header(message, "x-origin-topic"),
+                                       header(message, "x-origin-partition"), header(message, "x-origin-offset"))
+                        continue
+                    if (failure and header(message, "x-failure") != failure) or \
+                            (error_type and header(message, "x-error-type") != error_type):
+                        counts['filtered'] += 1
+                        continue
+                    counts['redriven'] += 1
+                    if dry_run:
+                        logger.info("Would re-drive %s[%d]@%d (%s): %s", tp.topic, tp.partition, message.offset,
+                                    header(message, "x-error"), message.value.decode('utf-8', 'replace'))
+                    else:
+                        deliveries.append(await producer.send(
+                            KAFKA_TOPIC, value=message.value, key=message.key, headers=redrive_headers(message)))
+
+            if not dry_run:
+                # Commit only what the broker acknowledged
+                await asyncio.gather(*deliveries)
+                if positions:
+                    await consumer.commit(positions)
+            for tp in list(remaining):
+                position = positions.get(tp)
+                if position is None and not batch:
+                    position = await consumer.position(tp)
+                if position is not None and position >= end_offsets[tp]:
+                    remaining.discard(tp)
+
+        logger.info("%s %d messages to '%s' (%d filtered out, %d undeserializable)",
+                    "Would re-drive" if dry_run else "Re-drove", counts['redriven'], KAFKA_TOPIC,
+                    counts['filtered'], counts['undeserializable'])
+        return counts
+    finally:
+        if not dry_run:
+            await producer.stop()
+        await consumer.stop()
+
+
+async def run(args):
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    counts = await redrive(limit=args.limit, failure=args.failure, error_type=args.error_type,
+                           dry_run=args.dry_run, stop_event=stop_event)
+    print(json.dumps(dict(counts)))
+
+
+if __name__ == "__main__":
+    """
+    Dead-letter re-drive entry point, e.g. re-drive the transient failures of a database outage:
+
+        python -m app.consumers.redrive_dlq --failure transient --dry-run
+        python -m app.consumers.redrive_dlq --failure transient
+    """
+    parser = argparse.ArgumentParser(description="Publish dead-lettered transactions back to the transactions topic")
+    parser.add_argument("--limit", type=int, help="Re-drive at most this many messages")
+    parser.add_argument("--failure", choices=("permanent", "transient"), help="Only re-drive this failure class")
+    parser.add_argument("--error-type", help="Only re-drive messages that failed with this exception type, e.g. OperationalError")
+    parser.add_argument("--dry-run", action="store_true", help="Log the messages without re-driving or committing")
+
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,293 @@
+import argparse
+import asyncio
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import numpy as np
+from aiokafka import AIOKafkaConsumer, TopicPartition
+from app.consumers import kafka_consumer
+from app.consumers.kafka_consumer import bootstrap_consumer, predict_fraud, safe_json_deserializer, validate_transaction
+from app.services.db_service import build_transaction, upsert_transactions
+from app.services.rule_engine import FRAUD, UNDECIDED
+from app.utils.config import (
+    KAFKA_BROKER,
+    KAFKA_TOPIC,
+    REPLAY_BATCH_SIZE,
+    REPLAY_WORKERS,
+    REPLAY_PROGRESS_INTERVAL_SECONDS,
+)
+from app.utils.dedup import compute_idempotency_key
+from app.utils.logging_config import setup_logging
+import logging
+
+# Initialize logging for this module
+setup_logging()
+logger = logging.getLogger(__name__)
+
+
+def to_millis(timestamp):
+    """
+    Convert an ISO 8601 timestamp (naive values are taken as UTC) to Kafka's epoch milliseconds.
+    """
+    parsed = datetime.fromisoformat(timestamp)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp() * 1000)
+
+
+async def resolve_offsets(consumer, partitions, offset=None, timestamp=None, default=None):
+    """
+    Turn an offset or a timestamp into a concrete offset per partition.
+
+    Args:
+        consumer (AIOKafkaConsumer): A started consumer.
+        partitions (list[TopicPartition]): The partitions to resolve.
+        offset (int, optional): The same offset for every partition.
+        timestamp (str, optional): ISO 8601 timestamp; resolved to the first offset at or after it.
+        default (dict): Offsets used when neither `offset` nor `timestamp` is given.
+
+    Returns:
+        dict: TopicPartition to offset.
+    """
+    if offset is not None:
+        return {tp: offset for tp in partitions}
+    if timestamp is None:
+        return dict(default)
+
+    found = await consumer.offsets_for_times({tp: to_millis(timestamp) for tp in partitions})
+    end_offsets = await consumer.end_offsets(partitions)
+    # No message at or after the timestamp: the position is the end of the partition
+    return {tp: found[tp].offset if found.get(tp) is not None else end_offsets[tp] for tp in partitions}
+
+
+class ReplayProgress:
+    """
+    Throughput and per-partition progress of a replay, logged every `interval` seconds.
+    """
+
+    def __init__(self, start_offsets, end_offsets, interval=REPLAY_PROGRESS_INTERVAL_SECONDS):
+        self.start_offsets = start_offsets
+        self.end_offsets = end_offsets
+        self.positions = dict(start_offsets)
+        self.interval = interval
+        self.messages = 0
+        self.written = 0
+        self.started = time.monotonic()
+        self.last_report = self.started
+
+    @property
+    def total(self):
+        return sum(max(0, self.end_offsets[tp] - self.start_offsets[tp]) for tp in self.start_offsets)
+
+    def done(self, tp):
+        return self.positions[tp] >= self.end_offsets[tp]
+
+    def record(self, positions, messages, written):
+        self.positions.update(positions)
+        self.messages += messages
+        self.written += written
+        if time.monotonic() - self.last_report >= self.interval:
+            self.report()
+
+    def report(self, final=False):
+        self.last_report = time.monotonic()
+        elapsed = max(self.last_report - self.started, 1e-9)
+        logger.info(
+            "Replay %s: %d/%d messages, %d rows written, %.0f msgs/s, partitions: %s",
+            "finished" if final else "progress", self.messages, self.total, self.written, self.messages / elapsed,
+            ", ".join(f"{tp.partition}@{self.positions[tp]}/{self.end_offsets[tp]}" for tp in sorted(self.positions))
+        )
+
+
+async def score_in_parallel(transactions, executor, workers):
+    """
+    Score a batch: rules once for the whole batch, then the model on the undecided rows, split across threads.
+
+    Args:
+        transactions (list[dict]): Validated transactions.
+        executor (ThreadPoolExecutor): Pool running the preprocessing and model calls.
+        workers (int): Number of chunks the undecided rows are split into.
+
+    Returns:
+        list[bool]: The fraud decision for each transaction, in order.
+    """
+    decisions = kafka_consumer.fraud_rules.evaluate(transactions)
+    is_fraud = decisions == FRAUD
+
+    undecided = np.flatnonzero(decisions == UNDECIDED)
+    chunks = [chunk for chunk in np.array_split(undecided, max(1, workers)) if len(chunk)]
+    loop = asyncio.get_running_loop()
+    results = await asyncio.gather(*(
+        loop.run_in_executor(executor, predict_fraud, [transactions[i] for i in chunk]) for chunk in chunks
+    ))
+    for chunk, result in zip(chunks, results):
+        is_fraud[chunk] = result
+    return is_fraud.tolist()
+
+
+async def replay_batch(messages, executor, workers):
+    """
+    Validate, score and bulk-persist one batch of replayed messages.
+
+    Malformed messages are logged and skipped. Rows are upserted on their idempotency key, so messages that
+    were already stored get their fraud decision refreshed instead of being duplicated.
+
+    Args:
+        messages (list): Consumer records of the batch.
+        executor (ThreadPoolExecutor): Pool running the preprocessing, model and database calls.
+        workers (int): Number of parallel scoring chunks.
+
+    Returns:
+        int: Number of rows inserted or updated.
+    """
+    transactions = []
+    for message in messages:
+        transaction_data = message.value
+        try:
+            validate_transaction(transaction_data)
+            transaction_data['idempotency_key'] = (
+                transaction_data.get('idempotency_key') or compute_idempotency_key(transaction_data))
+        except (ValueError, TypeError, KeyError) as e:
+            logger.error("Skipping malformed transaction at offset %d: %s", message.offset, e)
+            continue
+        transactions.append(transaction_data)
+
+    if not transactions:
+        return 0
+
+    decisions = await score_in_parallel(transactions, executor, workers)
+    rows = [build_transaction(data, is_fraud) for data, is_fraud in zip(transactions, decisions)]
+    return await asyncio.get_running_loop().run_in_executor(executor, upsert_transactions, rows)
+
+
+async def replay(from_offset=None, from_timestamp=None, to_offset=None, to_timestamp=None, partitions=None,
+                 batch_size=REPLAY_BATCH_SIZE, workers=REPLAY_WORKERS, stop_event=None):
+    """
+    Reprocess a range of the transactions topic as fast as possible and stop at its end.
+
+    The replay reads the partitions directly (no consumer group, so the live `transaction-consumers` group and
+    its committed offsets are untouched), scores with the current rules and model, and upserts the results.
+    It publishes nothing to the event bus, so WebSocket clients are not flooded with historical transactions.
+
+    The range starts at `from_offset`/`from_timestamp` (default: the beginning of each partition) and ends,
+    exclusively, at `to_offset`/`to_timestamp` (default: the end of each partition when the replay starts).
+
+    Args:
+        from_offset (int, optional): First offset to replay in every partition.
+        from_timestamp (str, optional): Replay messages produced at or after this ISO 8601 time.
+        to_offset (int, optional): Stop before this offset in every partition.
+        to_timestamp (str, optional): Stop before messages produced at or after this ISO 8601 time.
+        partitions (list[int], optional): Partitions to replay; all partitions of the topic by default.
+        batch_size (int): Maximum messages per fetch and per bulk write.
+        workers (int): Threads scoring undecided transactions in parallel.
+        stop_event (asyncio.Event, optional): When set, the replay stops after the current batch.
+
+    Returns:
+        ReplayProgress: The final progress of the replay.
+    """
+    await asyncio.get_running_loop().run_in_executor(None, bootstrap_consumer)
+
+    consumer = AIOKafkaConsumer(
+        bootstrap_servers=[KAFKA_BROKER],
+        value_deserializer=safe_json_deserializer,
+        group_id=None,  # No group: nothing is committed and the live consumers are not rebalanced
+        enable_auto_commit=False,
+        max_partition_fetch_bytes=2000000000,
+        fetch_max_bytes=2000000000,
+        request_timeout_ms=65000,
+    )
+    await consumer.start()
+    executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="replay")
+    try:
+        available = consumer.partitions_for_topic(KAFKA_TOPIC) or set()
+        if not available:
+            # Topic metadata may not be loaded yet on a fresh client
+            await consumer.topics()
+            available = consumer.partitions_for_topic(KAFKA_TOPIC) or set()
+        tps = [TopicPartition(KAFKA_TOPIC, p) for p in sorted(available) if partitions is None or p in partitions]
+        consumer.assign(tps)
+
+        beginning = await consumer.beginning_offsets(tps)
+        end = await consumer.end_offsets(tps)
+        start_offsets = await resolve_offsets(consumer, tps, from_offset, from_timestamp, default=beginning)
+        end_offsets = await resolve_offsets(consumer, tps, to_offset, to_timestamp, default=end)
+        # Never start before the retained data or stop after the data present when the replay started
+        start_offsets = {tp: max(start_offsets[tp], beginning[tp]) for tp in tps}
+        end_offsets = {tp: min(end_offsets[tp], end[tp]) for tp in tps}
+
+        progress = ReplayProgress(start_offsets, end_offsets)
+        for tp in tps:
+            if progress.done(tp):
+                consumer.pause(tp)
+            else:
+                consumer.seek(tp, start_offsets[tp])
+        logger.info("Replaying %d messages from %d partitions of '%s'", progress.total, len(tps), KAFKA_TOPIC)
+
+        while not all(progress.done(tp) for tp in tps):
+            if stop_event is not None and stop_event.is_set():
+                logger.info("Replay interrupted")
+                break
+
+            batch = await consumer.getmany(timeout_ms=1000, max_records=batch_size)
+            messages, positions = [], {}
+            for tp, records in batch.items():
+                messages.extend(record for record in records if record.offset < end_offsets[tp])
+                positions[tp] = records[-1].offset + 1
+            if not batch:
+                # Nothing fetched: the remaining offsets may be transaction markers rather than messages
+                for tp in tps:
+                    if not progress.done(tp):
+                        positions[tp] = await consumer.position(tp)
+            for tp, position in positions.items():
+                if position >= end_offsets[tp]:
+                    consumer.pause(tp)  # Stop fetching past the end of the range
+
+            written = await replay_batch(messages, executor, workers)
+            progress.record(positions, len(messages), written)
+
+        progress.report(final=True)
+        return progress
+
+    finally:
+        executor.shutdown(wait=True)
+        await consumer.stop()
+
+
+async def run(args):
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    await replay(
+        from_offset=args.from_offset,
+        from_timestamp=args.from_timestamp,
+        to_offset=args.to_offset,
+        to_timestamp=args.to_timestamp,
+        partitions=args.partitions,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        stop_event=stop_event,
+    )
+
+
+if __name__ == "__main__":
+    """
+    Replay/backfill entry point, e.g. re-score the last day after a model change:
+
+        python -m app.consumers.replay --from-timestamp 2024-09-22T00:00:00 --to-timestamp 2024-09-23T00:00:00
+    """
+    parser = argparse.ArgumentParser(description="Replay a range of the transactions topic through the scorer")
+    start = parser.add_mutually_exclusive_group()
+    start.add_argument("--from-offset", type=int, help="First offset to replay in every partition")
+    start.add_argument("--from-timestamp", help="Replay messages produced at or after this ISO 8601 time")
+    end = parser.add_mutually_exclusive_group()
+    end.add_argument("--to-offset", type=int, help="Stop before this offset in every partition")
+    end.add_argument("--to-timestamp", help="Stop before messages produced at or after this ISO 8601 time")
+    parser.add_argument("--partitions", type=lambda value: [int(p) for p in value.split(",")],
+                        help="Comma-separated partitions to replay (default: all)")
+    parser.add_argument("--batch-size", type=int, default=REPLAY_BATCH_SIZE, help="Messages per fetch and bulk write")
+    parser.add_argument("--workers", type=int, default=REPLAY_WORKERS, help="Parallel scoring threads")
+
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,187 @@
+import asyncio
+import json
+from datetime import datetime, timezone
+from prometheus_client import Counter
+from sqlalchemy.exc import IntegrityError
+from app.utils.config import (
+    KAFKA_DLQ_TOPIC,
+    KAFKA_RETRY_TOPIC_PREFIX,
+    RETRY_MAX_ATTEMPTS,
+    RETRY_BACKOFF_BASE_SECONDS,
+)
+from app.utils.tracing import TRACE_HEADER
+from app.utils.logging_config import setup_logging
+import logging
+
+# Initialize logging for this module
+setup_logging()
+logger = logging.getLogger(__name__)
+
+PERMANENT = "permanent"  # Fails the same way every time: dead-lettered right away
+TRANSIENT = "transient"  # May succeed later (database or broker hiccup): retried with backoff
+
+# Exceptions raised by the message itself rather than by the systems processing it (pydantic's ValidationError is a ValueError)
+PERMANENT_ERRORS = (ValueError, TypeError, KeyError, IntegrityError)
+
+# Prometheus metrics for the failure lanes
+messages_retried = Counter('kafka_messages_retried_total', 'Messages sent to a retry topic', ['attempt'])
+messages_dead_lettered = Counter('kafka_messages_dead_lettered_total', 'Messages sent to the dead-letter topic', ['failure'])
+
+ORIGIN_HEADERS = ("x-origin-topic", "x-origin-partition", "x-origin-offset")
+
+
+def classify_failure(error):
+    """
+    Decide whether a failure is worth retrying.
+
+    Malformed or invalid messages and constraint violations fail the same way on every attempt (duplicate
+    idempotency keys never get here: they are skipped as redeliveries). Everything else (connection errors,
+    timeouts, an unavailable model) is assumed to be transient.
+
+    Args:
+        error (Exception): The error raised while processing the message.
+
+    Returns:
+        str: `PERMANENT` or `TRANSIENT`.
+    """
+    if isinstance(error, PERMANENT_ERRORS):
+        return PERMANENT
+    return TRANSIENT
+
+
+def retry_topic(attempt):
+    """
+    The retry topic of an attempt, e.g. `transactions.retry.2`; each tier has its own delay.
+    """
+    return f"{KAFKA_RETRY_TOPIC_PREFIX}.{attempt}"
+
+
+def retry_topics(max_attempts=RETRY_MAX_ATTEMPTS):
+    return [retry_topic(attempt) for attempt in range(1, max_attempts + 1)]
+
+
+def retry_delay(attempt, base=RETRY_BACKOFF_BASE_SECONDS):
+    """
+    Seconds a message waits in the retry topic of an attempt: `base`, then doubling with every attempt.
+    """
+    return base * 2 ** (attempt - 1)
+
+
+def header(message, name, default=None):
+    """
+    The decoded value of a Kafka message header, or `default` if the message does not have it.
+    """
+    for key, value in message.headers or ():
+        if key == name:
+            return value.decode('utf-8') if value is not None else default
+    return default
+
+
+def attempt_of(message):
+    """
+    Number of retries a message already went through (0 for a message from the transactions topic).
+    """
+    return int(header(message, "x-attempt", 0))
+
+
+def not_before_of(message):
+    """
+    Epoch seconds before which a retried message must not be processed, or 0 if it is due.
+    """
+    return float(header(message, "x-not-before", 0))
+
+
+class FailureRouter:
+    """
+    Routes messages that could not be processed to the retry topics or the dead-letter topic.
+
+    Transient failures go to `transactions.retry.<n>` with the attempt number and the time the message
+    becomes due in its headers; the retry lane (`consume_retries`) waits for that time and processes them
+    again, away from the partitions of the main consumer. After `max_attempts` retries, and immediately for
+    permanent failures, messages go to the dead-letter topic with the error, its type and classification, and
+    the topic, partition and offset they were first consumed from.
+
+    The message key (the user id) and value are kept. Values that could not be deserialized are sent as null;
+    the origin headers point at the original bytes, which stay in the source topic until its retention expires.
+    """
+
+    def __init__(self, producer, max_attempts=RETRY_MAX_ATTEMPTS, backoff_base=RETRY_BACKOFF_BASE_SECONDS):
+        self.producer = producer
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+
+    async def start(self):
+        await self.producer.start()
+
+    async def stop(self):
+        await self.producer.stop()
+
+    def _headers(self, tp, message, error, failure, attempt, not_before=None):
+        # Messages coming from a retry topic keep the coordinates of their first delivery
+        origin = [header(message, name) for name in ORIGIN_HEADERS]
+        if origin[0] is None:
+            origin = [tp.topic, str(tp.partition), str(message.offset)]
+        headers = dict(zip(ORIGIN_HEADERS, origin))
+        headers.update({
+            "x-attempt": str(attempt),
+            "x-failure": failure,
+            "x-error-type": type(error).__name__,
+            "x-error": str(error)[:1000],
+            "x-failed-at": datetime.now(timezone.utc).isoformat(),
+        })
+        if not_before is not None:
+            headers["x-not-before"] = f"{not_before:.3f}"
+        trace = header(message, TRACE_HEADER)
+        if trace is not None:
+            # Retried transactions keep measuring their latency from the original ingest
+            headers[TRACE_HEADER] = trace
+        return [(key, value.encode('utf-8')) for key, value in headers.items()]
+
+    async def _send(self, topic, message, headers):
+        value = json.dumps(message.value).encode('utf-8') if message.value is not None else None
+        return await self.producer.send(topic, value=value, key=message.key, headers=headers)
+
+    async def dead_letter(self, tp, message, error, failure=PERMANENT):
+        """
+        Queue a message for the dead-letter topic.
+
+        Returns:
+            asyncio.Future: Resolves once the broker acknowledged the message.
+        """
+        headers = self._headers(tp, message, error, failure, attempt_of(message))
+        messages_dead_lettered.labels(failure=failure).inc()
+        logger.warning("Dead-lettering message %s[%d]@%d (%s): %s", tp.topic, tp.partition, message.offset, failure, error)
+        return await self._send(KAFKA_DLQ_TOPIC, message, headers)
+
+    async def retry(self, tp, message, error):
+        """
+        Queue a message for its next retry topic, or for the dead-letter topic once the retries are used up.
+
+        Returns:
+            asyncio.Future: Resolves once the broker acknowledged the message.
+        """
+        attempt = attempt_of(message) + 1
+        if attempt > self.max_attempts:
+            return await self.dead_letter(tp, message, error, failure=TRANSIENT)
+        not_before = datetime.now(timezone.utc).timestamp() + retry_delay(attempt, self.backoff_base)
+        headers = self._headers(tp, message, error, TRANSIENT, attempt, not_before)
+        messages_retried.labels(attempt=str(attempt)).inc()
+        return await self._send(retry_topic(attempt), message, headers)
+
+    async def route(self, failed):
+        """
+        Send failed messages to the retry or dead-letter topic matching their failure and wait for the broker.
+
+        Args:
+            failed (list[tuple[TopicPartition, ConsumerRecord, Exception]]): The messages and their errors.
+
+        Raises:
+            Exception: If a message could not be produced; the caller must not commit past it.
+        """
+        deliveries = []
+        for tp, message, error in failed:
+            if classify_failure(error) == PERMANENT:
+                deliveries.append(await self.dead_letter(tp, message, error))
+            else:
+                deliveries.append(await self.retry(tp, message, error))
+        await asyncio.gather(*deliveries)
@@ -0,0 +1,63 @@
+import argparse
+import asyncio
+import signal
+from app.consumers.kafka_consumer import bootstrap_consumer, consume_with_retry_lanes
+from app.utils.config import EVENT_BUS_BACKEND, MODEL_WARMUP
+from app.utils.event_bus import get_event_bus
+from app.utils.loop_monitor import LoopLagMonitor
+from app.utils.offload import shutdown_pools
+from app.utils.metrics import start_metrics_server, mark_process_dead
+from app.utils.logging_config import setup_logging
+import logging
+
+# Initialize logging for this module
+setup_logging()
+logger = logging.getLogger(__name__)
+
+
+async def run(warm_up=MODEL_WARMUP):
+    """
+    Run the Kafka consumer as a standalone process until SIGINT or SIGTERM.
+
+    Scored transactions are published on the event bus, from which every API process broadcasts them to its
+    WebSocket clients. Start the API with `RUN_CONSUMER_IN_API=false` so only these processes consume.
+
+    Args:
+        warm_up (bool): Run a dummy prediction after loading the model.
+    """
+    if EVENT_BUS_BACKEND == "local":
+        logger.warning("EVENT_BUS_BACKEND is 'local': scored transactions will not reach API processes")
+
+    start_metrics_server()
+    loop_monitor = LoopLagMonitor()
+    loop_monitor.start()
+    await asyncio.get_running_loop().run_in_executor(None, bootstrap_consumer, warm_up)
+
+    # Finish the current batch and stop cleanly on SIGINT/SIGTERM
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    event_bus = get_event_bus()
+    await event_bus.start()
+    try:
+        await consume_with_retry_lanes(stop_event)
+    finally:
+        await event_bus.stop()
+        await loop_monitor.stop()
+        shutdown_pools()
+        mark_process_dead()
+
+
+if __name__ == "__main__":
+    """
+    Standalone consumer entry point, scaled independently of the API:
+
+        python -m app.consumers.run_consumer [--warm-up]
+    """
+    parser = argparse.ArgumentParser(description="Run the fraud detection Kafka consumer")
+    parser.add_argument("--warm-up", action="store_true", default=MODEL_WARMUP, help="Run a dummy prediction before consuming")
+    args = parser.parse_args()
+
+    asyncio.run(run(warm_up=args.warm_up))
@@ -1,10 +1,38 @@
+import json
+import os
+import time
+import tracemalloc
 import numpy as np
 import pandas as pd
 from sklearn.model_selection import train_test_split
-from sklearn.ensemble import RandomForestClassifier  # New model
+from sklearn.ensemble import RandomForestClassifier, HistGradientBoostingClassifier
+from sklearn.linear_model import LogisticRegression
 from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import accuracy_score
 import pickle
+from app.utils.config import MODEL_LATENCY_BUDGET_MS, MODEL_BATCH_LATENCY_BUDGET_MS
+
+MODEL_DIR = os.path.dirname(os.path.abspath(__file__))  # Where the model, scaler and selection report are written
+BATCH_SIZE = 256  # Rows per prediction in the batch latency measurement, the scale of a consumer batch
+
+
+def candidate_models():
+    """
+    The models compared by `train_model`: random forests of several sizes, a gradient-boosted model and a
+    logistic regression.
+
+    Returns:
+        dict: Candidate name -> unfitted estimator.
+    """
+    candidates = {}
+    for n_estimators in (25, 50, 100, 200):
+        for max_depth in (None, 12, 6):
+            name = f"random_forest_{n_estimators}_depth_{max_depth or 'unlimited'}"
+            candidates[name] = RandomForestClassifier(n_estimators=n_estimators, max_depth=max_depth, random_state=42)
+    candidates["gradient_boosting_100"] = HistGradientBoostingClassifier(max_iter=100, random_state=42)
+    candidates["gradient_boosting_50_depth_4"] = HistGradientBoostingClassifier(max_iter=50, max_depth=4, random_state=42)
+    candidates["logistic_regression"] = LogisticRegression(max_iter=1000)
+    return candidates
 
 # Simulate some fake transaction data with advanced features
 def generate_fake_data():
@@ -73,12 +101,128 @@ def preprocess_data(data):
     return X_scaled, y, scaler
 
 
-# Train the Random Forest model
-def train_model():
+def measure_latency(model, X, batch_size, repeats):
     """
-    Train a Random Forest classifier on the synthetic transaction data to detect fraud.
-    
-    Saves the trained model and the fitted scaler to files for future use.
+    Time `predict_proba` the way the scoring paths call it, on rows of `X`.
+
+    Args:
+        model: The fitted model.
+        X (np.array): Feature rows to predict on; reused cyclically to fill a batch.
+        batch_size (int): Rows per prediction.
+        repeats (int): Timed predictions, after a few untimed warm-up calls.
+
+    Returns:
+        dict: p50 and p99 latency in milliseconds.
+    """
+    batches = [np.take(X, range(i * batch_size, (i + 1) * batch_size), axis=0, mode='wrap') for i in range(repeats)]
+    for batch in batches[:3]:
+        model.predict_proba(batch)
+    timings = []
+    for batch in batches:
+        start = time.perf_counter()
+        model.predict_proba(batch)
+        timings.append((time.perf_counter() - start) * 1000)
+    return {"p50_ms": float(np.percentile(timings, 50)), "p99_ms": float(np.percentile(timings, 99))}
+
+
+def evaluate_candidate(model, X_train, X_test, y_train, y_test, repeats=200):
+    """
+    Fit a candidate and measure what it would cost to serve.
+
+    Returns:
+        dict: Test `accuracy`, `single_row` and `batch` latency percentiles, pickled `artifact_bytes` and the
+        `memory_bytes` allocated to load the artifact.
+    """
+    start = time.perf_counter()
+    model.fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - start
+
+    artifact = pickle.dumps(model)
+    tracemalloc.start()
+    pickle.loads(artifact)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "accuracy": float(accuracy_score(y_test, model.predict(X_test))),
+        "single_row": measure_latency(model, X_test, 1, repeats),
+        "batch": measure_latency(model, X_test, BATCH_SIZE, max(10, repeats // 4)),
+        "artifact_bytes": len(artifact),
+        "memory_bytes": peak,
+        "fit_seconds": fit_seconds,
+    }
+
+
+def select_model(results, latency_budget_ms, batch_latency_budget_ms=0):
+    """
+    Pick the most accurate candidate whose p99 latencies fit the budgets. Ties go to the lower single-row
+    p99, then to the smaller artifact.
+
+    Args:
+        results (dict): Candidate name -> result of `evaluate_candidate`.
+        latency_budget_ms (float): Budget for the single-row p99.
+        batch_latency_budget_ms (float): Budget for the p99 of a `BATCH_SIZE` batch; 0 for none.
+
+    Returns:
+        str or None: The selected candidate, or None if none fits the budgets.
+    """
+    def fits(result):
+        return result["single_row"]["p99_ms"] <= latency_budget_ms and (
+            not batch_latency_budget_ms or result["batch"]["p99_ms"] <= batch_latency_budget_ms)
+
+    eligible = [name for name, result in results.items() if fits(result)]
+    if not eligible:
+        return None
+    return min(eligible, key=lambda name: (-results[name]["accuracy"], results[name]["single_row"]["p99_ms"],
+                                           results[name]["artifact_bytes"]))
+
+
+def write_report(results, selected, latency_budget_ms, batch_latency_budget_ms, path):
+    """
+    Write the comparison of the candidates as JSON and print it as a table, most accurate first.
+    """
+    report = {
+        "latency_budget_ms": latency_budget_ms,
+        "batch_latency_budget_ms": batch_latency_budget_ms,
+        "batch_size": BATCH_SIZE,
+        "selected": selected,
+        "candidates": results,
+    }
+    with open(path, 'w') as report_file:
+        json.dump(report, report_file, indent=2)
+
+    print(f"{'candidate':<36} {'accuracy':>8} {'p99 1 row':>10} {f'p99 {BATCH_SIZE} rows':>13} {'artifact':>10} {'memory':>10}")
+    for name, result in sorted(results.items(), key=lambda item: -item[1]["accuracy"]):
+        marker = " <- selected" if name == selected else ""
+        print(f"{name:<36} {result['accuracy'] * 100:>7.2f}% {result['single_row']['p99_ms']:>8.2f}ms "
+              f"{result['batch']['p99_ms']:>11.2f}ms {result['artifact_bytes'] / 1024:>8.0f}kB "
+              f"{result['memory_bytes'] / 1024:>8.0f}kB{marker}")
+
+
+# Train the candidate models and keep the best one that can be served within the latency budget
+def train_model(output_dir=MODEL_DIR, candidates=None, latency_budget_ms=MODEL_LATENCY_BUDGET_MS,
+                batch_latency_budget_ms=MODEL_BATCH_LATENCY_BUDGET_MS, repeats=200):
+    """
+    Train fraud classifiers of several kinds and sizes on the synthetic transaction data and keep the most
+    accurate one whose single-row p99 prediction latency fits `MODEL_LATENCY_BUDGET_MS` (and whose batch p99
+    fits `MODEL_BATCH_LATENCY_BUDGET_MS`).
+
+    Every candidate's accuracy, single-row and batch latency, artifact size and load memory are written to
+    `model_selection_report.json`. The selected model and the fitted scaler are saved for serving.
+
+    Args:
+        output_dir (str): Directory of the model, scaler and report files.
+        candidates (dict, optional): Candidate name -> unfitted estimator; `candidate_models()` if omitted.
+        latency_budget_ms (float): Budget for the single-row p99.
+        batch_latency_budget_ms (float): Budget for the batch p99; 0 for none.
+        repeats (int): Timed single-row predictions per candidate.
+
+    Returns:
+        str: The name of the selected candidate.
+
+    Raises:
+        RuntimeError: If no candidate fits the budgets. The report is still written, and the previous model
+            is left in place.
     """
     # Generate synthetic transaction data
     data = generate_fake_data()
@@ -89,26 +233,28 @@ def train_model():
     # Split data into training and testing sets (80% train, 20% test)
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
     
-    # Initialize and train the Random Forest model
-    model = RandomForestClassifier(n_estimators=100, random_state=42)
-    model.fit(X_train, y_train)
-    
-    # Make predictions on the test set
-    y_pred = model.predict(X_test)
-    
-    # Evaluate the model's performance
-    accuracy = accuracy_score(y_test, y_pred)
-    print(f"Model accuracy: {accuracy * 100:.2f}%")
+    # Fit every candidate and measure its accuracy and serving cost
+    candidates = candidates if candidates is not None else candidate_models()
+    results = {name: evaluate_candidate(model, X_train, X_test, y_train, y_test, repeats)
+               for name, model in candidates.items()}
+
+    selected = select_model(results, latency_budget_ms, batch_latency_budget_ms)
+    write_report(results, selected, latency_budget_ms, batch_latency_budget_ms,
+                 os.path.join(output_dir, 'model_selection_report.json'))
+    if selected is None:
+        raise RuntimeError(f"No candidate model fits the p99 latency budgets ({latency_budget_ms} ms per row, "
+                           f"{batch_latency_budget_ms or 'no limit'} ms per batch of {BATCH_SIZE})")
 
     # Save the scaler for use during inference (feature scaling)
-    with open('app/fraud_detection/scaler.pkl', 'wb') as scaler_file:
+    with open(os.path.join(output_dir, 'scaler.pkl'), 'wb') as scaler_file:
         pickle.dump(scaler, scaler_file)
 
-    # Save the trained model to a file
-    with open('app/fraud_detection/fraud_detection_model.pkl', 'wb') as model_file:
-        pickle.dump(model, model_file)
-    
-    print("Model and scaler trained and saved successfully.")
+    # Save the selected model to a file
+    with open(os.path.join(output_dir, 'fraud_detection_model.pkl'), 'wb') as model_file:
+        pickle.dump(candidates[selected], model_file)
+
+    print(f"Selected {selected}; model and scaler trained and saved successfully.")
+    return selected
 
 
 if __name__ == "__main__":
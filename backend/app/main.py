@@ -1,28 +1,99 @@
+import argparse
 import asyncio
-from fastapi import FastAPI, WebSocket, Request, WebSocketDisconnect, APIRouter
-from fastapi.responses import JSONResponse
-from app.routes.transaction import transaction_router  # Import the transaction router for transaction-related API routes
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response
+from app.routes.transaction import transaction_router, score_batcher  # Import the transaction router for transaction-related API routes
+from app.routes.debug import debug_router  # Admin-only profiling and memory inspection routes
 from fastapi.middleware.cors import CORSMiddleware  # Middleware to handle Cross-Origin Resource Sharing (CORS)
-from app.utils.websocket_manager import websocket_endpoint  # Import WebSocket handler to manage WebSocket connections
-from app.consumers.kafka_consumer import consume_transactions  # Kafka consumer to process transaction messages
+from app.utils.websocket_manager import notify_clients  # Broadcast of scored transactions to WebSocket clients
+from app.utils.response_cache import observe_data_version  # Invalidates the read caches when the consumer persists a batch
+from app.utils.transaction_buffer import observe_transactions  # Keeps the latest persisted transactions in memory
+from app.utils.event_bus import get_event_bus  # Delivers scored transactions from the consumer(s) to this process
+from app.utils.loop_monitor import LoopLagMonitor  # Measures event loop lag and logs what blocks the loop
+from app.utils.offload import shutdown_pools  # Bounded thread pools running the blocking calls of the routes and the consumer
 from app.utils.logging_config import setup_logging  # Custom logging configuration
+import logging
 import uvicorn  # ASGI server to run FastAPI applications
 from app.utils.config import CORS_ORIGIN  # Load CORS origin from configuration (assumes config.py exists in utils)
+from app.utils.config import MODEL_WARMUP, CONSUMER_POLL_TIMEOUT_MS, RUN_CONSUMER_IN_API, WS_PER_MESSAGE_DEFLATE
+from app.utils.metrics import start_metrics_server, render_metrics, mark_process_dead
+from prometheus_client import CONTENT_TYPE_LATEST
 
 # Set up application logging
 setup_logging()  # Initialize logging at the start of the application
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Lifespan handler that performs the startup side effects explicitly, once per process.
+
+    On startup it starts the Prometheus metrics server and subscribes this process's WebSocket clients to the
+    event bus. Unless `RUN_CONSUMER_IN_API` is disabled (consumer scaled separately with
+    `python -m app.consumers.run_consumer`), it also loads the model and rules (importing the heavy ML
+    modules only now, off the event loop) and creates the background task that consumes transactions from
+    Kafka. A lag monitor watches the event loop throughout. On shutdown it asks the consumer to stop after its
+    current batch and stops the offload pools.
+
+    Args:
+        app (FastAPI): The application instance.
+    """
+    start_metrics_server()
+    loop_monitor = LoopLagMonitor()
+    loop_monitor.start()
+
+    # Every API process fans out every scored transaction to its own WebSocket clients
+    event_bus = get_event_bus()
+    event_bus.subscribe(notify_clients)
+    event_bus.subscribe(observe_data_version)
+    event_bus.subscribe(observe_transactions)
+    await event_bus.start()
+
+    stop_event = asyncio.Event()
+    consumer_task = None
+    if RUN_CONSUMER_IN_API:
+        # Imported here so that importing app.main does not pull in the ML stack
+        from app.consumers.kafka_consumer import bootstrap_consumer, consume_with_retry_lanes
+        await run_in_threadpool(bootstrap_consumer, MODEL_WARMUP)
+        consumer_task = asyncio.create_task(consume_with_retry_lanes(stop_event))  # Start the Kafka consumer in the background
+
+    try:
+        yield
+    finally:
+        stop_event.set()
+        if consumer_task is not None:
+            try:
+                await asyncio.wait_for(consumer_task, timeout=CONSUMER_POLL_TIMEOUT_MS / 1000 + 5)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                consumer_task.cancel()
+            except Exception as e:
+                logger.error(f"Kafka consumer stopped with an error: {e}")
+        await score_batcher.stop()
+        await event_bus.stop()
+        event_bus.unsubscribe(notify_clients)
+        event_bus.unsubscribe(observe_data_version)
+        event_bus.unsubscribe(observe_transactions)
+        await loop_monitor.stop()
+        shutdown_pools()
+        mark_process_dead()
 
 # Create the FastAPI application instance
 app = FastAPI(
     title="Real-Time Fraud Detection API",
     description="This API allows you to submit transactions and check for fraud in real-time.",
     version="1.0.0",
-    docs_url="/docs"  # Swagger documentation is enabled at /docs for easy API exploration
+    docs_url="/docs",  # Swagger documentation is enabled at /docs for easy API exploration
+    lifespan=lifespan
 )
 
 # Register the transaction routes
 app.include_router(transaction_router)
 
+# Register the admin-only debug routes (disabled unless ADMIN_TOKEN is set)
+app.include_router(debug_router)
+
 # List of allowed origins for CORS (loaded from environment configuration)
 origins = [CORS_ORIGIN]
 
@@ -51,26 +122,15 @@ async def health_check():
     """
     return {"status": "healthy"}
 
-# WebSocket route for real-time transaction updates
-@app.websocket("/api/ws")
-async def websocket_route(websocket: WebSocket):
+@app.get("/metrics")
+def metrics():
     """
-    WebSocket route to handle real-time transaction updates.
-    It delegates the actual WebSocket handling to the `websocket_endpoint` function.
-    
-    Args:
-        websocket (WebSocket): The WebSocket connection object from FastAPI.
-    """
-    await websocket_endpoint(websocket)
+    Prometheus metrics endpoint.
 
-# FastAPI event that runs on application startup
-@app.on_event("startup")
-async def startup_event():
-    """
-    Event handler that is triggered when the FastAPI application starts.
-    This function creates a background task to consume transactions from the Kafka broker.
+    With `PROMETHEUS_MULTIPROC_DIR` set, whichever worker handles the scrape returns the metrics of every
+    API and consumer process on the host; otherwise only those of this process.
     """
-    asyncio.create_task(consume_transactions())  # Start the Kafka consumer in the background
+    return Response(render_metrics(), media_type=CONTENT_TYPE_LATEST)
 
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
@@ -95,5 +155,15 @@ if __name__ == "__main__":
     """
     Run the FastAPI application using Uvicorn.
     This allows for the application to be started from the command line.
+    With --startup-report, print a breakdown of import and bootstrap times instead of serving.
     """
-    uvicorn.run(app, host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Real-Time Fraud Detection API")
+    parser.add_argument("--startup-report", action="store_true", help="Print an import/bootstrap time breakdown and exit")
+    parser.add_argument("--top", type=int, default=20, help="Number of slowest imports listed in the startup report")
+    args = parser.parse_args()
+
+    if args.startup_report:
+        from app.utils.startup_report import print_startup_report
+        print_startup_report(top=args.top, warm_up=True)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8000, reload=True, ws="websockets", ws_per_message_deflate=WS_PER_MESSAGE_DEFLATE)
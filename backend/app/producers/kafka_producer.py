@@ -1,8 +1,9 @@
 from kafka import KafkaProducer
 import json
 from app.utils.config import KAFKA_BROKER, KAFKA_TOPIC
+from app.utils.tracing import trace_headers
 from datetime import datetime
-from app.utils.logging_config import setup_logging
+from app.utils.logging_config import setup_logging, PER_TRANSACTION
 import logging
 
 # Setup logging for this module
@@ -23,41 +24,54 @@ def get_kafka_producer():
     return KafkaProducer(
         bootstrap_servers=[KAFKA_BROKER],  # Set the Kafka broker URL
         value_serializer=lambda v: json.dumps(v).encode('utf-8'),  # Serialize data as JSON
+        key_serializer=lambda k: k.encode('utf-8') if k is not None else None,  # Keys are user ids
         api_version=(2, 6, 0),  # Set the Kafka API version to match the server
         max_request_size=2000000000  # Increase the maximum request size to handle large messages
     )
 
-def send_transaction_to_kafka(transaction):
+def send_transaction_to_kafka(transaction, trace=None, topic=KAFKA_TOPIC):
     """
     Send a transaction message to the Kafka topic.
 
     This function serializes the transaction data and sends it to the configured Kafka topic.
     It also handles logging and error handling in case the message fails to send.
 
+    Messages are keyed by `user_id`, so all transactions of a user land on the same partition and are
+    processed by the one consumer that keeps that user's state in memory.
+
     Args:
         transaction (dict): A dictionary containing the transaction data to send.
+        trace (dict, optional): Trace context sent in the message headers.
+        topic (str): Topic to publish to, e.g. the low-priority topic for users over their rate.
+
+    Returns:
+        bool: True if the transaction was sent successfully, False if sending failed.
     """
     # Ensure the 'time' field is serialized as ISO format (if it exists as a datetime object)
     if isinstance(transaction.get('time'), datetime):
         transaction['time'] = transaction['time'].isoformat()
 
+    producer = None
     try:
         # Get the Kafka producer instance
         producer = get_kafka_producer()
 
-        # Send the serialized transaction data to the Kafka topic
-        producer.send(KAFKA_TOPIC, transaction)
+        # Send the serialized transaction data to the Kafka topic, on the partition of its user
+        producer.send(topic, transaction, key=transaction.get('user_id'), headers=trace_headers(trace))
 
         # Flush to ensure all messages are sent before closing the producer
         producer.flush()
 
         # Log the successful send event
-        logger.info(f"Successfully sent transaction to Kafka: {transaction}")
+        logger.info("Successfully sent transaction to Kafka: %s", transaction, extra=PER_TRANSACTION)
+        return True
 
     except Exception as e:
         # Log any errors that occur during the send process
         logger.error(f"Failed to send transaction to Kafka: {e}", exc_info=True)
+        return False
 
     finally:
         # Ensure the producer is closed to release resources
-        producer.close()
+        if producer is not None:
+            producer.close()
@@ -0,0 +1,92 @@
+import secrets
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
+from app.utils import config
+from app.utils.config import PROFILE_MAX_SECONDS
+from app.utils.profiler import profiler, memory_tracker
+from app.utils.logging_config import setup_logging
+import logging
+
+# Initialize logging for the module
+setup_logging()
+logger = logging.getLogger(__name__)
+
+
+def require_admin(x_admin_token: str = Header(None)):
+    """
+    Dependency restricting the debug routes to administrators.
+
+    The routes are hidden (404) unless `ADMIN_TOKEN` is configured, and require a matching
+    `X-Admin-Token` header otherwise.
+
+    Args:
+        x_admin_token (str): Value of the `X-Admin-Token` request header.
+
+    Raises:
+        HTTPException: 404 if the debug routes are disabled, 403 if the token is missing or wrong.
+    """
+    if not config.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, config.ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+# Create an APIRouter instance for the admin-only debug routes
+debug_router = APIRouter(prefix="/api/debug", dependencies=[Depends(require_admin)])
+
+
+@debug_router.get("/profile", response_class=PlainTextResponse)
+async def profile(seconds: float = Query(10, gt=0, le=PROFILE_MAX_SECONDS)):
+    """
+    Run a sampling profiler over the live process and return collapsed stacks.
+
+    All threads are sampled, including the event loop running the background Kafka consumer. The output can
+    be piped straight into flamegraph tools (e.g. `flamegraph.pl` or speedscope).
+
+    Args:
+        seconds (float): How long to profile.
+
+    Returns:
+        PlainTextResponse: Collapsed stacks, one `stack count` line per distinct stack.
+
+    Raises:
+        HTTPException: 409 if another profile is already running.
+    """
+    if profiler.running:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    logger.info("Profiling process for %s seconds", seconds)
+    try:
+        # The profiler sleeps while sampling, so wait for it on a worker thread
+        return await run_in_threadpool(profiler.profile, seconds)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@debug_router.get("/memory")
+def memory(top: int = Query(20, gt=0, le=200)):
+    """
+    Return the top `tracemalloc` allocation sites and the growth since the previous call.
+
+    The first call switches tracing on and returns an empty report; later calls compare against the
+    previous snapshot.
+
+    Args:
+        top (int): Number of allocation sites to report.
+
+    Returns:
+        dict: The memory report.
+    """
+    return memory_tracker.snapshot(top=top)
+
+
+@debug_router.delete("/memory")
+def stop_memory_tracing():
+    """
+    Switch `tracemalloc` off again so allocations are no longer instrumented.
+
+    Returns:
+        dict: A status message.
+    """
+    memory_tracker.stop()
+    return {"status": "tracing stopped"}
@@ -1,12 +1,35 @@
-from fastapi import APIRouter, WebSocket, Depends, HTTPException, WebSocketDisconnect
+from typing import Optional
+from datetime import datetime
+from fastapi import APIRouter, Request, WebSocket, Depends, HTTPException, WebSocketDisconnect, Query, status
 from app.producers.kafka_producer import send_transaction_to_kafka
+from app.services.db_service import latest_transactions, query_transactions, search_transactions
+from app.utils.admission import AdmissionController
+from app.utils.rate_limiter import UserRateLimiter
+from app.utils.dedup import compute_idempotency_key
 from app.utils.database import SessionLocal
 from app.utils.models import Transaction
-from app.utils.schemas import TransactionSchema
+from app.utils.response_cache import ResponseCache
+from app.utils.transaction_buffer import transaction_buffer
+from app.utils.config import (
+    WS_SNAPSHOT_LIMIT,
+    KAFKA_TOPIC,
+    KAFKA_LOW_PRIORITY_TOPIC,
+    RATE_LIMIT_OVERFLOW,
+    SEARCH_PAGE_SIZE,
+    SEARCH_MAX_PAGE_SIZE,
+)
+from app.utils.micro_batcher import MicroBatcher
+from app.utils.offload import offload
+from app.utils.tracing import start_trace
+from app.utils.schemas import TransactionSchema, parse_transaction_time
 from sqlalchemy.orm import Session
-from app.utils.websocket_manager import websocket_endpoint, notify_clients, connected_clients
-from app.utils.logging_config import setup_logging
+from starlette.websockets import WebSocketState
+from app.utils.websocket_manager import Subscription, CoalescingPolicy, register_client, unregister_client, receive_client_messages
+from app.utils.logging_config import setup_logging, PER_TRANSACTION
+import base64
+import json
 import logging
+import time
 
 # Initialize logging for the module
 setup_logging()  
@@ -15,6 +38,30 @@ logger = logging.getLogger(__name__)
 # Create an APIRouter instance to handle transaction-related routes
 transaction_router = APIRouter()
 
+# Admission controller bounding concurrent Kafka publishes from the ingest route
+ingest_admission = AdmissionController("/api/transaction")
+
+# Per-user token buckets containing hot keys on the ingest routes
+ingest_rate_limiter = UserRateLimiter("/api/transaction")
+score_rate_limiter = UserRateLimiter("/api/score")
+
+
+def score_batch(transactions):
+    """
+    Score a micro-batch of transactions with the consumer's rules and model.
+    """
+    # Imported on first use so that importing the API does not pull in the ML stack
+    from app.consumers import kafka_consumer
+    kafka_consumer.bootstrap_consumer()
+    return kafka_consumer.score_with_probability(transactions)
+
+
+# Concurrent inline scoring requests, scored together
+score_batcher = MicroBatcher("/api/score", score_batch, pool="scoring")
+
+# Serialized transaction history, polled by the dashboards
+transactions_cache = ResponseCache("/api/transactions")
+
 # Dependency to get a database session
 def get_db():
     """
@@ -39,6 +86,12 @@ async def process_transaction(transaction: TransactionSchema, db: Session = Depe
 
     This endpoint processes incoming transactions and sends them to Kafka for further processing.
     The transaction is also converted to a dictionary, and the 'time' field is serialized to ISO format.
+    A trace context stamped with the arrival time travels in the Kafka headers, so the time until WebSocket
+    delivery can be measured hop by hop.
+
+    Each user may send `RATE_LIMIT_USER_RATE` transactions per second (bursts of `RATE_LIMIT_USER_BURST`).
+    Transactions over the limit are rejected, or with `RATE_LIMIT_OVERFLOW=low_priority` published to the
+    low-priority topic, which the consumer only reads with spare capacity.
 
     Args:
         transaction (TransactionSchema): The incoming transaction data in the request body.
@@ -46,83 +99,315 @@ async def process_transaction(transaction: TransactionSchema, db: Session = Depe
 
     Returns:
         dict: A response indicating that the transaction was successfully sent to Kafka.
+
+    Raises:
+        HTTPException: 429 with a `Retry-After` header when the user is over their rate or the adaptive
+            in-flight limit is reached, 503 with a `Retry-After` header when the transaction could not be
+            published to Kafka.
     """
+    trace = start_trace()
+
+    # Contain hot keys: a user over their rate is rejected or demoted to the low-priority topic
+    topic = KAFKA_TOPIC
+    if not ingest_rate_limiter.try_acquire(transaction.user_id):
+        if RATE_LIMIT_OVERFLOW != "low_priority":
+            raise HTTPException(
+                status_code=429,
+                detail="Too many transactions for this user, retry later",
+                headers={"Retry-After": str(ingest_rate_limiter.retry_after(transaction.user_id))}
+            )
+        topic = KAFKA_LOW_PRIORITY_TOPIC
+
+    # Shed load early instead of queueing behind a slow broker
+    if not ingest_admission.try_acquire():
+        raise HTTPException(
+            status_code=429,
+            detail="Too many transactions in flight, retry later",
+            headers={"Retry-After": str(ingest_admission.retry_after())}
+        )
+
+    start_time = time.monotonic()
+    sent = False
     try:    
-        logger.info(f"Transaction received: {transaction}")
+        logger.info("Transaction received: %s", transaction, extra=PER_TRANSACTION)
         
         # Convert the transaction to a dictionary and ensure 'time' is in ISO format
         transaction_data = transaction.dict()
         transaction_data['time'] = transaction_data['time'].isoformat()
 
-        # Send transaction to Kafka
-        send_transaction_to_kafka(transaction_data)
+        # Attach an idempotency key so redelivered messages can be recognised downstream
+        if not transaction_data.get('idempotency_key'):
+            transaction_data['idempotency_key'] = compute_idempotency_key(transaction_data)
+
+        # Send transaction to Kafka from the bounded kafka pool so the event loop is not blocked by the publish
+        sent = await offload("kafka", send_transaction_to_kafka, transaction_data, trace, topic)
+        if not sent:
+            raise HTTPException(
+                status_code=503,
+                detail="Transaction could not be published, retry later",
+                headers={"Retry-After": str(ingest_admission.retry_after())}
+            )
 
+        if topic == KAFKA_LOW_PRIORITY_TOPIC:
+            return {"status": "transaction queued at low priority", "transaction": transaction}
         return {"status": "transaction sent to Kafka", "transaction": transaction}
-    
+
+    except HTTPException:
+        raise
+
     except Exception as e:
         # Handle any error that occurs during transaction processing
         raise HTTPException(status_code=500, detail=f"Failed to process transaction: {e}")
 
+    finally:
+        # Feed the observed publish latency back into the admission controller
+        ingest_admission.release(time.monotonic() - start_time, success=bool(sent))
+
+# Endpoint to score a transaction inline, without going through Kafka (POST request)
+@transaction_router.post("/api/score")
+async def score_transaction(transaction: TransactionSchema):
+    """
+    Decide synchronously whether a transaction is fraudulent, e.g. during card authorization.
+
+    The transaction goes through the same rules and model as the Kafka consumer, but is neither published nor
+    stored. Concurrent requests are scored together in micro-batches that wait at most `SCORE_BATCH_WINDOW_MS`
+    to fill (less in latency SLO mode, see `SCORE_LATENCY_SLO_MS`). Users over their rate (see
+    `RATE_LIMIT_USER_RATE`) are rejected.
+
+    Args:
+        transaction (TransactionSchema): The transaction to score.
+
+    Returns:
+        dict: `is_fraud`, the fraud `probability` and whether the `rules` or the `model` decided.
+
+    Raises:
+        HTTPException: 429 with a `Retry-After` header when the user is over their rate, 503 when the
+            transaction could not be scored (e.g. the database is unavailable for the frequency feature).
+    """
+    if not score_rate_limiter.try_acquire(transaction.user_id):
+        raise HTTPException(
+            status_code=429,
+            detail="Too many transactions for this user, retry later",
+            headers={"Retry-After": str(score_rate_limiter.retry_after(transaction.user_id))}
+        )
+
+    transaction_data = transaction.dict()
+    transaction_data['time'] = transaction_data['time'].isoformat()
+    try:
+        return await score_batcher.submit(transaction_data)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Transaction could not be scored: {e}")
+
 # Endpoint to fetch the transaction history (GET request)
 @transaction_router.get("/api/transactions")
-def get_transactions(db: Session = Depends(get_db)):
+def get_transactions(request: Request, limit: Optional[int] = Query(None, ge=1), since_id: Optional[int] = None,
+                     fraud_only: bool = False, db: Session = Depends(get_db)):
     """
     Retrieve the history of all transactions stored in the database.
 
+    Dashboards that only need recent transactions can ask for the latest `limit` ones, the ones after
+    `since_id`, and/or only the fraudulent ones (e.g. `/api/transactions?limit=500&fraud_only=true`). These
+    queries are answered from the in-memory buffer of recent transactions, and from the database when they
+    reach further back than the buffer.
+
+    The serialized response is cached until the consumer persists its next batch. Responses carry an `ETag`;
+    polling clients that send it back in `If-None-Match` get an empty 304 while nothing has changed.
+
     Args:
+        request (Request): The incoming request.
+        limit (int, optional): Only return the latest `limit` matching transactions.
+        since_id (int, optional): Only return transactions with a greater id.
+        fraud_only (bool): Only return transactions classified as fraudulent.
         db (Session): SQLAlchemy session (injected dependency).
 
     Returns:
-        List[Transaction]: A list of all transaction records.
+        Response: A JSON list of the transaction records, oldest first, or 304 Not Modified.
+    """
+    def build():
+        if limit is None and since_id is None and not fraud_only:
+            transactions = [serialize_transaction(t) for t in
+                            db.query(Transaction).execution_options(query_name="list_transactions").all()]
+        else:
+            transactions = read_recent_transactions(db, limit, since_id, fraud_only)
+        return json.dumps(transactions, separators=(",", ":")).encode("utf-8")
+
+    return transactions_cache.respond(request, build)
+
+
+def read_recent_transactions(db, limit=None, since_id=None, fraud_only=False):
+    """
+    Answer a recent transactions query from the buffer, warming it from the database when it is cold and
+    falling back to the database for ranges older than the buffer.
+
+    Args:
+        db (Session): SQLAlchemy session used for the warm-up and the fallback.
+        limit (int, optional): Only return the latest `limit` matching transactions.
+        since_id (int, optional): Only return transactions with a greater id.
+        fraud_only (bool): Only return transactions classified as fraudulent.
+
+    Returns:
+        list[dict]: The matching transactions, oldest first, serialized like `serialize_transaction`.
     """
-    transactions = db.query(Transaction).all()
+    transactions = transaction_buffer.query(limit, since_id, fraud_only)
+    if transactions is None and not transaction_buffer.warm:
+        latest = latest_transactions(transaction_buffer.capacity, db)
+        transaction_buffer.warm_up(latest, complete=len(latest) < transaction_buffer.capacity)
+        transactions = transaction_buffer.query(limit, since_id, fraud_only)
+    if transactions is None:
+        transactions = [serialize_transaction(t) for t in query_transactions(limit, since_id, fraud_only, db)]
     return transactions
 
+
+@transaction_router.get("/api/transactions/search")
+def search_transaction_history(user_id: Optional[str] = None, is_fraud: Optional[bool] = None,
+                               location: Optional[str] = None, start: Optional[datetime] = None,
+                               end: Optional[datetime] = None, min_amount: Optional[float] = None,
+                               max_amount: Optional[float] = None,
+                               limit: int = Query(SEARCH_PAGE_SIZE, ge=1, le=SEARCH_MAX_PAGE_SIZE),
+                               cursor: Optional[str] = None, db: Session = Depends(get_db)):
+    """
+    Search the whole transaction history with server-side filters, newest first, one page at a time.
+
+    E.g. the fraud of a user in the last 7 days is `/api/transactions/search?user_id=user_1&is_fraud=true&start=...`
+    and all fraud in Chicago today `/api/transactions/search?location=Chicago&is_fraud=true&start=...`. Every
+    search must filter on `user_id`, `location` or `is_fraud=true`, so that it is answered from an index
+    rather than a scan of the table. Pass the `next_cursor` of a response as `cursor` to get the next page.
+
+    Args:
+        user_id (str, optional): Only transactions of this user.
+        is_fraud (bool, optional): Only fraudulent (true) or legitimate (false) transactions.
+        location (str, optional): Only transactions at this location.
+        start (datetime, optional): Only transactions at or after this time.
+        end (datetime, optional): Only transactions before this time.
+        min_amount (float, optional): Only transactions of at least this amount.
+        max_amount (float, optional): Only transactions of at most this amount.
+        limit (int): Page size, at most `SEARCH_MAX_PAGE_SIZE`.
+        cursor (str, optional): The `next_cursor` of the previous page.
+        db (Session): SQLAlchemy session (injected dependency).
+
+    Returns:
+        dict: The page of `transactions` and the `next_cursor`, None on the last page.
+
+    Raises:
+        HTTPException: 400 when no indexed filter is given or the cursor is invalid.
+    """
+    if user_id is None and location is None and is_fraud is not True:
+        raise HTTPException(status_code=400, detail="Filter on user_id, location or is_fraud=true")
+    try:
+        after = decode_search_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    # One extra row tells whether there is a next page
+    rows = search_transactions(
+        limit + 1, after, db, user_id=user_id, is_fraud=is_fraud, location=location,
+        start=parse_transaction_time(start) if start else None, end=parse_transaction_time(end) if end else None,
+        min_amount=min_amount, max_amount=max_amount,
+    )
+    page = rows[:limit]
+    return {
+        "transactions": [serialize_transaction(t) for t in page],
+        "next_cursor": encode_search_cursor(page[-1]) if len(rows) > limit else None,
+    }
+
+
+def encode_search_cursor(transaction):
+    """
+    Opaque cursor pointing after a transaction in the (time, id) order of a search.
+    """
+    key = json.dumps([transaction.time.isoformat(), transaction.id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(key.encode("utf-8")).decode("ascii")
+
+
+def decode_search_cursor(cursor):
+    """
+    The (time, id) position of a search cursor.
+
+    Raises:
+        ValueError: If the cursor was not made by `encode_search_cursor`.
+    """
+    try:
+        time_value, transaction_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+    if not isinstance(transaction_id, int):
+        raise ValueError("Invalid cursor: the id is not an integer")
+    return parse_transaction_time(time_value), transaction_id
+
+
+def serialize_transaction(transaction):
+    """
+    JSON-ready dict of every column of a transaction row.
+    """
+    return {
+        "id": transaction.id,
+        "user_id": transaction.user_id,
+        "amount": transaction.amount,
+        "location": transaction.location,
+        "time": transaction.time.isoformat(),
+        "is_fraud": transaction.is_fraud,
+        "idempotency_key": transaction.idempotency_key,
+    }
+
 # WebSocket endpoint to handle real-time transaction updates
 @transaction_router.websocket("/api/ws")
 async def websocket_endpoint(websocket: WebSocket, db: Session = Depends(get_db)):
     """
     Establishes a WebSocket connection to provide real-time transaction updates to connected clients.
 
-    When a client connects via WebSocket, they will initially receive the full transaction history
-    and continue to receive real-time updates as new transactions are processed.
+    When a client connects via WebSocket, they will initially receive the latest `WS_SNAPSHOT_LIMIT`
+    transactions (the whole history if it is 0), served from the recent transactions buffer, and continue to
+    receive real-time updates as new transactions are processed. An initial subscription can be given in the
+    URL, e.g. `/api/ws?user_ids=user_1&fraud_only=true`; it filters both the history and the live updates.
+    Subscription messages sent later, e.g. `{"user_ids": ["user_1"], "fraud_only": true}`, narrow the live
+    updates only.
+
+    High-rate clients can ask for coalesced delivery with `coalesce_ms` and/or `coalesce_max`
+    (e.g. `/api/ws?coalesce_ms=50&coalesce_max=200`): transactions then arrive as JSON arrays, one frame
+    per interval or per `coalesce_max` events. Frames are compressed with permessage-deflate when the
+    client offers it and `WS_PER_MESSAGE_DEFLATE` is enabled.
 
     Args:
         websocket (WebSocket): The WebSocket connection instance.
         db (Session): SQLAlchemy session (injected dependency).
     """
+    try:
+        coalescing = CoalescingPolicy.from_query_params(websocket.query_params)
+    except ValueError as e:
+        # Refuse the handshake when the requested delivery mode is invalid
+        logger.warning("Rejected WebSocket connection: %s", e)
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
     # Accept the WebSocket connection
     await websocket.accept()
-    connected_clients.append(websocket)
-    logger.info(f"WebSocket connection established. Total clients: {len(connected_clients)}")
+    connection = register_client(websocket, Subscription.from_query_params(websocket.query_params), coalescing)
 
     try:
-        # Step 1: Send existing transactions from the database to the connected WebSocket client
-        transactions = db.query(Transaction).all()
-        for transaction in transactions:
-            await websocket.send_json({
-                "id": transaction.id,
-                "amount": transaction.amount,
-                "location": transaction.location,
-                "user_id": transaction.user_id,
-                "time": transaction.time.isoformat(),
-                "is_fraud": transaction.is_fraud
-            })
-
-        # Step 2: Keep the WebSocket connection open to push real-time updates
-        while True:
-            await websocket.receive_text()  # Listen for incoming messages 
+        # Step 1: Send the existing transactions matching the subscription to the connected WebSocket client
+        if WS_SNAPSHOT_LIMIT:
+            transactions = await offload("db", read_recent_transactions, db, WS_SNAPSHOT_LIMIT,
+                                         fraud_only=connection.subscription.fraud_only)
+        else:
+            rows = await offload("db", db.query(Transaction).execution_options(query_name="websocket_snapshot").all)
+            transactions = [serialize_transaction(t) for t in rows]
+        for transaction_data in transactions:
+            if connection.subscription.matches(transaction_data):
+                await connection.send(json.dumps(transaction_data, separators=(",", ":")))
 
-    except Exception as e:
-        # Log any errors that occur during the WebSocket interaction
-        logger.error(f"WebSocket error: {e}", exc_info=True)
+        # Step 2: Keep the WebSocket connection open to push real-time updates and apply subscription messages
+        await receive_client_messages(connection)
 
     except WebSocketDisconnect:
         # Handle the WebSocket disconnection
-        connected_clients.remove(websocket)
-        logger.info(f"WebSocket client disconnected. Total clients: {len(connected_clients)}")
-    
+        pass
+
+    except Exception as e:
+        # Log any errors that occur during the WebSocket interaction and tell the client the server gave up
+        logger.error("WebSocket error: %s", e, exc_info=True)
+        if websocket.client_state == WebSocketState.CONNECTED:
+            await websocket.close(code=status.WS_1011_INTERNAL_ERROR)
+
     finally:
         # Clean up WebSocket connection on disconnection or error
-        if websocket in connected_clients:
-            connected_clients.remove(websocket)
+        unregister_client(connection)
@@ -1,7 +1,17 @@
+from sqlalchemy import tuple_, true, false
 from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects import postgresql, sqlite
 from app.utils.database import SessionLocal
-from app.utils.models import Transaction
+from app.utils.models import Transaction, ConsumerOffset
+from app.utils.schemas import parse_transaction_time
 from datetime import datetime
+from app.utils.logging_config import setup_logging, PER_TRANSACTION
+import logging
+
+# Initialize logging for this module
+setup_logging()
+logger = logging.getLogger(__name__)
 
 def save_transaction_to_db(transaction_data, is_fraud, db: Session = None):
     """
@@ -17,7 +27,8 @@ def save_transaction_to_db(transaction_data, is_fraud, db: Session = None):
         db (Session, optional): SQLAlchemy session instance. If not provided, a new session is created.
 
     Returns:
-        Transaction: The saved transaction object from the database.
+        Transaction: The saved transaction object from the database, or None if the transaction could not be
+            saved (for example because a row with the same idempotency key already exists).
 
     Raises:
         Exception: If there is any error during the saving process, the transaction is rolled back and the error is logged.
@@ -31,8 +42,9 @@ def save_transaction_to_db(transaction_data, is_fraud, db: Session = None):
             user_id=transaction_data['user_id'],
             amount=transaction_data['amount'],
             location=transaction_data['location'],
-            time=datetime.strptime(transaction_data['time'], "%Y-%m-%dT%H:%M:%S"),  # Parse time into a datetime object
-            is_fraud=is_fraud  # Set the fraud status
+            time=parse_transaction_time(transaction_data['time']),  # Parse time into a datetime object
+            is_fraud=is_fraud,  # Set the fraud status
+            idempotency_key=transaction_data.get('idempotency_key')  # Unique key rejecting redelivered duplicates
         )
 
         # Add and commit the new transaction to the database
@@ -42,15 +54,382 @@ def save_transaction_to_db(transaction_data, is_fraud, db: Session = None):
         # Refresh the session to ensure the latest data is returned
         db.refresh(transaction)
         
-        print(f"Transaction saved: {transaction}")
+        logger.info("Transaction saved: %s", transaction, extra=PER_TRANSACTION)
         
         return transaction  # Return the saved transaction object
 
+    except IntegrityError as e:
+        db.rollback()
+        if is_duplicate_key_error(e):
+            # A row with the same idempotency key already exists: the message was a redelivery
+            logger.info("Duplicate transaction ignored: %s", transaction_data.get('idempotency_key'), extra=PER_TRANSACTION)
+        else:
+            logger.error("Transaction rejected by the database: %s", e)
+
     except Exception as e:
         # Rollback the session in case of an error
         db.rollback()
-        print(f"Error saving transaction to the database: {e}")
+        logger.error("Error saving transaction to the database: %s", e)
     
     finally:
         # Close the session after the transaction is processed
         db.close()
+
+
+def is_duplicate_key_error(error):
+    """
+    Tell whether an IntegrityError was raised by the idempotency key unique index.
+
+    Args:
+        error (IntegrityError): The error raised by the database.
+
+    Returns:
+        bool: True for a duplicate idempotency key, False for any other constraint violation.
+    """
+    return 'idempotency_key' in str(getattr(error, 'orig', error))
+
+
+def build_transaction(transaction_data, is_fraud):
+    """
+    Build a Transaction row from consumed transaction data.
+
+    Args:
+        transaction_data (dict): The transaction details ('user_id', 'amount', 'location', 'time' and
+            optionally 'idempotency_key').
+        is_fraud (bool): Whether the transaction was classified as fraudulent.
+
+    Returns:
+        Transaction: A new, not yet persisted Transaction object.
+    """
+    return Transaction(
+        user_id=transaction_data['user_id'],
+        amount=transaction_data['amount'],
+        location=transaction_data['location'],
+        time=parse_transaction_time(transaction_data['time']),
+        is_fraud=bool(is_fraud),
+        idempotency_key=transaction_data.get('idempotency_key')
+    )
+
+
+def save_transactions_batch(transactions, offsets, group_id, db: Session = None, rejected=None):
+    """
+    Save a batch of scored transactions and the Kafka offsets they came from in a single database transaction.
+
+    Rows and offsets become visible together, so after a crash the offsets recorded in the database point
+    exactly at the first message that was not persisted. Rows rejected by the idempotency key constraint
+    (redeliveries) are skipped individually without failing the rest of the batch; rows violating any other
+    constraint are logged as errors and skipped the same way, so a single bad row cannot block the partition.
+
+    Args:
+        transactions (list[Transaction]): Rows built with `build_transaction`, not yet added to a session.
+        offsets (dict): Mapping of (topic, partition) to the next offset to consume.
+        group_id (str): The Kafka consumer group owning the offsets.
+        db (Session, optional): SQLAlchemy session instance. If not provided, a new session is created.
+        rejected (list, optional): Receives a (Transaction, IntegrityError) tuple for every row rejected by a
+            constraint other than the idempotency key.
+
+    Returns:
+        list[Transaction]: The transactions that were inserted, in batch order.
+
+    Raises:
+        Exception: Any database error other than a constraint violation; the whole batch is rolled back.
+    """
+    db = db or SessionLocal()
+    db.expire_on_commit = False  # Saved rows are read after the session is closed
+
+    try:
+        try:
+            db.add_all(transactions)
+            db.flush()
+            saved = list(transactions)
+        except IntegrityError:
+            # At least one row violates a constraint: insert row by row, skipping the rejected rows
+            db.rollback()
+            saved = []
+            for transaction in transactions:
+                try:
+                    with db.begin_nested():
+                        db.add(transaction)
+                    saved.append(transaction)
+                except IntegrityError as e:
+                    if is_duplicate_key_error(e):
+                        logger.info("Duplicate transaction ignored: %s", transaction.idempotency_key, extra=PER_TRANSACTION)
+                    else:
+                        logger.error("Transaction rejected by the database: %s", e)
+                        if rejected is not None:
+                            rejected.append((transaction, e))
+
+        # Record the consumed positions in the same transaction as the rows
+        now = datetime.utcnow()
+        for (topic, partition), offset in offsets.items():
+            db.merge(ConsumerOffset(group_id=group_id, topic=topic, partition=partition, offset=offset, updated_at=now))
+
+        db.commit()
+        return saved
+
+    except Exception:
+        db.rollback()
+        raise
+
+    finally:
+        db.close()
+
+
+def get_committed_offsets(group_id, db: Session = None):
+    """
+    Load the offsets recorded for a consumer group by `save_transactions_batch`.
+
+    Args:
+        group_id (str): The Kafka consumer group.
+        db (Session, optional): SQLAlchemy session instance. If not provided, a new session is created.
+
+    Returns:
+        dict: Mapping of (topic, partition) to the next offset to consume.
+    """
+    db = db or SessionLocal()
+    try:
+        rows = db.query(ConsumerOffset).filter(ConsumerOffset.group_id == group_id) \
+            .execution_options(query_name="committed_offsets") \
+            .all()
+        return {(row.topic, row.partition): row.offset for row in rows}
+    finally:
+        db.close()
+
+
+def transaction_exists(idempotency_key, db: Session = None):
+    """
+    Check whether a transaction with the given idempotency key has already been saved.
+
+    Args:
+        idempotency_key (str): The idempotency key to look up.
+        db (Session, optional): SQLAlchemy session instance. If not provided, a new session is created.
+
+    Returns:
+        bool: True if a row with this key exists in the database.
+    """
+    db = db or SessionLocal()
+    try:
+        return db.query(Transaction.id).filter(Transaction.idempotency_key == idempotency_key) \
+            .execution_options(query_name="transaction_exists") \
+            .first() is not None
+    finally:
+        db.close()
+
+
+def recent_idempotency_keys(limit, db: Session = None):
+    """
+    Load the idempotency keys of the most recently saved transactions.
+
+    Args:
+        limit (int): Maximum number of keys to return.
+        db (Session, optional): SQLAlchemy session instance. If not provided, a new session is created.
+
+    Returns:
+        list[str]: The keys, oldest first.
+    """
+    db = db or SessionLocal()
+    try:
+        rows = db.query(Transaction.idempotency_key) \
+            .filter(Transaction.idempotency_key.isnot(None)) \
+            .order_by(Transaction.id.desc()) \
+            .limit(limit) \
+            .execution_options(query_name="recent_idempotency_keys") \
+            .all()
+        return [row.idempotency_key for row in reversed(rows)]
+    finally:
+        db.close()
+
+
+def latest_transactions(limit, db: Session = None):
+    """
+    Load the most recently saved transactions, to warm the recent transactions buffer.
+
+    Args:
+        limit (int): Maximum number of transactions to return.
+        db (Session, optional): SQLAlchemy session instance. If not provided, a new session is created.
+
+    Returns:
+        list[Transaction]: The transactions, newest first.
+    """
+    db = db or SessionLocal()
+    try:
+        return db.query(Transaction) \
+            .order_by(Transaction.id.desc()) \
+            .limit(limit) \
+            .execution_options(query_name="latest_transactions") \
+            .all()
+    finally:
+        db.close()
+
+
+def query_transactions(limit=None, since_id=None, fraud_only=False, db: Session = None):
+    """
+    Load the transactions matching a recent transactions query the buffer could not answer.
+
+    Args:
+        limit (int, optional): Only return the latest `limit` matching transactions.
+        since_id (int, optional): Only return transactions with a greater id.
+        fraud_only (bool): Only return transactions classified as fraudulent.
+        db (Session, optional): SQLAlchemy session instance. If not provided, a new session is created.
+
+    Returns:
+        list[Transaction]: The transactions, oldest first.
+    """
+    db = db or SessionLocal()
+    try:
+        query = db.query(Transaction)
+        if since_id is not None:
+            query = query.filter(Transaction.id > since_id)
+        if fraud_only:
+            query = query.filter(Transaction.is_fraud.is_(True))
+        if limit is None:
+            return query.order_by(Transaction.id).execution_options(query_name="query_transactions").all()
+        rows = query.order_by(Transaction.id.desc()).limit(limit).execution_options(query_name="query_transactions").all()
+        return rows[::-1]
+    finally:
+        db.close()
+
+
+def build_search_query(db, limit, after=None, user_id=None, is_fraud=None, location=None, start=None, end=None,
+                       min_amount=None, max_amount=None):
+    """
+    Query of one page of a transaction search, newest first.
+
+    Pages are ordered by (time, id) and continue strictly after the last row of the previous page (keyset
+    pagination), so every page costs the same however deep the client pages. The filters match the indexes
+    of the transactions table: `user_id`, `location` and `time` (`ix_transactions_location_time`) and
+    `is_fraud = true` with `time` (the partial `ix_transactions_fraud_time`).
+
+    Args:
+        db (Session): SQLAlchemy session.
+        limit (int): Most transactions returned.
+        after (tuple[datetime, int], optional): Time and id of the last transaction of the previous page.
+        user_id (str, optional): Only transactions of this user.
+        is_fraud (bool, optional): Only fraudulent (True) or legitimate (False) transactions.
+        location (str, optional): Only transactions at this location.
+        start (datetime, optional): Only transactions at or after this time.
+        end (datetime, optional): Only transactions before this time.
+        min_amount (float, optional): Only transactions of at least this amount.
+        max_amount (float, optional): Only transactions of at most this amount.
+
+    Returns:
+        Query: The page query.
+    """
+    query = db.query(Transaction)
+    if user_id is not None:
+        query = query.filter(Transaction.user_id == user_id)
+    if is_fraud is not None:
+        # A literal rather than a bound parameter, so the planner can match the partial index
+        query = query.filter(Transaction.is_fraud == (true() if is_fraud else false()))
+    if location is not None:
+        query = query.filter(Transaction.location == location)
+    if start is not None:
+        query = query.filter(Transaction.time >= start)
+    if end is not None:
+        query = query.filter(Transaction.time < end)
+    if min_amount is not None:
+        query = query.filter(Transaction.amount >= min_amount)
+    if max_amount is not None:
+        query = query.filter(Transaction.amount <= max_amount)
+    if after is not None:
+        query = query.filter(tuple_(Transaction.time, Transaction.id) < tuple_(*after))
+    return query.order_by(Transaction.time.desc(), Transaction.id.desc()) \
+        .limit(limit) \
+        .execution_options(query_name="search_transactions")
+
+
+def search_transactions(limit, after=None, db: Session = None, **filters):
+    """
+    Load one page of a transaction search, see `build_search_query`.
+
+    Args:
+        limit (int): Most transactions returned.
+        after (tuple[datetime, int], optional): Time and id of the last transaction of the previous page.
+        db (Session, optional): SQLAlchemy session instance. If not provided, a new session is created.
+        **filters: The filters of `build_search_query`.
+
+    Returns:
+        list[Transaction]: The transactions, newest first.
+    """
+    db = db or SessionLocal()
+    try:
+        return build_search_query(db, limit, after, **filters).all()
+    finally:
+        db.close()
+
+
+def recent_user_activity(since, db: Session = None):
+    """
+    Load the user and time of every transaction at or after `since`, to warm the per-user history in bulk.
+
+    Args:
+        since (datetime): Earliest transaction time to load.
+        db (Session, optional): SQLAlchemy session instance. If not provided, a new session is created.
+
+    Returns:
+        list[tuple[str, datetime]]: (user_id, time) pairs.
+    """
+    db = db or SessionLocal()
+    try:
+        rows = db.query(Transaction.user_id, Transaction.time) \
+            .filter(Transaction.time >= since) \
+            .execution_options(query_name="recent_user_activity") \
+            .all()
+        return [(row.user_id, row.time) for row in rows]
+    finally:
+        db.close()
+
+
+def upsert_transactions(transactions, db: Session = None, chunk_size=5000):
+    """
+    Bulk insert transactions, overwriting the fraud decision of rows that already exist.
+
+    Rows are matched on their idempotency key with `INSERT ... ON CONFLICT DO UPDATE` statements of up to
+    `chunk_size` rows (keeping PostgreSQL below its bind parameter limit), all in one database transaction.
+    This lets a replay re-score transactions that were already stored. Rows without an idempotency key are
+    always inserted.
+
+    Args:
+        transactions (list[Transaction]): Rows built with `build_transaction`.
+        db (Session, optional): SQLAlchemy session instance. If not provided, a new session is created.
+        chunk_size (int): Maximum number of rows per statement.
+
+    Returns:
+        int: Number of rows inserted or updated.
+
+    Raises:
+        Exception: Any database error; nothing is written.
+    """
+    if not transactions:
+        return 0
+
+    db = db or SessionLocal()
+    try:
+        dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+        written = 0
+        for start in range(0, len(transactions), chunk_size):
+            statement = dialect.insert(Transaction).values([
+                {
+                    "user_id": t.user_id,
+                    "amount": t.amount,
+                    "location": t.location,
+                    "time": t.time,
+                    "is_fraud": t.is_fraud,
+                    "idempotency_key": t.idempotency_key,
+                }
+                for t in transactions[start:start + chunk_size]
+            ])
+            statement = statement.on_conflict_do_update(
+                index_elements=[Transaction.idempotency_key],
+                set_={"is_fraud": statement.excluded.is_fraud}
+            ).execution_options(query_name="upsert_transactions")
+            written += db.execute(statement).rowcount
+        db.commit()
+        return written
+
+    except Exception:
+        db.rollback()
+        raise
+
+    finally:
+        db.close()
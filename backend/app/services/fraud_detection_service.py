@@ -1,5 +1,10 @@
 import pickle
 import os
+import threading
+
+# Cached (model, scaler) pair, loaded on first use instead of at import time
+_fraud_model = None
+_fraud_model_lock = threading.Lock()
 
 # Load the trained model and scaler
 def load_fraud_model():
@@ -30,3 +35,33 @@ def load_fraud_model():
 
     # Return both the model and the scaler
     return model, scaler
+
+
+def get_fraud_model():
+    """
+    Return the fraud detection model and scaler, loading them on first use.
+
+    Unpickling the model imports scikit-learn, which is expensive, so it is deferred until the model is
+    actually needed and then shared by every caller in the process.
+
+    Returns:
+        tuple: A tuple containing the trained fraud detection model and the scaler.
+    """
+    global _fraud_model
+    if _fraud_model is None:
+        with _fraud_model_lock:
+            if _fraud_model is None:
+                _fraud_model = load_fraud_model()
+    return _fraud_model
+
+
+def warm_up_model(model):
+    """
+    Run a dummy prediction so the first real transaction does not pay for lazy initialisation.
+
+    Args:
+        model: The loaded fraud detection model.
+    """
+    import numpy as np
+
+    model.predict(np.zeros((1, model.n_features_in_)))
@@ -0,0 +1,212 @@
+import operator
+import numpy as np
+import yaml
+from prometheus_client import Counter, Gauge
+from app.utils.config import FRAUD_RULES_PATH
+from app.utils.schemas import parse_transaction_time
+from app.utils.logging_config import setup_logging
+import logging
+
+# Initialize logging for this module
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Prometheus metrics showing how much model work the rule stage saves
+rule_hits = Counter('fraud_rule_hits_total', 'Transactions decided by each rule', ['rule'])
+ml_bypassed = Counter('fraud_ml_bypassed_total', 'Transactions decided by the rule stage without calling the model')
+ml_evaluated = Counter('fraud_ml_evaluated_total', 'Transactions passed on to the model by the rule stage')
+ml_bypass_ratio = Gauge('fraud_ml_bypass_ratio', 'Share of transactions decided without calling the model', multiprocess_mode='liveall')
+
+# Decision codes returned by RuleSet.evaluate
+UNDECIDED = -1
+LEGIT = 0
+FRAUD = 1
+
+DECISIONS = {"legit": LEGIT, "fraud": FRAUD}
+
+# Comparison operators supported in the YAML `when` clauses, mapped to vectorized NumPy predicates
+OPERATORS = {
+    "gt": operator.gt,
+    "gte": operator.ge,
+    "lt": operator.lt,
+    "lte": operator.le,
+    "eq": operator.eq,
+    "ne": operator.ne,
+    "in": lambda column, values: np.isin(column, values),
+    "not_in": lambda column, values: ~np.isin(column, values),
+}
+
+# Fields the rules may reference, with the function extracting each one from a raw transaction
+FIELDS = {
+    "amount": (lambda t: float(t['amount']), np.float64),
+    "location": (lambda t: t['location'], object),
+    "user_id": (lambda t: t['user_id'], object),
+    "transaction_hour": (lambda t: parse_transaction_time(t['time']).hour, np.int64),
+}
+
+
+class Rule:
+    """
+    A single compiled rule.
+
+    Attributes:
+        name (str): Rule name, used as the metric label.
+        decision (int): FRAUD or LEGIT, applied when every condition matches.
+        conditions (list): (field, predicate, value) triples evaluated against column arrays.
+    """
+
+    def __init__(self, name, decision, conditions):
+        self.name = name
+        self.decision = decision
+        self.conditions = conditions
+
+    def matches(self, columns, size):
+        """
+        Evaluate the rule against a batch of transactions.
+
+        Args:
+            columns (dict): Field name to NumPy column array.
+            size (int): Number of transactions in the batch.
+
+        Returns:
+            np.ndarray: Boolean mask of the transactions matching every condition of the rule.
+        """
+        mask = np.ones(size, dtype=bool)
+        for field, predicate, value in self.conditions:
+            mask &= predicate(columns[field], value)
+        return mask
+
+
+class RuleSet:
+    """
+    Ordered collection of compiled rules evaluated ahead of the fraud detection model.
+
+    The first rule matching a transaction decides it. Transactions matching no rule are left UNDECIDED
+    and must be scored by the model.
+    """
+
+    def __init__(self, rules):
+        self.rules = rules
+        self.fields = sorted({field for rule in rules for field, _, _ in rule.conditions})
+        self._decided = 0
+        self._total = 0
+
+    def evaluate(self, transactions):
+        """
+        Evaluate all rules against a batch of raw transactions.
+
+        Args:
+            transactions (list[dict]): Raw transactions as consumed from Kafka.
+
+        Returns:
+            np.ndarray: One decision code per transaction (FRAUD, LEGIT or UNDECIDED).
+        """
+        size = len(transactions)
+        decisions = np.full(size, UNDECIDED, dtype=np.int8)
+        if not self.rules or size == 0:
+            self._record(size, 0)
+            return decisions
+
+        # Build only the columns the rules actually reference
+        columns = {}
+        for field in self.fields:
+            extract, dtype = FIELDS[field]
+            columns[field] = np.array([extract(t) for t in transactions], dtype=dtype)
+
+        undecided = np.ones(size, dtype=bool)
+        for rule in self.rules:
+            hits = rule.matches(columns, size) & undecided
+            hit_count = int(hits.sum())
+            if hit_count:
+                decisions[hits] = rule.decision
+                undecided &= ~hits
+                rule_hits.labels(rule=rule.name).inc(hit_count)
+                if not undecided.any():
+                    break
+
+        self._record(size, size - int(undecided.sum()))
+        return decisions
+
+    def decide(self, transaction):
+        """
+        Evaluate the rules against a single transaction.
+
+        Args:
+            transaction (dict): Raw transaction as consumed from Kafka.
+
+        Returns:
+            bool or None: The fraud decision taken by a rule, or None if the model must score the transaction.
+        """
+        decision = self.evaluate([transaction])[0]
+        return None if decision == UNDECIDED else bool(decision == FRAUD)
+
+    def _record(self, total, decided):
+        # Update the bypass counters and the overall bypass ratio
+        ml_bypassed.inc(decided)
+        ml_evaluated.inc(total - decided)
+        self._decided += decided
+        self._total += total
+        if self._total:
+            ml_bypass_ratio.set(self._decided / self._total)
+
+
+def compile_rules(config):
+    """
+    Compile a parsed rules document into a RuleSet.
+
+    Args:
+        config (dict): The parsed YAML document, with a top-level `rules` list.
+
+    Returns:
+        RuleSet: The compiled rule set.
+
+    Raises:
+        ValueError: If a rule references an unknown field, operator or decision.
+    """
+    rules = []
+    for index, spec in enumerate((config or {}).get('rules') or []):
+        name = spec.get('name', f"rule_{index}")
+        decision = DECISIONS.get(str(spec.get('decision', '')).lower())
+        if decision is None:
+            raise ValueError(f"Rule '{name}' has an invalid decision: {spec.get('decision')}")
+
+        conditions = []
+        for field, checks in (spec.get('when') or {}).items():
+            if field not in FIELDS:
+                raise ValueError(f"Rule '{name}' references an unknown field: {field}")
+            for op_name, value in checks.items():
+                if op_name not in OPERATORS:
+                    raise ValueError(f"Rule '{name}' uses an unknown operator: {op_name}")
+                if op_name in ("in", "not_in"):
+                    value = np.array(value, dtype=FIELDS[field][1])
+                conditions.append((field, OPERATORS[op_name], value))
+
+        if not conditions:
+            raise ValueError(f"Rule '{name}' has no conditions")
+        rules.append(Rule(name, decision, conditions))
+
+    return RuleSet(rules)
+
+
+def load_rule_set(path=FRAUD_RULES_PATH):
+    """
+    Load and compile the rule stage from a YAML file.
+
+    A missing file yields an empty rule set, so every transaction goes to the model.
+
+    Args:
+        path (str): Path to the YAML rules file.
+
+    Returns:
+        RuleSet: The compiled rule set.
+    """
+    try:
+        with open(path, 'r') as rules_file:
+            config = yaml.safe_load(rules_file)
+    except FileNotFoundError:
+        logger.warning(f"Rules file not found at {path}, all transactions will be scored by the model")
+        return RuleSet([])
+
+    rule_set = compile_rules(config)
+    logger.info(f"Loaded {len(rule_set.rules)} fraud rules from {path}")
+    return rule_set
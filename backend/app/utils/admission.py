@@ -0,0 +1,99 @@
+import math
+import threading
+from prometheus_client import Counter, Gauge
+from app.utils.config import (
+    ADMISSION_INITIAL_LIMIT,
+    ADMISSION_MIN_LIMIT,
+    ADMISSION_MAX_LIMIT,
+    ADMISSION_TARGET_LATENCY_MS,
+    ADMISSION_BACKOFF_RATIO,
+)
+from app.utils.logging_config import setup_logging
+import logging
+
+# Initialize logging for this module
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Prometheus metrics describing admission decisions on the ingest routes
+admission_admitted = Counter('admission_admitted_total', 'Requests admitted by the admission controller', ['route'])
+admission_rejected = Counter('admission_rejected_total', 'Requests rejected by the admission controller', ['route'])
+admission_in_flight = Gauge('admission_in_flight', 'Requests currently holding an admission slot', ['route'], multiprocess_mode='livesum')
+admission_limit = Gauge('admission_limit', 'Current adaptive in-flight limit', ['route'], multiprocess_mode='liveall')
+
+
+class AdmissionController:
+    """
+    Adaptive concurrency limiter for the ingest routes.
+
+    The controller bounds the number of requests that may publish to Kafka at the same time. The bound
+    follows an AIMD (additive increase, multiplicative decrease) policy driven by the observed publish latency:
+    every fast, successful publish grows the limit by roughly one slot per "window" of requests, and every
+    slow or failed publish shrinks it by `backoff_ratio`. Requests that arrive while the limit is reached
+    are rejected straight away so the caller can answer with 429 instead of queueing behind a slow broker.
+
+    Attributes:
+        name (str): Label used for the Prometheus metrics (usually the route path).
+        limit (float): The current in-flight limit.
+        in_flight (int): Number of requests currently admitted and not yet released.
+    """
+
+    def __init__(self, name, initial_limit=ADMISSION_INITIAL_LIMIT, min_limit=ADMISSION_MIN_LIMIT,
+                 max_limit=ADMISSION_MAX_LIMIT, target_latency_ms=ADMISSION_TARGET_LATENCY_MS,
+                 backoff_ratio=ADMISSION_BACKOFF_RATIO):
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency_ms / 1000.0
+        self.backoff_ratio = backoff_ratio
+        self.limit = float(min(max(initial_limit, min_limit), max_limit))
+        self.in_flight = 0
+        self.latency_ewma = self.target_latency  # Smoothed publish latency, used for the Retry-After estimate
+        self._lock = threading.Lock()  # Releases may happen from worker threads
+        admission_limit.labels(route=name).set(self.limit)
+
+    def try_acquire(self):
+        """
+        Try to take an admission slot without waiting.
+
+        Returns:
+            bool: True if the request was admitted, False if the in-flight limit is reached.
+        """
+        with self._lock:
+            if self.in_flight >= int(self.limit):
+                admission_rejected.labels(route=self.name).inc()
+                return False
+            self.in_flight += 1
+        admission_admitted.labels(route=self.name).inc()
+        admission_in_flight.labels(route=self.name).inc()
+        return True
+
+    def release(self, latency, success=True):
+        """
+        Return an admission slot and feed the observed latency into the AIMD policy.
+
+        Args:
+            latency (float): Time in seconds the admitted request spent publishing.
+            success (bool): Whether the publish succeeded. Failures are treated like slow publishes.
+        """
+        with self._lock:
+            self.in_flight -= 1
+            self.latency_ewma = 0.8 * self.latency_ewma + 0.2 * latency
+            if success and latency <= self.target_latency:
+                # Additive increase: about +1 slot once a full window of requests has completed
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            else:
+                # Multiplicative decrease on congestion or failure
+                self.limit = max(self.min_limit, self.limit * self.backoff_ratio)
+            current_limit = self.limit
+        admission_in_flight.labels(route=self.name).dec()
+        admission_limit.labels(route=self.name).set(current_limit)
+
+    def retry_after(self):
+        """
+        Estimate how many seconds a rejected client should wait before retrying.
+
+        Returns:
+            int: Whole seconds (at least 1) derived from the smoothed publish latency.
+        """
+        return max(1, math.ceil(self.latency_ewma))
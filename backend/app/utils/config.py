@@ -26,5 +26,118 @@ POSTGRES_DB = os.getenv("POSTGRES_DB", "fraud_detection")  # Default to 'fraud_d
 POSTGRES_HOST = os.getenv("POSTGRES_HOST", "localhost")  # Default to 'localhost' if not found in .env
 POSTGRES_PORT = os.getenv("POSTGRES_PORT", 5432)  # Default to port 5432 if not found in .env
 
+# SQLAlchemy connection pool and query timing
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))  # Connections kept open in the pool
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))  # Extra connections opened when the pool is exhausted
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", 30))  # Longest wait for a free connection before an error
+DB_POOL_RECYCLE_SECONDS = int(os.getenv("DB_POOL_RECYCLE_SECONDS", -1))  # Reconnect connections older than this (-1 keeps them forever)
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "false").lower() in ("1", "true", "yes")  # Test each connection on checkout (one extra round trip)
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", 500))  # Statements slower than this are logged with their SQL and parameters
+
 # CORS configuration for Frontend access
 CORS_ORIGIN = os.getenv("CORS_ORIGIN", "http://localhost:3001")  # Default to 'http://localhost:3001' if not found in .env
+
+# Admission control for the ingest routes (adaptive in-flight limit based on Kafka publish latency)
+ADMISSION_INITIAL_LIMIT = int(os.getenv("ADMISSION_INITIAL_LIMIT", 32))  # Starting number of concurrent publishes allowed
+ADMISSION_MIN_LIMIT = int(os.getenv("ADMISSION_MIN_LIMIT", 4))  # The limit never shrinks below this value
+ADMISSION_MAX_LIMIT = int(os.getenv("ADMISSION_MAX_LIMIT", 256))  # The limit never grows above this value
+ADMISSION_TARGET_LATENCY_MS = float(os.getenv("ADMISSION_TARGET_LATENCY_MS", 250))  # Publish latency above this shrinks the limit
+ADMISSION_BACKOFF_RATIO = float(os.getenv("ADMISSION_BACKOFF_RATIO", 0.9))  # Multiplicative decrease applied on slow or failed publishes
+
+# Per-user token bucket on the ingest routes, so one user cannot flood the pipeline (limits apply per API process)
+RATE_LIMIT_USER_RATE = float(os.getenv("RATE_LIMIT_USER_RATE", 10))  # Sustained transactions per second per user (0 disables the limit)
+RATE_LIMIT_USER_BURST = float(os.getenv("RATE_LIMIT_USER_BURST", 20))  # Transactions a user may send at once
+RATE_LIMIT_MAX_USERS = int(os.getenv("RATE_LIMIT_MAX_USERS", 100000))  # Token buckets kept in memory; idle buckets are dropped first
+RATE_LIMIT_OVERFLOW = os.getenv("RATE_LIMIT_OVERFLOW", "reject")  # Over-limit transactions: 'reject' (429) or 'low_priority' (KAFKA_LOW_PRIORITY_TOPIC)
+RATE_LIMIT_HOT_KEYS = int(os.getenv("RATE_LIMIT_HOT_KEYS", 10))  # Busiest users exported as metrics
+RATE_LIMIT_HOT_WINDOW_SECONDS = float(os.getenv("RATE_LIMIT_HOT_WINDOW_SECONDS", 60))  # Window over which the busiest users are counted
+KAFKA_LOW_PRIORITY_TOPIC = os.getenv("KAFKA_LOW_PRIORITY_TOPIC", f"{KAFKA_TOPIC}.low-priority")  # Same partition count as KAFKA_TOPIC; consumed with spare capacity only
+
+# Rule stage evaluated ahead of the ML model (YAML file compiled into vectorized predicates at load time)
+FRAUD_RULES_PATH = os.getenv("FRAUD_RULES_PATH", str(Path(__file__).resolve().parent.parent / "fraud_detection" / "rules.yaml"))
+
+# Duplicate suppression for redelivered Kafka messages (LRU of recent idempotency keys backed by a Bloom filter)
+DEDUP_CACHE_SIZE = int(os.getenv("DEDUP_CACHE_SIZE", 100000))  # Number of recent idempotency keys kept in the LRU
+DEDUP_BLOOM_CAPACITY = int(os.getenv("DEDUP_BLOOM_CAPACITY", 1000000))  # Keys the Bloom filter holds before it is rebuilt (at least twice DEDUP_CACHE_SIZE)
+DEDUP_BLOOM_FP_RATE = float(os.getenv("DEDUP_BLOOM_FP_RATE", 0.001))  # Target false-positive rate of the Bloom filter
+
+# Kafka consumer batching (offsets are committed explicitly after each persisted batch)
+KAFKA_CONSUMER_GROUP = os.getenv("KAFKA_CONSUMER_GROUP", "transaction-consumers")  # Consumer group of the live consumer
+CONSUMER_BATCH_SIZE = int(os.getenv("CONSUMER_BATCH_SIZE", 500))  # Maximum messages scored and persisted per batch
+CONSUMER_POLL_TIMEOUT_MS = int(os.getenv("CONSUMER_POLL_TIMEOUT_MS", 1000))  # How long to wait for a batch to fill
+CONSUMER_RETRY_BACKOFF_SECONDS = float(os.getenv("CONSUMER_RETRY_BACKOFF_SECONDS", 2))  # Pause before replaying a batch that failed to persist
+CONSUMER_LAG_INTERVAL_SECONDS = float(os.getenv("CONSUMER_LAG_INTERVAL_SECONDS", 5))  # Time between consumer lag and processing rate updates
+
+# Failure lanes: transient failures are retried from delayed retry topics, permanent ones go to a dead-letter topic
+RETRY_LANES_ENABLED = os.getenv("RETRY_LANES_ENABLED", "true").lower() in ("1", "true", "yes")  # Set to false to rewind and replay failed batches in place instead
+KAFKA_DLQ_TOPIC = os.getenv("KAFKA_DLQ_TOPIC", f"{KAFKA_TOPIC}.dlq")  # Dead-letter topic, re-driven with `python -m app.consumers.redrive_dlq`
+KAFKA_RETRY_TOPIC_PREFIX = os.getenv("KAFKA_RETRY_TOPIC_PREFIX", f"{KAFKA_TOPIC}.retry")  # Retry topics are <prefix>.1 .. <prefix>.RETRY_MAX_ATTEMPTS
+KAFKA_RETRY_GROUP = os.getenv("KAFKA_RETRY_GROUP", "transaction-retries")  # Consumer group of the retry lane
+KAFKA_DLQ_REDRIVE_GROUP = os.getenv("KAFKA_DLQ_REDRIVE_GROUP", "transaction-dlq-redrive")  # Consumer group tracking what was re-driven
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", 4))  # Retries of a transient failure before it is dead-lettered
+RETRY_BACKOFF_BASE_SECONDS = float(os.getenv("RETRY_BACKOFF_BASE_SECONDS", 30))  # Delay of the first retry, doubled on every further attempt
+
+# Per-user state kept by the consumer for the users of its partitions (messages are keyed by user_id)
+USER_ACTIVITY_ENABLED = os.getenv("USER_ACTIVITY_ENABLED", "true").lower() in ("1", "true", "yes")  # Answer the 24h frequency from memory instead of the database
+USER_ACTIVITY_PRUNE_SECONDS = float(os.getenv("USER_ACTIVITY_PRUNE_SECONDS", 600))  # Time between removals of transactions that left the window
+
+# Process startup
+METRICS_PORT = int(os.getenv("METRICS_PORT", 8001))  # Port of the Prometheus metrics HTTP server
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")  # Shared metrics directory for several processes per host (read by prometheus_client at import; empty it before starting)
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "false").lower() in ("1", "true", "yes")  # Run a dummy prediction before accepting traffic
+
+# Inline scoring (POST /api/score): concurrent requests are scored together in micro-batches
+SCORE_BATCH_WINDOW_MS = float(os.getenv("SCORE_BATCH_WINDOW_MS", 2))  # Longest wait for a micro-batch to fill (at most 10 ms)
+SCORE_BATCH_MAX_SIZE = int(os.getenv("SCORE_BATCH_MAX_SIZE", 64))  # A micro-batch starts as soon as this many requests are waiting
+SCORE_LATENCY_SLO_MS = float(os.getenv("SCORE_LATENCY_SLO_MS", 0)) or None  # Latency SLO mode: cap the wait so wait + scoring time stays below this
+
+# Model selection in the training pipeline (app.fraud_detection.train_fraud_model)
+MODEL_LATENCY_BUDGET_MS = float(os.getenv("MODEL_LATENCY_BUDGET_MS", 10))  # p99 of a single-row prediction the selected model must stay within
+MODEL_BATCH_LATENCY_BUDGET_MS = float(os.getenv("MODEL_BATCH_LATENCY_BUDGET_MS", 100))  # p99 of a 256-row prediction (0: no batch budget)
+
+# Read cache of the polled API endpoints (invalidated by the data version the consumer bumps after every batch)
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", 64 * 1024 * 1024))  # Serialized response bytes kept per endpoint
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", 30))  # Rebuild cached responses at least this often, for writes made outside the consumer
+
+# In-memory buffer of the latest persisted transactions, answering recent reads without the database
+TRANSACTION_BUFFER_CAPACITY = int(os.getenv("TRANSACTION_BUFFER_CAPACITY", 5000))  # Transactions held per API process
+TRANSACTION_BUFFER_RESYNC_SECONDS = float(os.getenv("TRANSACTION_BUFFER_RESYNC_SECONDS", 300))  # Re-warm from the database this often, for writes made outside the consumer
+WS_SNAPSHOT_LIMIT = int(os.getenv("WS_SNAPSHOT_LIMIT", TRANSACTION_BUFFER_CAPACITY))  # Latest transactions sent to a new WebSocket client (0: the whole history)
+
+# Filtered search of the whole history (/api/transactions/search), paged with a keyset cursor
+SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", 100))  # Transactions per page when the client sets no limit
+SEARCH_MAX_PAGE_SIZE = int(os.getenv("SEARCH_MAX_PAGE_SIZE", 1000))  # Largest page a client may ask for
+
+# End-to-end latency tracing from POST /api/transaction to WebSocket delivery
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() in ("1", "true", "yes")  # Carry a trace context in the Kafka headers of ingested transactions
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH", "")  # Append sampled complete traces to this file as JSON lines (disabled if empty)
+TRACE_EXPORT_SAMPLE_RATE = float(os.getenv("TRACE_EXPORT_SAMPLE_RATE", 0.01))  # Fraction of the delivered traces exported
+
+# Event loop responsiveness: blocking work runs in bounded offload pools, the loop itself is watched
+CONSUMER_OFFLOAD_WORKERS = int(os.getenv("CONSUMER_OFFLOAD_WORKERS", 2))  # Threads preparing and persisting consumer batches (main and retry lanes)
+SCORING_OFFLOAD_WORKERS = int(os.getenv("SCORING_OFFLOAD_WORKERS", 1))  # Threads scoring the micro-batches of POST /api/score
+DB_OFFLOAD_WORKERS = int(os.getenv("DB_OFFLOAD_WORKERS", 4))  # Threads running the database reads of async routes
+KAFKA_OFFLOAD_WORKERS = int(os.getenv("KAFKA_OFFLOAD_WORKERS", 32))  # Threads publishing ingested transactions to Kafka
+LOOP_LAG_INTERVAL_MS = float(os.getenv("LOOP_LAG_INTERVAL_MS", 100))  # Time between event loop lag measurements
+LOOP_BLOCK_THRESHOLD_MS = float(os.getenv("LOOP_BLOCK_THRESHOLD_MS", 250))  # Log the loop thread's stack when the loop is blocked this long
+
+# Admin-only debug endpoints (disabled unless ADMIN_TOKEN is set)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")  # Value expected in the X-Admin-Token header
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", 60))  # Longest profile a single request may run
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", 5))  # Time between stack samples
+
+# Process roles and cross-process WebSocket fan-out
+RUN_CONSUMER_IN_API = os.getenv("RUN_CONSUMER_IN_API", "true").lower() in ("1", "true", "yes")  # Set to false when running `python -m app.consumers.run_consumer` separately
+EVENT_BUS_BACKEND = os.getenv("EVENT_BUS_BACKEND", "local").lower()  # 'local' (single process) or 'postgres' (LISTEN/NOTIFY across processes)
+EVENT_BUS_CHANNEL = os.getenv("EVENT_BUS_CHANNEL", "transaction_events")  # PostgreSQL NOTIFY channel carrying scored transactions
+
+# WebSocket delivery: optional per-connection frame coalescing and permessage-deflate compression
+WS_PER_MESSAGE_DEFLATE = os.getenv("WS_PER_MESSAGE_DEFLATE", "true").lower() in ("1", "true", "yes")  # Accept permessage-deflate when the client offers it
+WS_COALESCE_DEFAULT_MS = int(os.getenv("WS_COALESCE_DEFAULT_MS", 100))  # Flush interval when a client only sets coalesce_max
+WS_COALESCE_DEFAULT_MAX_EVENTS = int(os.getenv("WS_COALESCE_DEFAULT_MAX_EVENTS", 500))  # Events per frame when a client only sets coalesce_ms
+WS_COALESCE_MAX_PENDING = int(os.getenv("WS_COALESCE_MAX_PENDING", 10000))  # Buffered events after which a slow client is dropped
+
+# Replay/backfill mode (python -m app.consumers.replay)
+REPLAY_BATCH_SIZE = int(os.getenv("REPLAY_BATCH_SIZE", 5000))  # Messages fetched and persisted per batch
+REPLAY_WORKERS = int(os.getenv("REPLAY_WORKERS", os.cpu_count() or 4))  # Threads scoring undecided transactions in parallel
+REPLAY_PROGRESS_INTERVAL_SECONDS = float(os.getenv("REPLAY_PROGRESS_INTERVAL_SECONDS", 5))  # Time between progress reports
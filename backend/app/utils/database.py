@@ -2,7 +2,18 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 import databases
 from dotenv import load_dotenv
-from app.utils.config import POSTGRES_USER, POSTGRES_PASSWORD, POSTGRES_HOST, POSTGRES_DB
+from app.utils.config import (
+    POSTGRES_USER,
+    POSTGRES_PASSWORD,
+    POSTGRES_HOST,
+    POSTGRES_DB,
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT_SECONDS,
+    DB_POOL_RECYCLE_SECONDS,
+    DB_POOL_PRE_PING,
+)
+from app.utils.db_metrics import InstrumentedQueuePool, instrument_engine
 
 # Construct the PostgreSQL database URL using environment variables
 DATABASE_URL = f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}/{POSTGRES_DB}"
@@ -11,7 +22,18 @@ DATABASE_URL = f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST
 database = databases.Database(DATABASE_URL)
 
 # SQLAlchemy engine to interface with the PostgreSQL database
-engine = create_engine(DATABASE_URL)
+engine = create_engine(
+    DATABASE_URL,
+    poolclass=InstrumentedQueuePool,  # Times checkout waits and new connections
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT_SECONDS,
+    pool_recycle=DB_POOL_RECYCLE_SECONDS,
+    pool_pre_ping=DB_POOL_PRE_PING,
+)
+
+# Pool gauges, per-query timing and the slow query log
+instrument_engine(engine)
 
 # SessionLocal provides the session factory that creates new database sessions for requests
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
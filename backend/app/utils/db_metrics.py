@@ -0,0 +1,133 @@
+import time
+from prometheus_client import Gauge, Histogram
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+from app.utils.config import DB_SLOW_QUERY_MS
+from app.utils.logging_config import setup_logging
+import logging
+
+# Initialize logging for this module
+setup_logging()
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+pool_checked_out = Gauge('db_pool_checked_out', 'Connections currently checked out of the pool', ['pool'], multiprocess_mode='livesum')
+pool_overflow = Gauge('db_pool_overflow', 'Connections open beyond the pool size (negative while the pool is not yet full)', ['pool'], multiprocess_mode='livesum')
+pool_checkout_wait = Histogram('db_pool_checkout_wait_seconds', 'Time to obtain a connection from the pool, including opening a new one', ['pool'], buckets=LATENCY_BUCKETS)
+pool_connect_time = Histogram('db_pool_connect_seconds', 'Time to open a new database connection', ['pool'], buckets=LATENCY_BUCKETS)
+query_duration = Histogram('db_query_duration_seconds', 'Statement execution time by query name', ['query'], buckets=LATENCY_BUCKETS)
+
+MAX_LOGGED_PARAMETERS = 2000  # Characters of the parameters shown in a slow query log line
+
+_STATEMENT_VERBS = ("select", "insert", "update", "delete")
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    QueuePool that exports its checked-out and overflow connections and times how long callers wait for a
+    connection and how long new connections take to open.
+
+    The checkout wait covers queueing for a free connection and, when the pool grows, opening a new one; the
+    connect time isolates the latter, so pool exhaustion and slow connection setup can be told apart.
+    """
+
+    pool_name = "main"  # Value of the `pool` label; set by `instrument_engine`
+
+    def recreate(self):
+        # dispose() and the fork handling replace the pool; the replacement keeps the label
+        pool = super().recreate()
+        pool.pool_name = self.pool_name
+        return pool
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_checkout_wait.labels(pool=self.pool_name).observe(time.perf_counter() - start)
+            self._update_gauges()
+
+    def _do_return_conn(self, record):
+        try:
+            super()._do_return_conn(record)
+        finally:
+            self._update_gauges()
+
+    def _update_gauges(self):
+        pool_checked_out.labels(pool=self.pool_name).set(self.checkedout())
+        pool_overflow.labels(pool=self.pool_name).set(self.overflow())
+
+    def _create_connection(self):
+        start = time.perf_counter()
+        try:
+            return super()._create_connection()
+        finally:
+            pool_connect_time.labels(pool=self.pool_name).observe(time.perf_counter() - start)
+
+
+def query_name(statement, context):
+    """
+    Name a statement for the query timing metric.
+
+    Statements are named with the `query_name` execution option, e.g.
+    `db.query(Transaction).execution_options(query_name="list_transactions")`. Unnamed statements fall back
+    to their verb and, for ORM inserts, updates and deletes, their table (`insert_transactions`), which keeps
+    the label set small.
+
+    Args:
+        statement (str): The SQL about to be executed.
+        context (ExecutionContext): The SQLAlchemy execution context, if any.
+
+    Returns:
+        str: The query name.
+    """
+    name = context.execution_options.get("query_name") if context is not None else None
+    if name:
+        return name
+
+    words = statement.split(None, 1)
+    verb = words[0].lower() if words else ""
+    if verb not in _STATEMENT_VERBS:
+        return "other"
+    table = getattr(getattr(getattr(context, "compiled", None), "statement", None), "table", None)
+    table_name = getattr(table, "name", None)
+    return f"{verb}_{table_name}" if table_name else verb
+
+
+def instrument_engine(engine, pool_name="main", slow_query_ms=DB_SLOW_QUERY_MS):
+    """
+    Export statement timing metrics for an engine and log its slow statements.
+
+    The pool metrics are exported by the pool itself when the engine uses `InstrumentedQueuePool`.
+
+    Args:
+        engine (Engine): The SQLAlchemy engine to instrument.
+        pool_name (str): Value of the `pool` label of the pool metrics (`InstrumentedQueuePool` only).
+        slow_query_ms (float): Statements taking at least this long are logged with their SQL and parameters.
+    """
+    if isinstance(engine.pool, InstrumentedQueuePool):
+        engine.pool.pool_name = pool_name
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+        name = query_name(statement, context)
+        query_duration.labels(query=name).observe(elapsed)
+        if elapsed * 1000 >= slow_query_ms:
+            shown = repr(parameters)
+            if len(shown) > MAX_LOGGED_PARAMETERS:
+                shown = shown[:MAX_LOGGED_PARAMETERS] + f"... ({len(shown)} characters)"
+            logger.warning("Slow query '%s' took %.1f ms: %s; parameters: %s", name, elapsed * 1000, statement, shown)
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        # A failed statement never reaches after_cursor_execute; drop its start time
+        start_times = exception_context.connection.info.get("query_start_time") \
+            if exception_context.connection is not None else None
+        if start_times:
+            start_times.pop()
@@ -0,0 +1,163 @@
+import hashlib
+import json
+import math
+import threading
+from collections import OrderedDict
+from prometheus_client import Counter, Gauge
+from app.utils.config import DEDUP_CACHE_SIZE, DEDUP_BLOOM_CAPACITY, DEDUP_BLOOM_FP_RATE
+
+# Prometheus metrics for the duplicate-suppression cache
+dedup_lookups = Counter('dedup_cache_lookups_total', 'Idempotency key lookups by outcome', ['result'])
+dedup_hit_ratio = Gauge('dedup_cache_hit_ratio', 'Share of idempotency key lookups recognised as duplicates from memory', multiprocess_mode='liveall')
+
+
+def compute_idempotency_key(transaction_data):
+    """
+    Derive an idempotency key from the content of a transaction.
+
+    The key is a SHA-256 digest of the canonical JSON form of the business fields, so the same
+    transaction always maps to the same key no matter how many times it is delivered. Clients that
+    legitimately send identical transactions should supply their own key instead.
+
+    Args:
+        transaction_data (dict): Transaction with 'user_id', 'amount', 'location' and 'time' (ISO string).
+
+    Returns:
+        str: Hex digest identifying the transaction.
+    """
+    canonical = json.dumps({
+        'user_id': transaction_data['user_id'],
+        'amount': float(transaction_data['amount']),
+        'location': transaction_data['location'],
+        'time': transaction_data['time'],
+    }, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over string keys.
+
+    The bit array and hash count are sized from the expected capacity and the target false-positive rate.
+    A negative answer is always correct; a positive answer may be a false positive.
+    """
+
+    def __init__(self, capacity, fp_rate):
+        self.capacity = capacity
+        self.size = max(8, math.ceil(-capacity * math.log(fp_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        # Double hashing: derive k bit positions from two 64-bit halves of a single digest
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def clear(self):
+        self.bits = bytearray(len(self.bits))
+        self.count = 0
+
+
+class DuplicateCache:
+    """
+    Bounded in-memory record of recently processed idempotency keys.
+
+    Lookups first consult the Bloom filter. Once the cache is warm, a negative answer means the key was not
+    processed recently and costs a few hash operations. A positive answer is confirmed against the LRU of
+    recent keys. Keys that passed the Bloom filter but have already left the LRU (or are false positives) are
+    reported as unknown so the caller can fall back to the database, where a unique constraint is the source
+    of truth.
+
+    A new cache only knows about keys this process has seen, so until `warm_up` has loaded the keys recently
+    persisted by any consumer, every key the Bloom filter does not recognise is reported as unknown too. This
+    covers the redeliveries that follow a restart or a rebalance.
+
+    The consumer and its retry lane use the cache from their offload threads and the event loop, so every
+    method holds a lock.
+    """
+
+    def __init__(self, max_size=DEDUP_CACHE_SIZE, bloom_capacity=DEDUP_BLOOM_CAPACITY, fp_rate=DEDUP_BLOOM_FP_RATE):
+        self.max_size = max_size
+        self.recent = OrderedDict()
+        # Leave headroom above the LRU size, otherwise a rebuild from the LRU saturates the filter again
+        self.bloom = BloomFilter(max(bloom_capacity, 2 * max_size), fp_rate)
+        self.warm = False
+        self.hits = 0
+        self.lookups = 0
+        self._lock = threading.RLock()
+
+    def check(self, key):
+        """
+        Check whether an idempotency key has already been processed.
+
+        Args:
+            key (str): The idempotency key.
+
+        Returns:
+            bool or None: False if the key is definitely new, True if it was processed recently,
+            or None if the database has to decide.
+        """
+        with self._lock:
+            self.lookups += 1
+            if key not in self.bloom:
+                if not self.warm:
+                    self._record('cold_miss')
+                    return None
+                self._record('bloom_negative')
+                return False
+            if key in self.recent:
+                self.recent.move_to_end(key)
+                self._record('lru_hit', hit=True)
+                return True
+            self._record('miss')
+            return None
+
+    def add(self, key):
+        """
+        Remember an idempotency key as processed.
+
+        Args:
+            key (str): The idempotency key.
+        """
+        with self._lock:
+            self.recent[key] = True
+            self.recent.move_to_end(key)
+            if len(self.recent) > self.max_size:
+                self.recent.popitem(last=False)
+
+            if self.bloom.count >= self.bloom.capacity:
+                # The filter is saturated: rebuild it from the keys still held in the LRU
+                self.bloom.clear()
+                for recent_key in self.recent:
+                    self.bloom.add(recent_key)
+            else:
+                self.bloom.add(key)
+
+    def warm_up(self, keys):
+        """
+        Load recently persisted keys and start trusting negative Bloom filter answers.
+
+        Args:
+            keys (Iterable[str]): Recently persisted idempotency keys, oldest first.
+        """
+        with self._lock:
+            for key in keys:
+                self.add(key)
+            self.warm = True
+
+    def _record(self, result, hit=False):
+        dedup_lookups.labels(result=result).inc()
+        if hit:
+            self.hits += 1
+        dedup_hit_ratio.set(self.hits / self.lookups)
@@ -0,0 +1,191 @@
+import asyncio
+import json
+from app.utils.config import EVENT_BUS_BACKEND, EVENT_BUS_CHANNEL
+from app.utils.logging_config import setup_logging
+import logging
+
+# Initialize logging for this module
+setup_logging()
+logger = logging.getLogger(__name__)
+
+
+class LocalEventBus:
+    """
+    In-process event bus.
+
+    Published events are handed directly to the subscribers registered in the same process. This is enough
+    when the Kafka consumer runs inside the (single) API process.
+    """
+
+    def __init__(self):
+        self.subscribers = []
+
+    def subscribe(self, callback):
+        """
+        Register a coroutine function called with every published event.
+
+        Args:
+            callback (Callable[[dict], Awaitable]): The subscriber.
+        """
+        self.subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        """
+        Remove a previously registered subscriber.
+
+        Args:
+            callback (Callable[[dict], Awaitable]): The subscriber.
+        """
+        if callback in self.subscribers:
+            self.subscribers.remove(callback)
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def publish(self, event):
+        """
+        Deliver an event to every subscriber.
+
+        Args:
+            event (dict): JSON-serialisable event payload.
+        """
+        await self._dispatch(event)
+
+    async def _dispatch(self, event):
+        for callback in self.subscribers:
+            try:
+                await callback(event)
+            except Exception as e:
+                logger.error("Event subscriber failed: %s", e, exc_info=True)
+
+
+class PostgresEventBus(LocalEventBus):
+    """
+    Cross-process event bus built on PostgreSQL `LISTEN/NOTIFY`.
+
+    Publishers send each event as the payload of `pg_notify` on a shared channel; every process that has
+    subscribers keeps one listening connection and dispatches incoming notifications to them. This lets the
+    consumer run as its own process and every API worker broadcast every event to its WebSocket clients.
+    """
+
+    def __init__(self, dsn, channel=EVENT_BUS_CHANNEL, reconnect_delay=2.0):
+        super().__init__()
+        self.dsn = dsn
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self._listen_conn = None
+        self._publish_conn = None
+        self._publish_lock = asyncio.Lock()
+        self._stopping = False
+        self._tasks = set()  # Strong references to background tasks, which asyncio would otherwise let be collected
+
+    async def start(self):
+        """
+        Open the listening connection if this process has subscribers.
+        """
+        self._stopping = False
+        if self.subscribers:
+            await self._listen()
+
+    async def _listen(self):
+        import asyncpg
+
+        self._listen_conn = await asyncpg.connect(self.dsn)
+        await self._listen_conn.add_listener(self.channel, self._on_notify)
+        self._listen_conn.add_termination_listener(self._on_terminated)
+        logger.info("Listening for events on PostgreSQL channel '%s'", self.channel)
+
+    def _on_terminated(self, connection):
+        # The listening connection dropped: reconnect in the background
+        if not self._stopping:
+            logger.warning("Event bus listener connection lost, reconnecting")
+            self._spawn(self._reconnect())
+
+    async def _reconnect(self):
+        while not self._stopping:
+            try:
+                await self._listen()
+                return
+            except Exception as e:
+                logger.error("Event bus reconnect failed: %s", e)
+                await asyncio.sleep(self.reconnect_delay)
+
+    def _on_notify(self, connection, pid, channel, payload):
+        try:
+            event = json.loads(payload)
+        except json.JSONDecodeError as e:
+            logger.error("Dropping malformed event bus payload: %s", e)
+            return
+        self._spawn(self._dispatch(event))
+
+    def _spawn(self, coroutine):
+        task = asyncio.get_running_loop().create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def publish(self, event):
+        """
+        Broadcast an event to every process listening on the channel (including this one).
+
+        Delivery is best effort: if the event cannot be sent (e.g. PostgreSQL is restarting or the payload
+        exceeds the 8000-byte NOTIFY limit), the error is logged and the publishing connection is reopened on
+        the next call, so fan-out problems never interrupt the caller.
+
+        Args:
+            event (dict): JSON-serialisable event payload (must stay below PostgreSQL's 8000-byte NOTIFY limit).
+        """
+        import asyncpg
+
+        async with self._publish_lock:
+            try:
+                if self._publish_conn is None or self._publish_conn.is_closed():
+                    self._publish_conn = await asyncpg.connect(self.dsn)
+                await self._publish_conn.execute("SELECT pg_notify($1, $2)", self.channel, json.dumps(event))
+            except Exception as e:
+                logger.error("Failed to publish event on channel '%s': %s", self.channel, e)
+                await self._reset_publish_connection()
+
+    async def _reset_publish_connection(self):
+        conn, self._publish_conn = self._publish_conn, None
+        if conn is not None and not conn.is_closed():
+            try:
+                await conn.close()
+            except Exception:
+                conn.terminate()
+
+    async def stop(self):
+        self._stopping = True
+        for conn in (self._listen_conn, self._publish_conn):
+            if conn is not None and not conn.is_closed():
+                await conn.close()
+        self._listen_conn = None
+        self._publish_conn = None
+
+
+# Process-wide event bus instance, created on first use
+_event_bus = None
+
+
+def get_event_bus():
+    """
+    Return the event bus of this process, creating it from `EVENT_BUS_BACKEND` on first use.
+
+    Returns:
+        LocalEventBus: The configured event bus.
+
+    Raises:
+        ValueError: If `EVENT_BUS_BACKEND` names an unknown backend.
+    """
+    global _event_bus
+    if _event_bus is None:
+        if EVENT_BUS_BACKEND == "local":
+            _event_bus = LocalEventBus()
+        elif EVENT_BUS_BACKEND == "postgres":
+            from app.utils.database import DATABASE_URL
+            _event_bus = PostgresEventBus(DATABASE_URL)
+        else:
+            raise ValueError(f"Unknown EVENT_BUS_BACKEND: {EVENT_BUS_BACKEND}")
+    return _event_bus
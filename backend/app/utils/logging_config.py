@@ -1,33 +1,168 @@
+import atexit
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+import time
+from datetime import datetime, timezone
+
+# Logging settings are read straight from the environment: app.utils.config itself logs, so it cannot be imported here
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()  # Minimum level emitted by the application
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()  # 'json' for structured output, 'text' for the classic format
+LOG_RATE_LIMIT = float(os.getenv("LOG_RATE_LIMIT", 200))  # INFO/DEBUG records per second allowed per logger
+LOG_TRANSACTION_SAMPLE_RATE = float(os.getenv("LOG_TRANSACTION_SAMPLE_RATE", 0.01))  # Share of per-transaction records kept
+
+# Pass as `extra=` on log calls made once per transaction, so they are sampled instead of always emitted
+PER_TRANSACTION = {"per_transaction": True}
+
+# Attributes every LogRecord has; anything else on a record came from `extra=` and is emitted as a structured field
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "per_transaction"}
+
+_listener = None
+_setup_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats log records as single-line JSON objects.
+
+    Standard fields are `ts`, `level`, `logger` and `message`; fields passed through `extra=` are added as-is,
+    and exception tracebacks are emitted under `exception`.
+    """
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS:
+                entry[key] = value
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Per-logger token bucket for INFO and DEBUG records.
+
+    Each logger may emit `rate` records per second (with bursts up to `rate`). Records over the limit are
+    dropped; the number dropped is attached to the next record that passes as `suppressed`.
+    Warnings and errors are never rate limited.
+    """
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+        self.buckets = {}  # logger name -> [tokens, last refill time, suppressed count]
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or self.rate <= 0:
+            return True
+
+        now = time.monotonic()
+        with self.lock:
+            bucket = self.buckets.get(record.name)
+            if bucket is None:
+                bucket = self.buckets[record.name] = [self.rate, now, 0]
+            bucket[0] = min(self.rate, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                return False
+            bucket[0] -= 1
+            if bucket[2]:
+                record.suppressed = bucket[2]
+                bucket[2] = 0
+        return True
+
+
+class TransactionSamplingFilter(logging.Filter):
+    """
+    Keeps only a random sample of the records flagged with `extra=PER_TRANSACTION`.
+
+    Warnings and errors are always kept.
+    """
+
+    def __init__(self, sample_rate):
+        super().__init__()
+        self.sample_rate = sample_rate
+
+    def filter(self, record):
+        if not getattr(record, "per_transaction", False) or record.levelno >= logging.WARNING:
+            return True
+        return random.random() < self.sample_rate
+
+
+class _PreparingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that merges the message arguments in the calling thread but leaves the final formatting
+    (JSON encoding, timestamps) to the listener thread.
+    """
+
+    def prepare(self, record):
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
 
 def setup_logging():
     """
     Configures logging for the application.
 
-    This function sets up basic logging to output logs to the console with a specific format.
-    You can change the logging level to adjust verbosity. By default, the logging level is set to INFO.
-    For more detailed logs, such as for debugging, you can set it to DEBUG.
+    Records are handed to an in-memory queue on the calling thread and written to the console by a
+    background `QueueListener`, so slow console I/O never blocks the event loop or the consumer. Before being
+    queued, records pass two cheap filters:
+
+    - Per-logger rate limiting of INFO/DEBUG records (`LOG_RATE_LIMIT` records per second per logger).
+    - Sampling of per-transaction records, i.e. calls made with `extra=PER_TRANSACTION`
+      (`LOG_TRANSACTION_SAMPLE_RATE`, e.g. 0.01 keeps 1%).
 
-    Logging Format:
-    - `%(asctime)s`: The timestamp when the log entry was created.
-    - `%(name)s`: The name of the logger (usually the module or file).
-    - `%(levelname)s`: The log level (INFO, DEBUG, ERROR, etc.).
-    - `%(message)s`: The actual log message.
+    Warnings and errors always pass both filters.
+
+    Output Format (`LOG_FORMAT`):
+    - `json` (default): one JSON object per line with `ts`, `level`, `logger`, `message` and any `extra=` fields.
+    - `text`: `%(asctime)s - %(name)s - %(levelname)s - %(message)s`.
 
     Example Output:
     ```
-    2024-09-28 12:00:00 - app.module - INFO - Transaction processed successfully.
+    {"ts": "2024-09-28T12:00:00.123456+00:00", "level": "INFO", "logger": "app.module", "message": "Transaction processed successfully."}
     ```
 
-    Logging is configured to:
-    - Log messages to the console using a `StreamHandler`.
-    - The default log level is set to `INFO`, but you can modify it for more verbosity.
-    """
-    
-    logging.basicConfig(
-        level=logging.INFO,  # Set this to logging.DEBUG for more detailed logs
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.StreamHandler()  # Outputs to console (standard output)
-        ]
-    )
+    The function is safe to call from every module: only the first call configures the root logger.
+    The level defaults to `INFO` and can be changed with `LOG_LEVEL`.
+    """
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return
+
+        console_handler = logging.StreamHandler()  # Outputs to console, on the listener thread
+        if LOG_FORMAT == "text":
+            console_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+        else:
+            console_handler.setFormatter(JsonFormatter())
+
+        log_queue = queue.SimpleQueue()
+        queue_handler = _PreparingQueueHandler(log_queue)
+        queue_handler.addFilter(TransactionSamplingFilter(LOG_TRANSACTION_SAMPLE_RATE))
+        queue_handler.addFilter(RateLimitFilter(LOG_RATE_LIMIT))
+
+        root = logging.getLogger()
+        root.setLevel(LOG_LEVEL)
+        root.addHandler(queue_handler)
+
+        _listener = logging.handlers.QueueListener(log_queue, console_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)  # Flush queued records on interpreter exit
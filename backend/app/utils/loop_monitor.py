@@ -0,0 +1,82 @@
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from prometheus_client import Counter, Histogram
+from app.utils.config import LOOP_LAG_INTERVAL_MS, LOOP_BLOCK_THRESHOLD_MS
+from app.utils.logging_config import setup_logging
+import logging
+
+# Initialize logging for this module
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Prometheus metrics describing how responsive the event loop is
+loop_lag = Histogram('event_loop_lag_seconds', 'Delay of a periodic event loop callback beyond its schedule',
+                     buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10))
+loop_blocked = Counter('event_loop_blocked_total', 'Times the event loop was blocked longer than the threshold')
+
+
+class LoopLagMonitor:
+    """
+    Measures event loop lag and reports what is blocking the loop.
+
+    A task on the loop wakes up every `interval_ms` and records how late it woke up, which is the time every
+    other callback would have waited as well. A watchdog thread checks the heartbeat of that task: when the
+    loop has not come back for `threshold_ms`, it logs the stack of the loop thread while it is still blocked,
+    which points at the blocking call (a synchronous query, a pickle load, a model prediction, ...).
+
+    Args:
+        interval_ms (float): Time between lag measurements.
+        threshold_ms (float): Blocking time after which a stack trace is logged.
+    """
+
+    def __init__(self, interval_ms=LOOP_LAG_INTERVAL_MS, threshold_ms=LOOP_BLOCK_THRESHOLD_MS):
+        self.interval = interval_ms / 1000.0
+        self.threshold = threshold_ms / 1000.0
+        self.last_beat = time.monotonic()
+        self._loop_thread_id = None
+        self._task = None
+        self._watchdog = None
+        self._stopped = threading.Event()
+
+    def start(self):
+        """
+        Start measuring the running event loop.
+        """
+        self._loop_thread_id = threading.get_ident()
+        self.last_beat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.get_running_loop().create_task(self._beat())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self):
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _beat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            loop_lag.observe(max(0.0, now - expected))
+            self.last_beat = now
+
+    def _watch(self):
+        reported = None
+        while not self._stopped.wait(min(self.interval, self.threshold / 2)):
+            beat = self.last_beat
+            # Allow one interval for the heartbeat itself
+            blocked = time.monotonic() - beat - self.interval
+            if blocked < self.threshold or reported == beat:
+                continue
+            reported = beat  # One report per blocking episode
+            loop_blocked.inc()
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else "unavailable"
+            logger.warning("Event loop blocked for %.0f ms so far, loop thread stack:\n%s", blocked * 1000, stack)
@@ -0,0 +1,87 @@
+import os
+from prometheus_client import CollectorRegistry, REGISTRY, generate_latest, multiprocess, start_http_server
+from app.utils.config import METRICS_PORT, PROMETHEUS_MULTIPROC_DIR
+from app.utils.logging_config import setup_logging
+import logging
+
+# Initialize logging for this module
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Port the metrics server of this process is bound to (None until started)
+_metrics_server_port = None
+
+
+def multiprocess_enabled():
+    """
+    Tell whether metrics are shared between processes through `PROMETHEUS_MULTIPROC_DIR`.
+
+    In that mode every process (API workers and standalone consumers on the same host) writes its samples to
+    files in the directory, and any of them can serve the aggregate of all processes.
+    """
+    return bool(PROMETHEUS_MULTIPROC_DIR)
+
+
+def metrics_registry():
+    """
+    Return the registry to expose: the aggregate of every process in multiprocess mode, this process otherwise.
+
+    Returns:
+        CollectorRegistry: The registry to collect from.
+    """
+    if not multiprocess_enabled():
+        return REGISTRY
+    # A fresh registry per collection, as the files of processes started since are picked up on collect
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def render_metrics():
+    """
+    Render the metrics in the Prometheus text format.
+
+    Returns:
+        bytes: The exposition of `metrics_registry()`.
+    """
+    return generate_latest(metrics_registry())
+
+
+def mark_process_dead(pid=None):
+    """
+    Drop the live gauge samples of an exiting process from the multiprocess aggregate.
+
+    Args:
+        pid (int, optional): The process that exits; the current process by default.
+    """
+    if multiprocess_enabled():
+        multiprocess.mark_process_dead(pid or os.getpid())
+
+
+def start_metrics_server(port=METRICS_PORT):
+    """
+    Start the Prometheus metrics HTTP server for this process.
+
+    The server is started at most once per process. If the port is already taken (for example by another
+    worker on the same host), a warning is logged instead of crashing the process. In multiprocess mode the
+    server exposes the metrics of all processes, so it does not matter which process holds the port.
+
+    Args:
+        port (int): The port to expose the metrics on.
+
+    Returns:
+        bool: True if this process is serving metrics on the port.
+    """
+    global _metrics_server_port
+    if _metrics_server_port is not None:
+        return True
+
+    try:
+        start_http_server(port, registry=metrics_registry())
+    except OSError as e:
+        logger.warning(f"Metrics server not started on port {port}: {e}")
+        return False
+
+    _metrics_server_port = port
+    logger.info(f"Prometheus metrics server listening on port {port}")
+    return True
@@ -0,0 +1,163 @@
+import asyncio
+import time
+from collections import deque
+from prometheus_client import Histogram
+from app.utils.config import SCORE_BATCH_WINDOW_MS, SCORE_BATCH_MAX_SIZE, SCORE_LATENCY_SLO_MS
+from app.utils.offload import offload
+from app.utils.logging_config import setup_logging
+import logging
+
+# Initialize logging for this module
+setup_logging()
+logger = logging.getLogger(__name__)
+
+MAX_WINDOW_MS = 10  # Requests wait for company at most this long, whatever the configuration
+EWMA_ALPHA = 0.2  # Weight of the latest batch in the smoothed batch service time
+
+# Prometheus metrics describing the micro-batches
+batch_size = Histogram('micro_batch_size', 'Requests scored together in one micro-batch', ['batcher'],
+                       buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+batch_wait = Histogram('micro_batch_wait_seconds', 'Time a request waited for its micro-batch to start', ['batcher'],
+                       buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1))
+batch_service_time = Histogram('micro_batch_service_seconds', 'Time to process one micro-batch', ['batcher'],
+                               buckets=(0.0005, 0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1))
+
+
+class MicroBatcher:
+    """
+    Gathers concurrent requests into small batches for a function that is cheaper per item in bulk.
+
+    The first request of a batch waits at most `window_ms` for others to join; the batch starts earlier when
+    `max_batch_size` requests are waiting. Requests arriving while a batch is being processed queue up for the
+    next one, so batches grow with the load instead of adding delay at low load.
+
+    In latency SLO mode (`latency_slo_ms`), the wait is further capped so that the wait plus the smoothed
+    batch service time stays within the SLO: as batches get slower, requests stop waiting for company and go
+    out in whatever batch has formed.
+
+    Args:
+        name (str): Value of the `batcher` label of the metrics.
+        handler (Callable[[list], list]): Blocking function turning a list of items into one result per item,
+            in order. It runs in the offload pool `pool`.
+        window_ms (float): Longest time the first request of a batch waits for the batch to fill.
+        max_batch_size (int): Most requests processed in one call of `handler`.
+        latency_slo_ms (float, optional): Target end-to-end latency of a request.
+        pool (str, optional): Offload pool running `handler`; the default executor of the loop if omitted.
+
+    Raises:
+        ValueError: If `window_ms` is negative or above `MAX_WINDOW_MS`, or `max_batch_size` is below 1.
+    """
+
+    def __init__(self, name, handler, window_ms=SCORE_BATCH_WINDOW_MS, max_batch_size=SCORE_BATCH_MAX_SIZE,
+                 latency_slo_ms=SCORE_LATENCY_SLO_MS, pool=None):
+        if not 0 <= window_ms <= MAX_WINDOW_MS:
+            raise ValueError(f"The batching window must be between 0 and {MAX_WINDOW_MS} ms")
+        if max_batch_size < 1:
+            raise ValueError("The maximum batch size must be at least 1")
+        self.name = name
+        self.handler = handler
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        self.latency_slo = latency_slo_ms / 1000.0 if latency_slo_ms else None
+        self.pool = pool
+        self.service_time = 0.0  # Smoothed time to process one batch
+        self.pending = deque()  # (item, future, enqueued_at)
+        self._arrived = None
+        self._worker = None
+        self._loop = None
+        self._batch_size = batch_size.labels(batcher=name)
+        self._batch_wait = batch_wait.labels(batcher=name)
+        self._batch_service_time = batch_service_time.labels(batcher=name)
+
+    def wait_budget(self):
+        """
+        Longest time the first request of the next batch waits for others to join.
+        """
+        if self.latency_slo is None:
+            return self.window
+        return max(0.0, min(self.window, self.latency_slo - self.service_time))
+
+    async def submit(self, item):
+        """
+        Queue an item and wait for its result.
+
+        Returns:
+            The result `handler` returned for the item.
+
+        Raises:
+            Exception: Whatever `handler` raised for the batch of the item.
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # First request, or the previous event loop is gone (e.g. between test clients)
+            self._loop = loop
+            self._arrived = asyncio.Event()
+            self.pending = deque()
+            self._worker = None
+        if self._worker is None or self._worker.done():
+            self._worker = loop.create_task(self._run())
+        future = loop.create_future()
+        self.pending.append((item, future, time.perf_counter()))
+        self._arrived.set()
+        return await future
+
+    async def stop(self):
+        """
+        Stop the worker; requests still queued fail with `asyncio.CancelledError`.
+        """
+        if self._worker is not None:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+            self._worker = None
+        self._loop = None
+        while self.pending:
+            self.pending.popleft()[1].cancel()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            while not self.pending:
+                self._arrived.clear()
+                await self._arrived.wait()
+
+            # Give other requests until the deadline of the oldest one to join the batch
+            deadline = self.pending[0][2] + self.wait_budget()
+            while len(self.pending) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._arrived.clear()
+                try:
+                    await asyncio.wait_for(self._arrived.wait(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+
+            batch = [self.pending.popleft() for _ in range(min(self.max_batch_size, len(self.pending)))]
+            batch = [entry for entry in batch if not entry[1].done()]  # Skip requests whose client went away
+            if not batch:
+                continue
+            start = time.perf_counter()
+            for _, _, enqueued_at in batch:
+                self._batch_wait.observe(start - enqueued_at)
+            self._batch_size.observe(len(batch))
+
+            try:
+                items = [item for item, _, _ in batch]
+                if self.pool is None:
+                    results = await loop.run_in_executor(None, self.handler, items)
+                else:
+                    results = await offload(self.pool, self.handler, items)
+            except Exception as e:
+                logger.error("Micro-batch of %d requests failed: %s", len(batch), e, exc_info=True)
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            finally:
+                elapsed = time.perf_counter() - start
+                self._batch_service_time.observe(elapsed)
+                self.service_time += EWMA_ALPHA * (elapsed - self.service_time)
+
+            for (_, future, _), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Float, DateTime, Boolean
+from sqlalchemy import Column, String, Integer, BigInteger, Float, DateTime, Boolean, Index, text
 from app.utils.database import Base
 
 class Transaction(Base):
@@ -15,6 +15,7 @@ class Transaction(Base):
         location (String): The geographical location where the transaction occurred.
         time (DateTime): The timestamp of when the transaction occurred.
         is_fraud (Boolean): A boolean value indicating whether the transaction was classified as fraudulent.
+        idempotency_key (String): Unique key identifying the transaction across redeliveries.
     """
 
     __tablename__ = 'transactions'  # Name of the table in the database
@@ -25,3 +26,35 @@ class Transaction(Base):
     location = Column(String, nullable=False)
     time = Column(DateTime, nullable=False)
     is_fraud = Column(Boolean, default=False)  # Column to store whether the transaction is fraudulent
+    idempotency_key = Column(String(128), unique=True, index=True, nullable=True)  # Guards against duplicate rows on redelivery
+
+    # Indexes backing `/api/transactions/search`, which pages by (time, id) newest first
+    __table_args__ = (
+        Index('ix_transactions_fraud_time', 'time', 'id',  # Partial: fraud is a small fraction of the rows
+              postgresql_where=text('is_fraud = true'), sqlite_where=text('is_fraud = 1')),
+        Index('ix_transactions_location_time', 'location', 'time', 'id'),
+    )
+
+
+class ConsumerOffset(Base):
+    """
+    SQLAlchemy model recording the Kafka offsets whose messages have been persisted.
+
+    Offsets are written in the same database transaction as the transaction rows of a batch, so the database
+    always knows exactly which messages have been flushed. On startup the consumer seeks to these positions.
+
+    Attributes:
+        group_id (String): The Kafka consumer group.
+        topic (String): The Kafka topic.
+        partition (Integer): The partition number within the topic.
+        offset (BigInteger): The next offset to consume (last persisted offset + 1).
+        updated_at (DateTime): When the offset was last advanced.
+    """
+
+    __tablename__ = 'consumer_offsets'
+
+    group_id = Column(String, primary_key=True)
+    topic = Column(String, primary_key=True)
+    partition = Column(Integer, primary_key=True)
+    offset = Column(BigInteger, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
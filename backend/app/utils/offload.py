@@ -0,0 +1,130 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from prometheus_client import Gauge, Histogram
+from app.utils.config import (
+    CONSUMER_OFFLOAD_WORKERS,
+    SCORING_OFFLOAD_WORKERS,
+    DB_OFFLOAD_WORKERS,
+    KAFKA_OFFLOAD_WORKERS,
+)
+from app.utils.logging_config import setup_logging
+import logging
+
+# Initialize logging for this module
+setup_logging()
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Saturation of the offload pools: busy / workers near 1 with a growing queue means the pool is the bottleneck
+pool_workers = Gauge('offload_pool_workers', 'Threads of an offload pool', ['pool'], multiprocess_mode='livesum')
+pool_busy = Gauge('offload_pool_busy', 'Threads of an offload pool running a call', ['pool'], multiprocess_mode='livesum')
+pool_queued = Gauge('offload_pool_queued', 'Calls waiting for a thread of an offload pool', ['pool'], multiprocess_mode='livesum')
+pool_wait = Histogram('offload_pool_wait_seconds', 'Time a call waited for a thread of an offload pool', ['pool'], buckets=LATENCY_BUCKETS)
+pool_run = Histogram('offload_pool_run_seconds', 'Time a call ran in an offload pool', ['pool'], buckets=LATENCY_BUCKETS)
+
+# Threads per pool; each kind of blocking work gets its own pool so one cannot starve the others
+POOL_SIZES = {
+    "consumer": CONSUMER_OFFLOAD_WORKERS,  # Kafka consumer batches: duplicate and frequency lookups, scoring, persisting
+    "scoring": SCORING_OFFLOAD_WORKERS,  # Inline scoring micro-batches of POST /api/score
+    "db": DB_OFFLOAD_WORKERS,  # Database reads of the async API routes
+    "kafka": KAFKA_OFFLOAD_WORKERS,  # Blocking kafka-python publishes of the ingest route
+}
+
+
+class OffloadPool:
+    """
+    Bounded thread pool running blocking calls on behalf of async code, with saturation metrics.
+
+    Calls beyond `max_workers` queue inside the pool, so a burst of consumer work waits for a consumer thread
+    instead of occupying the threads that serve HTTP requests.
+
+    Args:
+        name (str): Value of the `pool` label of the metrics.
+        max_workers (int): Number of threads.
+    """
+
+    def __init__(self, name, max_workers):
+        self.name = name
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"offload-{name}")
+        self._busy = pool_busy.labels(pool=name)
+        self._queued = pool_queued.labels(pool=name)
+        self._wait = pool_wait.labels(pool=name)
+        self._run = pool_run.labels(pool=name)
+        pool_workers.labels(pool=name).set(max_workers)
+
+    async def run(self, fn, *args, **kwargs):
+        """
+        Run `fn(*args, **kwargs)` in the pool and wait for its result without blocking the event loop.
+
+        Returns:
+            The return value of `fn`.
+
+        Raises:
+            Exception: Whatever `fn` raised.
+        """
+        enqueued = time.perf_counter()
+        self._queued.inc()
+
+        def call():
+            start = time.perf_counter()
+            self._queued.dec()
+            self._busy.inc()
+            self._wait.observe(start - enqueued)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self._run.observe(time.perf_counter() - start)
+                self._busy.dec()
+
+        future = self.executor.submit(call)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # A call cancelled before it started never runs; one already running finishes in the background
+            if future.cancel():
+                self._queued.dec()
+            raise
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(name):
+    """
+    Return the offload pool of a kind of work, creating it on first use with its size from `POOL_SIZES`.
+
+    Raises:
+        KeyError: If `name` is not a known pool.
+    """
+    pool = _pools.get(name)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(name)
+            if pool is None:
+                pool = _pools[name] = OffloadPool(name, POOL_SIZES[name])
+    return pool
+
+
+async def offload(pool_name, fn, *args, **kwargs):
+    """
+    Run a blocking call in the named offload pool, e.g. `await offload("db", load_history, user_id)`.
+    """
+    return await get_pool(pool_name).run(fn, *args, **kwargs)
+
+
+def shutdown_pools():
+    """
+    Stop every offload pool of the process; calls still queued are cancelled.
+    """
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.shutdown()
+        _pools.clear()
@@ -1,14 +1,19 @@
 import os
 import pickle
+from functools import lru_cache
 import numpy as np
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from app.utils.database import SessionLocal
 from app.utils.models import Transaction
-from sklearn.preprocessing import StandardScaler
-from datetime import datetime, timedelta
+from app.utils.schemas import parse_transaction_time
+from datetime import timedelta
 
-# Load pre-fitted scaler
+# Window of the transaction frequency feature
+FREQUENCY_WINDOW = timedelta(hours=24)
+
+# Load pre-fitted scaler (once per process)
+@lru_cache(maxsize=1)
 def load_scaler():
     """
     Loads the pre-trained and pre-fitted scaler from a file for use in scaling new transaction data.
@@ -25,31 +30,34 @@ def load_scaler():
     return scaler
 
 # Function to fetch transaction frequency from the database
-def get_transaction_frequency(user_id, current_time):
+def get_transaction_frequency(user_id, current_time, db: Session = None):
     """
     Fetches the number of transactions made by a user in the past 24 hours from the database.
     
     Args:
         user_id (str): The ID of the user whose transaction frequency is being checked.
         current_time (datetime): The time of the current transaction.
+        db (Session, optional): SQLAlchemy session instance. If not provided, a new session is created and closed.
 
     Returns:
         int: The count of transactions made by the user in the past 24 hours.
     """
-    db: Session = SessionLocal()
+    session: Session = db or SessionLocal()
     try:
         # Define the time window for transaction history (e.g., last 24 hours)
-        time_window = current_time - timedelta(hours=24)
+        time_window = current_time - FREQUENCY_WINDOW
         
         # Query to get the count of transactions in the last 24 hours for this user
-        transaction_count = db.query(func.count(Transaction.id)) \
+        transaction_count = session.query(func.count(Transaction.id)) \
             .filter(Transaction.user_id == user_id) \
             .filter(Transaction.time >= time_window) \
+            .execution_options(query_name="transaction_frequency") \
             .scalar()
         
         return transaction_count
     finally:
-        db.close()
+        if db is None:
+            session.close()
 
 # Function to preprocess the incoming transaction for prediction
 def preprocess_transaction(transaction_data):
@@ -73,31 +81,56 @@ def preprocess_transaction(transaction_data):
     Returns:
         np.ndarray: A scaled and preprocessed numpy array ready for input into the fraud detection model.
     """
-    # Parse the transaction time
-    transaction_time = datetime.strptime(transaction_data['time'], "%Y-%m-%dT%H:%M:%S")
-    
-    # Get real transaction frequency from the database
-    transaction_frequency = get_transaction_frequency(transaction_data['user_id'], transaction_time)
+    return preprocess_transactions([transaction_data])
 
-    # Extract the hour of the transaction (for time-of-day feature)
-    transaction_hour = transaction_time.hour
+# Function to preprocess a batch of transactions for a single model call
+def preprocess_transactions(transactions, user_activity=None):
+    """
+    Preprocesses a batch of transactions into one feature matrix, with the same features as
+    `preprocess_transaction`.
+
+    The frequency lookups share one database session and the whole matrix is scaled in a single call.
+
+    Args:
+        transactions (list[dict]): The transaction data, in the format accepted by `preprocess_transaction`.
+        user_activity (UserActivityStore, optional): In-memory per-user history answering the frequency
+            lookups it can; the others go to the database.
+
+    Returns:
+        np.ndarray: A scaled feature matrix with one row per transaction.
+    """
+    rows = []
+    db: Session = SessionLocal()
+    try:
+        for transaction_data in transactions:
+            # Parse the transaction time
+            transaction_time = parse_transaction_time(transaction_data['time'])
+
+            # Get real transaction frequency from memory when this consumer owns the user, else from the database
+            transaction_frequency = None
+            if user_activity is not None:
+                transaction_frequency = user_activity.frequency(transaction_data['user_id'], transaction_time)
+            if transaction_frequency is None:
+                transaction_frequency = get_transaction_frequency(transaction_data['user_id'], transaction_time, db=db)
+
+            location = transaction_data['location']
+            rows.append([
+                transaction_data['amount'],  # Transaction amount
+                transaction_frequency,  # Number of transactions in last 24 hours
+                transaction_time.hour,  # Hour of the transaction (for time-of-day feature)
+                1 if location == 'San Francisco' else 0,  # One-hot encode location
+                1 if location == 'Los Angeles' else 0,
+                1 if location == 'Chicago' else 0,
+                1 if location == 'Houston' else 0,
+            ])
+    finally:
+        db.close()
 
-    # Create a dictionary for a single transaction with new features
-    transaction = {
-        'amount': [transaction_data['amount']],  # Transaction amount
-        'transaction_frequency': [transaction_frequency],  # Number of transactions in last 24 hours
-        'transaction_hour': [transaction_hour],  # Hour of the transaction
-        'location_San Francisco': [1 if transaction_data['location'] == 'San Francisco' else 0],  # One-hot encode location
-        'location_Los Angeles': [1 if transaction_data['location'] == 'Los Angeles' else 0],
-        'location_Chicago': [1 if transaction_data['location'] == 'Chicago' else 0],
-        'location_Houston': [1 if transaction_data['location'] == 'Houston' else 0],
-    }
-    
     # Convert to a numpy array for model input
-    X = np.array(list(transaction.values())).reshape(1, -1)
+    X = np.array(rows, dtype=float).reshape(len(rows), -1)
 
     # Scale the amount and other features
     scaler = load_scaler()
-    X_scaled = scaler.fit_transform(X)  # Use the pre-fitted scaler to transform the input features
+    X_scaled = scaler.transform(X)  # Use the pre-fitted scaler to transform the input features
 
     return X_scaled
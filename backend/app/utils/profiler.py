@@ -0,0 +1,150 @@
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from app.utils.config import PROFILE_SAMPLE_INTERVAL_MS
+
+
+def _frame_label(frame):
+    # "qualified.function (file.py)" keeps flamegraph frames readable without splitting them per line
+    code = frame.f_code
+    return f"{getattr(code, 'co_qualname', code.co_name)} ({os.path.basename(code.co_filename)})"
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler sampling the stacks of every thread in the running process.
+
+    While a profile is running, a background thread wakes up every `interval` seconds and records the current
+    stack of each thread with `sys._current_frames()`. Samples of the event loop thread include whatever
+    coroutine is executing at that moment, such as the background `consume_transactions` task; worker threads
+    show blocking calls offloaded to the thread pool. Nothing runs when no profile is active.
+
+    Results are returned in the collapsed-stack format understood by flamegraph tools
+    (`thread;outer;inner count` per line).
+    """
+
+    def __init__(self, interval=PROFILE_SAMPLE_INTERVAL_MS / 1000.0):
+        self.interval = interval
+        self._lock = threading.Lock()  # Only one profile may run at a time
+
+    @property
+    def running(self):
+        return self._lock.locked()
+
+    def _sample(self, stacks, stop, own_ident):
+        thread_names = {t.ident: t.name for t in threading.enumerate()}
+        while not stop.is_set():
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                labels.append(thread_names.get(ident, f"thread-{ident}"))
+                stacks[";".join(reversed(labels))] += 1
+            stop.wait(self.interval)
+
+    def profile(self, seconds):
+        """
+        Sample all threads for `seconds` and return the collapsed stacks.
+
+        This blocks the calling thread for the duration of the profile, so call it from a worker thread.
+
+        Args:
+            seconds (float): How long to sample.
+
+        Returns:
+            str: Collapsed stacks, one `stack count` line per distinct stack, most frequent first.
+
+        Raises:
+            RuntimeError: If another profile is already running.
+        """
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("A profile is already running")
+        try:
+            stacks = Counter()
+            stop = threading.Event()
+            sampler = threading.Thread(target=lambda: self._sample(stacks, stop, threading.get_ident()),
+                                       name="profiler-sampler", daemon=True)
+            sampler.start()
+            time.sleep(seconds)
+            stop.set()
+            sampler.join()
+            return "\n".join(f"{stack} {count}" for stack, count in stacks.most_common())
+        finally:
+            self._lock.release()
+
+
+class MemoryTracker:
+    """
+    On-demand `tracemalloc` snapshots with growth since the previous snapshot.
+
+    Tracing is only enabled after the first request, and can be switched off again with `stop`, so the
+    allocator is not instrumented unless someone is looking.
+    """
+
+    def __init__(self, frames=10):
+        self.frames = frames
+        self.last_snapshot = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _take_snapshot():
+        # Leave out allocations made by tracemalloc itself and by the import machinery
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+
+    def snapshot(self, top=20):
+        """
+        Take a snapshot of the traced allocations.
+
+        Args:
+            top (int): Number of allocation sites to report.
+
+        Returns:
+            dict: `status`, plus `top_allocations` and `growth` (relative to the previous snapshot) once tracing is on.
+        """
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(self.frames)
+                self.last_snapshot = self._take_snapshot()
+                return {"status": "tracing started", "top_allocations": [], "growth": []}
+
+            snapshot = self._take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            result = {
+                "status": "tracing",
+                "traced_bytes": current,
+                "peak_traced_bytes": peak,
+                "top_allocations": [
+                    {"location": str(stat.traceback[0]), "size_bytes": stat.size, "count": stat.count}
+                    for stat in snapshot.statistics("lineno")[:top]
+                ],
+                "growth": [],
+            }
+            if self.last_snapshot is not None:
+                result["growth"] = [
+                    {"location": str(stat.traceback[0]), "size_diff_bytes": stat.size_diff, "count_diff": stat.count_diff}
+                    for stat in snapshot.compare_to(self.last_snapshot, "lineno")[:top]
+                ]
+            self.last_snapshot = snapshot
+            return result
+
+    def stop(self):
+        """
+        Stop tracing and discard the last snapshot.
+        """
+        with self._lock:
+            tracemalloc.stop()
+            self.last_snapshot = None
+
+
+# Process-wide instances used by the debug routes
+profiler = SamplingProfiler()
+memory_tracker = MemoryTracker()
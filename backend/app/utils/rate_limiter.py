@@ -0,0 +1,157 @@
+import heapq
+import math
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from prometheus_client import Counter, Gauge
+from app.utils.config import (
+    RATE_LIMIT_USER_RATE,
+    RATE_LIMIT_USER_BURST,
+    RATE_LIMIT_MAX_USERS,
+    RATE_LIMIT_HOT_KEYS,
+    RATE_LIMIT_HOT_WINDOW_SECONDS,
+)
+from app.utils.logging_config import setup_logging
+import logging
+
+# Initialize logging for this module
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Prometheus metrics describing per-user rate limiting on the ingest routes
+rate_limit_requests = Counter('rate_limit_requests_total', 'Ingest requests by per-user rate limit decision', ['route', 'result'])
+rate_limit_buckets = Gauge('rate_limit_buckets', 'Users with a token bucket in memory', ['route'], multiprocess_mode='livesum')
+rate_limit_evictions = Counter('rate_limit_bucket_evictions_total', 'Token buckets evicted while not full, to stay within the user limit', ['route'])
+rate_limit_hot_users = Gauge('rate_limit_hot_user_requests', 'Requests of the busiest users during the last window', ['route', 'user_id'],
+                             multiprocess_mode='livesum')
+
+
+class UserRateLimiter:
+    """
+    In-memory token bucket per user for the ingest routes.
+
+    Each user may send `burst` requests at once and `rate` requests per second on average. Buckets are stored
+    column-wise (token count, last update and request count in flat arrays, a dict mapping each user to its
+    slot) and kept in least-recently-seen order. A bucket left alone for `burst / rate` seconds has refilled
+    completely, so it is dropped without changing any decision; `max_users` bounds the memory when many users
+    are active at once by dropping the least recently seen bucket.
+
+    Every `hot_window` seconds the `hot_keys` users with the most requests are exported as
+    `rate_limit_hot_user_requests`, so an abusive user shows up by name without one time series per user.
+
+    Limits apply per process: with several API workers, a user gets `rate` per worker.
+
+    Args:
+        name (str): Value of the `route` label of the metrics.
+        rate (float): Tokens added per second; 0 disables the limiter.
+        burst (float): Bucket size.
+        max_users (int): Most buckets kept.
+        hot_keys (int): Users exported per window.
+        hot_window (float): Seconds between hot user exports.
+    """
+
+    def __init__(self, name, rate=RATE_LIMIT_USER_RATE, burst=RATE_LIMIT_USER_BURST, max_users=RATE_LIMIT_MAX_USERS,
+                 hot_keys=RATE_LIMIT_HOT_KEYS, hot_window=RATE_LIMIT_HOT_WINDOW_SECONDS, clock=time.monotonic):
+        self.name = name
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.max_users = max_users
+        self.hot_keys = hot_keys
+        self.hot_window = hot_window
+        self.clock = clock
+        self.idle = self.burst / rate if rate > 0 else math.inf  # Time for an empty bucket to fill up
+        self.slots = OrderedDict()  # User id -> slot, least recently seen first
+        self.tokens = array('d')
+        self.updated = array('d')
+        self.requests = array('L')  # Requests of the current hot window
+        self.free = []  # Slots of evicted buckets
+        self.exported = set()  # Users currently exported as hot
+        self.window_start = clock()
+        self._lock = threading.Lock()
+        self._allowed = rate_limit_requests.labels(route=name, result='allowed')
+        self._limited = rate_limit_requests.labels(route=name, result='limited')
+        self._buckets = rate_limit_buckets.labels(route=name)
+
+    @property
+    def enabled(self):
+        return self.rate > 0
+
+    def try_acquire(self, user_id):
+        """
+        Take one token from the user's bucket.
+
+        Returns:
+            bool: True if the request is within the user's rate, False if it is over the limit.
+        """
+        if not self.enabled:
+            return True
+        with self._lock:
+            now = self.clock()
+            slot = self._bucket(user_id, now)
+            self.requests[slot] += 1
+            allowed = self.tokens[slot] >= 1
+            if allowed:
+                self.tokens[slot] -= 1
+            if now - self.window_start >= self.hot_window:
+                self._export_hot_users(now)
+        (self._allowed if allowed else self._limited).inc()
+        return allowed
+
+    def retry_after(self, user_id):
+        """
+        Whole seconds until the user's bucket holds a token again (at least 1).
+        """
+        with self._lock:
+            slot = self.slots.get(user_id)
+            if slot is None or not self.enabled:
+                return 1
+            missing = 1 - min(self.burst, self.tokens[slot] + (self.clock() - self.updated[slot]) * self.rate)
+            return max(1, math.ceil(missing / self.rate))
+
+    def _bucket(self, user_id, now):
+        slot = self.slots.get(user_id)
+        if slot is not None:
+            # Refill for the time elapsed since the user was last seen
+            self.tokens[slot] = min(self.burst, self.tokens[slot] + (now - self.updated[slot]) * self.rate)
+            self.updated[slot] = now
+            self.slots.move_to_end(user_id)
+            return slot
+
+        self._evict(now)
+        if self.free:
+            slot = self.free.pop()
+            self.tokens[slot], self.updated[slot], self.requests[slot] = self.burst, now, 0
+        else:
+            slot = len(self.tokens)
+            self.tokens.append(self.burst)
+            self.updated.append(now)
+            self.requests.append(0)
+        self.slots[user_id] = slot
+        self._buckets.set(len(self.slots))
+        return slot
+
+    def _evict(self, now):
+        while self.slots:
+            user_id, slot = next(iter(self.slots.items()))
+            if now - self.updated[slot] < self.idle:
+                if len(self.slots) < self.max_users:
+                    break
+                rate_limit_evictions.labels(route=self.name).inc()
+            del self.slots[user_id]
+            self.free.append(slot)
+        self._buckets.set(len(self.slots))
+
+    def _export_hot_users(self, now):
+        hottest = heapq.nlargest(self.hot_keys, ((self.requests[slot], user_id) for user_id, slot in self.slots.items()))
+        hot = {user_id: count for count, user_id in hottest if count > 0}
+        for user_id in self.exported - set(hot):
+            # Zero the series first: in multiprocess mode the last value would otherwise stay in the shared files
+            rate_limit_hot_users.labels(route=self.name, user_id=user_id).set(0)
+            rate_limit_hot_users.remove(self.name, user_id)
+        for user_id, count in hot.items():
+            rate_limit_hot_users.labels(route=self.name, user_id=user_id).set(count)
+        self.exported = set(hot)
+        for slot in self.slots.values():
+            self.requests[slot] = 0
+        self.window_start = now
@@ -0,0 +1,187 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from prometheus_client import Counter, Gauge
+from starlette.responses import Response
+from app.utils.config import RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_TTL_SECONDS
+
+# Key of the event the consumer publishes on the event bus after every persisted batch
+DATA_VERSION_KEY = "data_version"
+
+# Prometheus metrics for the read cache
+response_cache_requests = Counter('response_cache_requests_total', 'Cached read requests by outcome', ['endpoint', 'result'])
+response_not_modified = Counter('response_not_modified_total', 'Conditional read requests answered with 304 Not Modified', ['endpoint'])
+response_cache_bytes = Gauge('response_cache_bytes', 'Serialized response bytes held by the read cache', ['endpoint'], multiprocess_mode='livesum')
+response_cache_evictions = Counter('response_cache_evictions_total', 'Responses evicted from the read cache to stay within its size', ['endpoint'])
+
+_data_version = time.time_ns()  # Newer than any version published before this process started
+_version_lock = threading.Lock()
+
+
+def current_data_version():
+    return _data_version
+
+
+def bump_data_version(version=None):
+    """
+    Advance the data version, which invalidates every cached response.
+
+    Args:
+        version (int, optional): A version received from another process; the version never goes back. By
+            default the version moves to the current time in nanoseconds, or one past the current version.
+
+    Returns:
+        int: The new data version.
+    """
+    global _data_version
+    with _version_lock:
+        if version is None:
+            version = max(_data_version + 1, time.time_ns())
+        _data_version = max(_data_version, version)
+        return _data_version
+
+
+def is_data_version_event(event):
+    return DATA_VERSION_KEY in event
+
+
+async def observe_data_version(event):
+    """
+    Event bus subscriber applying the data versions published by the consumers.
+    """
+    if is_data_version_event(event):
+        bump_data_version(event[DATA_VERSION_KEY])
+
+
+def etag_for(body):
+    """
+    Strong ETag of a serialized response, derived from its bytes so every process agrees on it.
+    """
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match, etag):
+    """
+    Tell whether an `If-None-Match` request header matches the ETag of the current representation.
+    """
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    # If-None-Match uses the weak comparison: W/"x" matches "x"
+    return "*" in candidates or etag in (candidate.removeprefix("W/") for candidate in candidates)
+
+
+class CachedResponse:
+    __slots__ = ("body", "etag", "version", "created")
+
+    def __init__(self, body, version):
+        self.body = body
+        self.etag = etag_for(body)
+        self.version = version
+        self.created = time.monotonic()
+
+
+class ResponseCache:
+    """
+    Size-bounded LRU of serialized read responses, invalidated by the data version.
+
+    Entries hold the exact response bytes and their ETag. An entry is served only while the data version it
+    was built at is still current: the consumer bumps the version after every persisted batch and publishes it
+    on the event bus, so every API process drops its stale responses at once. Writes that bypass the consumer
+    (replays, manual fixes) do not bump the version; `ttl` bounds how long they can go unnoticed.
+
+    Args:
+        name (str): Value of the `endpoint` label of the metrics.
+        max_bytes (int): Total body bytes kept; least recently used entries are evicted beyond it.
+        ttl (float): Seconds after which an entry is rebuilt even if the version did not change.
+    """
+
+    def __init__(self, name, max_bytes=RESPONSE_CACHE_MAX_BYTES, ttl=RESPONSE_CACHE_TTL_SECONDS):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()  # Sync routes read the cache from the thread pool
+        self._hits = response_cache_requests.labels(endpoint=name, result='hit')
+        self._misses = response_cache_requests.labels(endpoint=name, result='miss')
+        self._bytes = response_cache_bytes.labels(endpoint=name)
+        self._evictions = response_cache_evictions.labels(endpoint=name)
+        self._not_modified = response_not_modified.labels(endpoint=name)
+
+    def get(self, key):
+        """
+        Return the current response for `key`, or None if it must be rebuilt.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry.version == current_data_version() \
+                    and time.monotonic() - entry.created < self.ttl:
+                self.entries.move_to_end(key)
+                self._hits.inc()
+                return entry
+            self._misses.inc()
+            return None
+
+    def put(self, key, body, version):
+        """
+        Store a freshly serialized response.
+
+        Args:
+            key (Hashable): The request key, e.g. the path and query parameters.
+            body (bytes): The serialized response.
+            version (int): The data version read before the response was built, so a batch persisted while
+                building it leaves the entry stale rather than hiding the batch.
+
+        Returns:
+            CachedResponse: The response with its ETag (also returned when it is too large to be kept).
+        """
+        entry = CachedResponse(body, version)
+        if len(body) > self.max_bytes:
+            return entry
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous.body)
+            self.entries[key] = entry
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted.body)
+                self._evictions.inc()
+            self._bytes.set(self.size)
+        return entry
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+            self._bytes.set(0)
+
+    def respond(self, request, build, media_type="application/json"):
+        """
+        Answer a read request from the cache, building and caching the body on a miss.
+
+        The response carries the ETag of the body; a request whose `If-None-Match` matches it gets an empty
+        304 instead, whether the body came from the cache or was just rebuilt.
+
+        Args:
+            request (Request): The incoming request; its path and query parameters are the cache key.
+            build (Callable[[], bytes]): Queries and serializes the response body.
+            media_type (str): Content type of the body.
+
+        Returns:
+            Response: The 200 or 304 response.
+        """
+        key = (request.url.path, tuple(sorted(request.query_params.multi_items())))
+        entry = self.get(key)
+        if entry is None:
+            version = current_data_version()
+            entry = self.put(key, build(), version)
+
+        headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}  # Clients revalidate on every poll
+        if etag_matches(request.headers.get("if-none-match"), entry.etag):
+            self._not_modified.inc()
+            return Response(status_code=304, headers=headers)
+        return Response(content=entry.body, media_type=media_type, headers=headers)
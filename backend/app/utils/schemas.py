@@ -1,5 +1,6 @@
 from pydantic import BaseModel, Field
-from datetime import datetime
+from datetime import datetime, timezone
+from typing import Optional
 
 class TransactionSchema(BaseModel):
     """
@@ -13,12 +14,15 @@ class TransactionSchema(BaseModel):
         location (str): The location where the transaction occurred.
         user_id (str): The ID of the user associated with the transaction.
         time (datetime): The timestamp of the transaction in ISO 8601 format.
+        idempotency_key (str, optional): Client-supplied key identifying the transaction across retries.
+            When omitted, a content hash is generated at ingest.
     """
     
     amount: float = Field(..., gt=0, description="The amount should be greater than 0")
     location: str
     user_id: str
     time: datetime
+    idempotency_key: Optional[str] = Field(None, max_length=128, description="Key used to suppress duplicate deliveries")
 
     class Config:
         """
@@ -34,3 +38,28 @@ class TransactionSchema(BaseModel):
                 "time": "2024-09-25T12:34:56"
             }
         }
+
+
+def parse_transaction_time(value):
+    """
+    Parse the 'time' field of a transaction as it travels through Kafka.
+
+    Any ISO 8601 timestamp is accepted, including fractional seconds and UTC offsets as produced by
+    `datetime.isoformat()`. Timestamps with an offset are converted to naive UTC to match the `time` column.
+
+    Args:
+        value (str or datetime): The transaction time.
+
+    Returns:
+        datetime: The naive transaction time.
+
+    Raises:
+        ValueError: If the value is not an ISO 8601 timestamp.
+    """
+    if not isinstance(value, datetime):
+        if not isinstance(value, str):
+            raise ValueError(f"Invalid transaction time: {value!r}")
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
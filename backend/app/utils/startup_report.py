@@ -0,0 +1,109 @@
+import os
+import subprocess
+import sys
+import time
+
+# Directory containing the `app` package, used as working directory for the import-time subprocess
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+
+def collect_import_times(module="app.main"):
+    """
+    Measure per-module import times of `module` in a fresh interpreter using `python -X importtime`.
+
+    Args:
+        module (str): The module whose import is measured.
+
+    Returns:
+        list[tuple[str, int, int]]: (module name, self time in µs, cumulative time in µs) for every imported module.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+    )
+
+    timings = []
+    for line in result.stderr.splitlines():
+        # Lines look like: "import time:       123 |       4567 |   package.module"
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        timings.append((name.strip(), int(self_us), int(cumulative_us)))
+    return timings
+
+
+def measure_startup_phases(import_times, warm_up=True):
+    """
+    Time the phases between process start and readiness to score transactions.
+
+    The import of app.main is taken from the fresh-interpreter measurement, since in this process it may
+    already be (partly) imported; the remaining phases are timed in-process.
+
+    Args:
+        import_times (list): Output of `collect_import_times` for app.main.
+        warm_up (bool): Include a dummy prediction as the last phase.
+
+    Returns:
+        list[tuple[str, float]]: (phase name, duration in seconds) in execution order.
+    """
+    app_main_us = next((cumulative for name, _, cumulative in import_times if name == "app.main"), 0)
+    phases = [("import app.main (fresh interpreter)", app_main_us / 1e6)]
+
+    def timed(name, fn):
+        start = time.perf_counter()
+        result = fn()
+        phases.append((name, time.perf_counter() - start))
+        return result
+
+    consumer = timed("import app.consumers.kafka_consumer",
+                     lambda: __import__("app.consumers.kafka_consumer", fromlist=["bootstrap_consumer"]))
+
+    from app.services.fraud_detection_service import get_fraud_model, warm_up_model
+    from app.services.rule_engine import load_rule_set
+
+    model, _ = timed("load model and scaler", get_fraud_model)
+    timed("compile fraud rules", load_rule_set)
+    if warm_up:
+        timed("model warm-up predict", lambda: warm_up_model(model))
+    timed("bootstrap consumer", consumer.bootstrap_consumer)
+    return phases
+
+
+def format_startup_report(import_times, phases, top=20):
+    """
+    Render the startup report as plain text.
+
+    Args:
+        import_times (list): Output of `collect_import_times`.
+        phases (list): Output of `measure_startup_phases`.
+        top (int): Number of slowest modules (by cumulative time) to list.
+
+    Returns:
+        str: The formatted report.
+    """
+    lines = ["Startup phases:"]
+    for name, duration in phases:
+        lines.append(f"  {duration * 1000:10.1f} ms  {name}")
+    lines.append(f"  {sum(d for _, d in phases) * 1000:10.1f} ms  time to ready")
+
+    lines.append("")
+    lines.append(f"Slowest imports of app.main (top {top} by cumulative time):")
+    lines.append(f"  {'self ms':>10}  {'cumul ms':>10}  module")
+    for name, self_us, cumulative_us in sorted(import_times, key=lambda t: t[2], reverse=True)[:top]:
+        lines.append(f"  {self_us / 1000:10.1f}  {cumulative_us / 1000:10.1f}  {name}")
+    return "\n".join(lines)
+
+
+def print_startup_report(top=20, warm_up=True):
+    """
+    Collect and print the startup report.
+
+    Args:
+        top (int): Number of slowest modules to list.
+        warm_up (bool): Include the model warm-up phase.
+    """
+    import_times = collect_import_times()
+    phases = measure_startup_phases(import_times, warm_up=warm_up)
+    print(format_startup_report(import_times, phases, top=top))
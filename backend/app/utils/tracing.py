@@ -0,0 +1,150 @@
+import json
+import random
+import threading
+import time
+import uuid
+from prometheus_client import Histogram
+from app.utils.config import TRACING_ENABLED, TRACE_EXPORT_PATH, TRACE_EXPORT_SAMPLE_RATE
+from app.utils.logging_config import setup_logging
+import logging
+
+# Initialize logging for this module
+setup_logging()
+logger = logging.getLogger(__name__)
+
+TRACE_HEADER = "x-trace"  # Kafka header carrying the trace context of a transaction
+TRACE_KEY = "trace"  # Field of the event bus payload carrying the trace to the WebSocket fan-out
+
+# Stages stamped on a trace, in pipeline order, and the hops between them
+STAGES = ("ingest", "published", "consumed", "persisted", "notified")
+HOPS = {
+    "ingest": ("ingest", "published"),  # HTTP handling until the producer handed the message to Kafka
+    "broker": ("published", "consumed"),  # Producer buffering, broker and consumer lag
+    "processing": ("consumed", "persisted"),  # Validation, scoring and the database transaction
+    "delivery": ("persisted", "notified"),  # Event bus and WebSocket send
+}
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Prometheus metrics for the end-to-end latency of a transaction
+e2e_latency = Histogram('transaction_e2e_latency_seconds', 'Time from POST /api/transaction to WebSocket delivery',
+                        buckets=LATENCY_BUCKETS)
+hop_latency = Histogram('transaction_hop_latency_seconds', 'Time a transaction spent in one hop of the pipeline', ['hop'],
+                        buckets=LATENCY_BUCKETS)
+
+
+def start_trace():
+    """
+    Create the trace context of a transaction entering the system, stamped with the ingest time.
+
+    Returns:
+        dict or None: The trace (its `id` and one epoch timestamp per stage), or None if tracing is disabled.
+    """
+    if not TRACING_ENABLED:
+        return None
+    return {"id": uuid.uuid4().hex, "ingest": time.time()}
+
+
+def trace_headers(trace):
+    """
+    Kafka headers carrying a trace, or None without a trace.
+    """
+    if trace is None:
+        return None
+    return [(TRACE_HEADER, json.dumps(trace, separators=(",", ":")).encode('utf-8'))]
+
+
+def trace_from_headers(headers):
+    """
+    The trace carried in the headers of a consumed Kafka message.
+
+    Returns:
+        dict or None: The trace, or None if the message has none or it cannot be decoded.
+    """
+    for key, value in headers or ():
+        if key == TRACE_HEADER and value is not None:
+            try:
+                trace = json.loads(value)
+            except ValueError:
+                return None
+            return trace if isinstance(trace, dict) else None
+    return None
+
+
+def hop_durations(trace):
+    """
+    Seconds spent in every hop whose two stages were stamped. Timestamps come from different hosts, so a
+    hop can come out slightly negative under clock skew; it is reported as 0.
+    """
+    durations = {}
+    for hop, (start, end) in HOPS.items():
+        if isinstance(trace.get(start), (int, float)) and isinstance(trace.get(end), (int, float)):
+            durations[hop] = max(0.0, trace[end] - trace[start])
+    return durations
+
+
+def record_persisted(trace, published, consumed, persisted=None):
+    """
+    Stamp the consumer stages of a trace and observe the hops up to persistence.
+
+    Args:
+        trace (dict): The trace read from the message headers.
+        published (float or None): When the producer sent the message (the Kafka record timestamp), in epoch seconds.
+        consumed (float): When the consumer fetched the message.
+        persisted (float, optional): When its row was committed; now if omitted.
+
+    Returns:
+        dict: The trace, to be published with the transaction.
+    """
+    if published:
+        trace["published"] = published
+    trace["consumed"] = consumed
+    trace["persisted"] = persisted or time.time()
+    for hop, duration in hop_durations(trace).items():
+        hop_latency.labels(hop=hop).observe(duration)
+    return trace
+
+
+def record_delivered(trace, notified=None):
+    """
+    Stamp the delivery of a transaction to WebSocket clients and observe the delivery hop and the end-to-end
+    latency. A sample of the complete traces is appended to `TRACE_EXPORT_PATH`.
+    """
+    trace["notified"] = notified or time.time()
+    durations = hop_durations(trace)
+    if "delivery" in durations:
+        hop_latency.labels(hop="delivery").observe(durations["delivery"])
+    if isinstance(trace.get("ingest"), (int, float)):
+        e2e_latency.observe(max(0.0, trace["notified"] - trace["ingest"]))
+    trace_exporter.maybe_export(trace, durations)
+
+
+class TraceExporter:
+    """
+    Appends a random sample of complete traces to a local file, one JSON object per line, with the stage
+    timestamps and the per-hop durations.
+
+    Args:
+        path (str): File to append to; nothing is exported if empty.
+        sample_rate (float): Fraction of the traces exported.
+    """
+
+    def __init__(self, path=TRACE_EXPORT_PATH, sample_rate=TRACE_EXPORT_SAMPLE_RATE):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.lock = threading.Lock()
+
+    def maybe_export(self, trace, durations):
+        if not self.path or random.random() >= self.sample_rate:
+            return
+        record = {"id": trace.get("id"), "stages": {s: trace[s] for s in STAGES if s in trace}, "hops": durations}
+        if "ingest" in trace and "notified" in trace:
+            record["e2e"] = max(0.0, trace["notified"] - trace["ingest"])
+        try:
+            with self.lock, open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, separators=(",", ":")) + "\n")
+        except OSError as e:
+            logger.warning("Failed to export trace %s: %s", trace.get("id"), e)
+
+
+trace_exporter = TraceExporter()
@@ -0,0 +1,203 @@
+import threading
+import time
+import numpy as np
+from prometheus_client import Counter, Gauge
+from app.utils.config import TRANSACTION_BUFFER_CAPACITY, TRANSACTION_BUFFER_RESYNC_SECONDS
+from app.utils.response_cache import is_data_version_event
+from app.utils.schemas import parse_transaction_time
+from app.utils.logging_config import setup_logging
+import logging
+
+# Initialize logging for this module
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Prometheus metrics for the recent transactions buffer
+buffer_queries = Counter('transaction_buffer_queries_total', 'Recent transaction reads by outcome', ['result'])
+buffer_size = Gauge('transaction_buffer_size', 'Transactions held by the recent transactions buffer', multiprocess_mode='livesum')
+
+FIELDS = ("id", "user_id", "amount", "location", "time", "is_fraud", "idempotency_key")
+
+
+class TransactionRingBuffer:
+    """
+    Fixed-capacity, columnar buffer of the most recently persisted transactions of this process.
+
+    Every column is a NumPy array written in ring order; locations and users are interned and stored as
+    integer codes. The buffer is filled from the events the consumer publishes after every persisted batch,
+    so each API process keeps its own copy whether the consumer runs in the API or on its own.
+
+    The buffer knows it is complete above `floor`: every transaction with a greater id is held. Queries it
+    cannot answer exactly (the buffer is cold, or the range reaches below the floor) return None and the
+    caller falls back to the database. The buffer is warmed from the database on first use and again every
+    `resync_seconds`, which also picks up rows written outside the consumer (replays, manual fixes).
+
+    Args:
+        capacity (int): Most transactions held; the oldest are overwritten.
+        resync_seconds (float): Time after which the buffer asks to be warmed from the database again.
+    """
+
+    def __init__(self, capacity=TRANSACTION_BUFFER_CAPACITY, resync_seconds=TRANSACTION_BUFFER_RESYNC_SECONDS):
+        if capacity < 1:
+            raise ValueError("The buffer capacity must be at least 1")
+        self.capacity = capacity
+        self.resync_seconds = resync_seconds
+        self.lock = threading.RLock()  # Sync routes read the buffer from the thread pool
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.ids = np.zeros(self.capacity, dtype=np.int64)
+            self.amounts = np.zeros(self.capacity, dtype=np.float64)
+            self.times = np.zeros(self.capacity, dtype="datetime64[us]")
+            self.is_fraud = np.zeros(self.capacity, dtype=bool)
+            self.location_codes = np.zeros(self.capacity, dtype=np.int32)
+            self.user_codes = np.zeros(self.capacity, dtype=np.int32)
+            self.keys = np.empty(self.capacity, dtype=object)  # Idempotency keys, only read back
+            self.held = set()  # Ids in the buffer, to ignore events delivered twice
+            self.size = 0
+            self.next = 0  # Slot written by the next append
+            self.floor = None  # Every transaction with a greater id is held; None while cold
+            self.warmed_at = None
+            self.locations, self.location_index = [], {}
+            self.users, self.user_index = [], {}
+            buffer_size.set(0)
+
+    @property
+    def warm(self):
+        return self.floor is not None and time.monotonic() - self.warmed_at < self.resync_seconds
+
+    def append(self, transactions):
+        """
+        Add persisted transactions; transactions already held are ignored.
+
+        Args:
+            transactions (list[dict]): Transactions as published on the event bus.
+        """
+        with self.lock:
+            for transaction in transactions:
+                if transaction["id"] not in self.held:
+                    self._write(transaction)
+            buffer_size.set(self.size)
+
+    def warm_up(self, transactions, complete):
+        """
+        Merge the latest transactions read from the database and mark the buffer complete above them.
+
+        Args:
+            transactions (list): The latest rows (dicts or `Transaction` objects), in any order.
+            complete (bool): True if these are all the transactions in the database.
+        """
+        rows = [row if isinstance(row, dict) else {field: getattr(row, field) for field in FIELDS} for row in transactions]
+        with self.lock:
+            held = self._rows(np.arange(self.size))
+            merged = sorted(held + [row for row in rows if row["id"] not in self.held], key=lambda row: row["id"])
+
+            self.clear()
+            for row in merged[-self.capacity:]:
+                self._write(row)
+            if complete:
+                floor = 0
+            else:
+                floor = min(row["id"] for row in rows) - 1 if rows else 0
+            if len(merged) > self.capacity:
+                floor = max(floor, merged[-self.capacity - 1]["id"])
+            self.floor = floor
+            self.warmed_at = time.monotonic()
+            buffer_size.set(self.size)
+
+    def query(self, limit=None, since_id=None, fraud_only=False):
+        """
+        Answer a recent transactions query from the buffer.
+
+        Args:
+            limit (int, optional): Only return the latest `limit` matching transactions.
+            since_id (int, optional): Only return transactions with a greater id.
+            fraud_only (bool): Only return transactions classified as fraudulent.
+
+        Returns:
+            list[dict] or None: The matching transactions, oldest first, or None if the buffer cannot tell.
+        """
+        with self.lock:
+            if not self.warm or (since_id is not None and since_id < self.floor) \
+                    or (since_id is None and limit is None and self.floor > 0):
+                buffer_queries.labels(result='fallback').inc()
+                return None
+
+            ids = self.ids[:self.size]
+            mask = np.ones(self.size, dtype=bool)
+            if since_id is not None:
+                mask &= ids > since_id
+            if fraud_only:
+                mask &= self.is_fraud[:self.size]
+            slots = np.flatnonzero(mask)
+            slots = slots[np.argsort(ids[slots], kind="stable")]
+            if limit is not None:
+                if len(slots) < limit and self.floor > 0 and since_id is None:
+                    # Fewer matches than asked for: older ones may sit below the floor
+                    buffer_queries.labels(result='fallback').inc()
+                    return None
+                slots = slots[len(slots) - min(limit, len(slots)):]
+            buffer_queries.labels(result='hit').inc()
+            return self._rows(slots)
+
+    def _write(self, transaction):
+        slot = self.next
+        if self.size == self.capacity:
+            evicted = int(self.ids[slot])
+            self.held.discard(evicted)
+            if self.floor is not None:
+                # Overwriting the oldest slot: the buffer is no longer complete down to its id
+                self.floor = max(self.floor, evicted)
+        self.ids[slot] = transaction["id"]
+        self.amounts[slot] = transaction["amount"]
+        self.times[slot] = np.datetime64(parse_transaction_time(transaction["time"]), "us")
+        self.is_fraud[slot] = bool(transaction["is_fraud"])
+        self.location_codes[slot] = self._intern(self.locations, self.location_index, transaction["location"])
+        self.user_codes[slot] = self._intern(self.users, self.user_index, transaction["user_id"])
+        self.keys[slot] = transaction.get("idempotency_key")
+        self.held.add(transaction["id"])
+        self.next = (slot + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        if len(self.users) > 2 * self.capacity or len(self.locations) > 2 * self.capacity:
+            self._compact()
+
+    def _intern(self, values, index, value):
+        code = index.get(value)
+        if code is None:
+            code = index[value] = len(values)
+            values.append(value)
+        return code
+
+    def _compact(self):
+        # Forget the values no held transaction refers to any more, so the intern tables stay bounded
+        for values, index, codes in ((self.users, self.user_index, self.user_codes),
+                                     (self.locations, self.location_index, self.location_codes)):
+            used, remapped = np.unique(codes[:self.size], return_inverse=True)
+            kept = [values[code] for code in used.tolist()]
+            values[:] = kept
+            index.clear()
+            index.update((value, code) for code, value in enumerate(kept))
+            codes[:self.size] = remapped
+
+    def _rows(self, slots):
+        ids = self.ids[slots].tolist()
+        users = [self.users[code] for code in self.user_codes[slots].tolist()]
+        amounts = self.amounts[slots].tolist()
+        locations = [self.locations[code] for code in self.location_codes[slots].tolist()]
+        times = [t.isoformat() for t in self.times[slots].tolist()]
+        frauds = self.is_fraud[slots].tolist()
+        keys = self.keys[slots].tolist()
+        return [dict(zip(FIELDS, row)) for row in zip(ids, users, amounts, locations, times, frauds, keys)]
+
+
+# Recent transactions of this process, shared by the read routes
+transaction_buffer = TransactionRingBuffer()
+
+
+async def observe_transactions(event):
+    """
+    Event bus subscriber adding the transactions published by the consumers to the buffer.
+    """
+    if not is_data_version_event(event):
+        transaction_buffer.append([event])
@@ -0,0 +1,168 @@
+import threading
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta
+from kafka.partitioner.default import murmur2
+from prometheus_client import Counter, Gauge
+
+# Prometheus metrics for the per-user activity kept by the consumer
+user_activity_lookups = Counter('user_activity_lookups_total', 'Transaction frequency lookups by outcome', ['result'])
+user_activity_users = Gauge('user_activity_users', 'Users whose recent transactions are held in memory', multiprocess_mode='livesum')
+_answered = user_activity_lookups.labels(result='memory')
+_not_owned = user_activity_lookups.labels(result='not_owned')
+_too_old = user_activity_lookups.labels(result='too_old')
+
+
+def partition_for_user(user_id, partition_count):
+    """
+    The partition the producer's default partitioner assigns to a message keyed by `user_id`.
+
+    Mirrors Kafka's murmur2 key hashing, which every client uses for keyed messages by default.
+
+    Args:
+        user_id (str): The message key.
+        partition_count (int): Number of partitions of the topic.
+
+    Returns:
+        int: The partition number.
+    """
+    return (murmur2(user_id.encode('utf-8')) & 0x7fffffff) % partition_count
+
+
+class UserActivityStore:
+    """
+    In-memory record of the recent transaction times of the users whose partitions this consumer owns.
+
+    `window` is the frequency feature window (`FREQUENCY_WINDOW` in the preprocessing).
+
+    Transactions are keyed by user id, so every transaction of a user goes through the one consumer that owns
+    the user's partition. That consumer loads the users of a partition in bulk when the partition is assigned,
+    records every transaction it persists, and drops the users again when the partition is revoked. The
+    24-hour transaction frequency can then be answered from memory instead of one database query per
+    transaction.
+
+    Lookups the store cannot answer exactly (users of partitions it does not own, or times older than the
+    data it loaded) return None so the caller falls back to the database.
+
+    Lookups run in the consumer's offload threads while the event loop records, loads and drops users, so
+    the public methods hold a lock.
+    """
+
+    def __init__(self, window=timedelta(hours=24)):
+        self.window = window
+        self.partition_count = None
+        self.complete_since = {}  # Owned partition -> earliest transaction time known to be complete
+        self.times = {}  # User id -> sorted transaction times
+        self.user_partitions = {}  # User id -> partition, for the users in `times`
+        self._lock = threading.RLock()
+
+    def _partition(self, user_id):
+        partition = self.user_partitions.get(user_id)
+        return partition if partition is not None else partition_for_user(user_id, self.partition_count)
+
+    def _forget(self, user_id):
+        del self.times[user_id]
+        del self.user_partitions[user_id]
+
+    def owns(self, user_id):
+        with self._lock:
+            return self.partition_count is not None and user_id is not None and self._partition(user_id) in self.complete_since
+
+    def load(self, partitions, partition_count, rows, since):
+        """
+        Take ownership of partitions and load the recent transactions of their users.
+
+        Args:
+            partitions (Iterable[int]): The newly assigned partitions.
+            partition_count (int): Number of partitions of the topic.
+            rows (Iterable[tuple[str, datetime]]): (user_id, time) of every transaction since `since`; users of
+                other partitions are ignored.
+            since (datetime): Start of the loaded range.
+        """
+        with self._lock:
+            if partition_count != self.partition_count:
+                # Partitions were added to the topic: users hash differently, start over
+                self.times.clear()
+                self.user_partitions.clear()
+                self.complete_since.clear()
+                self.partition_count = partition_count
+
+            partitions = set(partitions) - set(self.complete_since)
+            loaded = {}
+            for user_id, time in rows:
+                if user_id is None:
+                    continue
+                partition = self._partition(user_id)
+                if partition in partitions:
+                    loaded.setdefault(user_id, []).append(time)
+                    self.user_partitions[user_id] = partition
+            for user_id, times in loaded.items():
+                times.sort()
+                self.times[user_id] = times
+            for partition in partitions:
+                self.complete_since[partition] = since
+            user_activity_users.set(len(self.times))
+
+    def drop(self, partitions):
+        """
+        Give up partitions and forget their users.
+
+        Args:
+            partitions (Iterable[int]): The revoked partitions.
+        """
+        partitions = set(partitions)
+        with self._lock:
+            for partition in partitions:
+                self.complete_since.pop(partition, None)
+            for user_id in [u for u, partition in self.user_partitions.items() if partition in partitions]:
+                self._forget(user_id)
+            user_activity_users.set(len(self.times))
+
+    def record(self, user_id, time):
+        """
+        Record a persisted transaction of a user owned by this consumer; other users are ignored.
+        """
+        with self._lock:
+            if self.owns(user_id):
+                insort(self.times.setdefault(user_id, []), time)
+                self.user_partitions[user_id] = self._partition(user_id)
+
+    def frequency(self, user_id, time):
+        """
+        Number of transactions of the user at or after `time` minus the window, like the database query.
+
+        Args:
+            user_id (str): The user.
+            time (datetime): The time of the transaction being scored.
+
+        Returns:
+            int: The transaction count, or None if the store cannot answer exactly.
+        """
+        with self._lock:
+            if not self.owns(user_id):
+                _not_owned.inc()
+                return None
+            since = time - self.window
+            if since < self.complete_since[self._partition(user_id)]:
+                _too_old.inc()
+                return None
+            _answered.inc()
+            times = self.times.get(user_id, ())
+            return len(times) - bisect_left(times, since)
+
+    def prune(self, now=None):
+        """
+        Forget transactions that no longer fall in the window of a current transaction.
+
+        Args:
+            now (datetime, optional): Current naive UTC time.
+        """
+        cutoff = (now or datetime.utcnow()) - self.window
+        with self._lock:
+            for partition, since in self.complete_since.items():
+                self.complete_since[partition] = max(since, cutoff)
+            for user_id in list(self.times):
+                times = self.times[user_id]
+                del times[:bisect_left(times, cutoff)]
+                if not times:
+                    self._forget(user_id)
+            user_activity_users.set(len(self.times))
@@ -1,4 +1,10 @@
+import asyncio
+import json
 from fastapi import WebSocket, WebSocketDisconnect
+from prometheus_client import Counter
+from app.utils.config import WS_COALESCE_DEFAULT_MS, WS_COALESCE_DEFAULT_MAX_EVENTS, WS_COALESCE_MAX_PENDING
+from app.utils.response_cache import is_data_version_event
+from app.utils.tracing import TRACE_KEY, record_delivered
 from app.utils.logging_config import setup_logging
 import logging
 
@@ -6,63 +12,407 @@ import logging
 setup_logging()  # Set up logging configuration
 logger = logging.getLogger(__name__)  # Create a logger for this module
 
-# List to keep track of connected WebSocket clients
-connected_clients = []
+# Prometheus metrics comparing immediate and coalesced delivery; frames and bytes per event are
+# websocket_frames_sent_total / websocket_events_sent_total and websocket_bytes_sent_total / websocket_events_sent_total
+ws_events_sent = Counter('websocket_events_sent_total', 'Transaction events delivered to WebSocket clients', ['mode'])
+ws_frames_sent = Counter('websocket_frames_sent_total', 'WebSocket frames carrying transaction events', ['mode'])
+ws_bytes_sent = Counter('websocket_bytes_sent_total', 'Uncompressed payload bytes of the frames carrying transaction events', ['mode'])
+DELIVERY_MODES = ("immediate", "coalesced")
+_delivery_metrics = {
+    mode: (ws_events_sent.labels(mode=mode), ws_frames_sent.labels(mode=mode), ws_bytes_sent.labels(mode=mode))
+    for mode in DELIVERY_MODES
+}
 
-async def websocket_endpoint(websocket: WebSocket):
+
+class Subscription:
+    """
+    Server-side filter describing which transactions a WebSocket client wants to receive.
+
+    Clients send a JSON message such as `{"user_ids": ["user_1"], "fraud_only": true, "locations": ["Chicago"]}`.
+    Filters on different fields are combined with AND, values within a field with OR, and omitted fields
+    match everything. A client that never subscribes receives every transaction.
+
+    Attributes:
+        user_ids (frozenset or None): Accepted user ids, or None for any user.
+        locations (frozenset or None): Accepted locations, or None for any location.
+        fraud_only (bool): Only deliver transactions classified as fraudulent.
+    """
+
+    def __init__(self, user_ids=None, locations=None, fraud_only=False):
+        self.user_ids = frozenset(user_ids) if user_ids else None
+        self.locations = frozenset(locations) if locations else None
+        self.fraud_only = bool(fraud_only)
+
+    @classmethod
+    def from_message(cls, message):
+        """
+        Build a subscription from a client message.
+
+        Args:
+            message (dict): The decoded subscription message.
+
+        Returns:
+            Subscription: The parsed subscription.
+
+        Raises:
+            ValueError: If a filter has the wrong type.
+        """
+        user_ids = message.get("user_ids")
+        locations = message.get("locations")
+        for name, values in (("user_ids", user_ids), ("locations", locations)):
+            if values is not None and (not isinstance(values, list) or not all(isinstance(v, str) for v in values)):
+                raise ValueError(f"'{name}' must be a list of strings")
+        return cls(user_ids=user_ids, locations=locations, fraud_only=message.get("fraud_only", False))
+
+    @classmethod
+    def from_query_params(cls, params):
+        """
+        Build the initial subscription from the connection URL, e.g. `/api/ws?user_ids=user_1,user_2&fraud_only=true`.
+
+        Args:
+            params (Mapping[str, str]): The WebSocket query parameters.
+
+        Returns:
+            Subscription: The parsed subscription (matching everything if no filter is given).
+        """
+        def split(name):
+            value = params.get(name)
+            return [item for item in value.split(",") if item] if value else None
+
+        fraud_only = params.get("fraud_only", "false").lower() in ("1", "true", "yes")
+        return cls(user_ids=split("user_ids"), locations=split("locations"), fraud_only=fraud_only)
+
+    def matches(self, transaction_data):
+        if self.fraud_only and not transaction_data.get("is_fraud"):
+            return False
+        if self.user_ids is not None and transaction_data.get("user_id") not in self.user_ids:
+            return False
+        if self.locations is not None and transaction_data.get("location") not in self.locations:
+            return False
+        return True
+
+    def to_dict(self):
+        return {
+            "user_ids": sorted(self.user_ids) if self.user_ids is not None else None,
+            "locations": sorted(self.locations) if self.locations is not None else None,
+            "fraud_only": self.fraud_only,
+        }
+
+
+class CoalescingPolicy:
+    """
+    Per-connection setting that batches transaction events into JSON array frames.
+
+    Clients opt in during the handshake, e.g. `/api/ws?coalesce_ms=50&coalesce_max=200`: pending events are
+    sent as one array frame every `interval_ms` milliseconds, or as soon as `max_events` are waiting.
+
+    Attributes:
+        interval_ms (int): Longest time an event waits before it is sent.
+        max_events (int): Number of pending events that triggers an immediate flush.
+    """
+
+    def __init__(self, interval_ms=WS_COALESCE_DEFAULT_MS, max_events=WS_COALESCE_DEFAULT_MAX_EVENTS):
+        if not 1 <= interval_ms <= 10000:
+            raise ValueError("'coalesce_ms' must be between 1 and 10000")
+        if not 1 <= max_events <= WS_COALESCE_MAX_PENDING:
+            raise ValueError(f"'coalesce_max' must be between 1 and {WS_COALESCE_MAX_PENDING}")
+        self.interval_ms = interval_ms
+        self.max_events = max_events
+
+    @classmethod
+    def from_query_params(cls, params):
+        """
+        Read the coalescing mode requested in the connection URL.
+
+        Args:
+            params (Mapping[str, str]): The WebSocket query parameters.
+
+        Returns:
+            CoalescingPolicy or None: The policy, or None if the client wants one frame per event.
+
+        Raises:
+            ValueError: If a parameter is not an integer or out of range.
+        """
+        if "coalesce_ms" not in params and "coalesce_max" not in params:
+            return None
+        try:
+            interval_ms = int(params.get("coalesce_ms", WS_COALESCE_DEFAULT_MS))
+            max_events = int(params.get("coalesce_max", WS_COALESCE_DEFAULT_MAX_EVENTS))
+        except ValueError:
+            raise ValueError("'coalesce_ms' and 'coalesce_max' must be integers")
+        return cls(interval_ms, max_events)
+
+
+class ClientConnection:
+    """
+    A connected WebSocket client together with its subscription and delivery mode.
+
+    Without a coalescing policy every event is sent as its own frame. With one, `send` only buffers the
+    event and a background task flushes the buffer as a JSON array frame, so the fan-out loop never waits
+    on this client's socket. A client whose buffer reaches `WS_COALESCE_MAX_PENDING` events is dropped.
     """
-    WebSocket endpoint to handle real-time connections from clients.
-    
-    This function accepts a WebSocket connection from a client, adds it to the list of connected clients, 
-    and continuously listens for messages to keep the connection alive. When the client disconnects, 
-    the connection is removed from the list.
-    
+
+    def __init__(self, websocket: WebSocket, subscription=None, coalescing=None):
+        self.websocket = websocket
+        self.subscription = subscription or Subscription()
+        self.coalescing = coalescing
+        self.mode = "coalesced" if coalescing else "immediate"
+        self.pending = []
+        self._flush_needed = asyncio.Event()
+        self._flusher = None
+
+    def start(self):
+        """
+        Start the background flush task of a coalescing connection.
+        """
+        if self.coalescing is not None and self._flusher is None:
+            self._flusher = asyncio.get_running_loop().create_task(self._flush_loop())
+
+    def stop(self):
+        """
+        Stop the background flush task; events still pending are discarded.
+        """
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+
+    async def send(self, message):
+        """
+        Send (or, when coalescing, queue) an already serialised transaction event.
+
+        Args:
+            message (str): The JSON text of the event.
+
+        Raises:
+            RuntimeError: If a coalescing client has too many events pending.
+        """
+        if self.coalescing is None:
+            await self.websocket.send_text(message)
+            self._record(1, message)
+            return
+
+        if len(self.pending) >= WS_COALESCE_MAX_PENDING:
+            raise RuntimeError(f"Client has {len(self.pending)} undelivered events")
+        self.pending.append(message)
+        if len(self.pending) >= self.coalescing.max_events:
+            self._flush_needed.set()
+
+    async def flush(self):
+        """
+        Send the pending events as JSON array frames of at most `max_events` events.
+        """
+        while self.pending:
+            events = self.pending[:self.coalescing.max_events]
+            del self.pending[:len(events)]
+            frame = "[" + ",".join(events) + "]"
+            await self.websocket.send_text(frame)
+            self._record(len(events), frame)
+
+    async def _flush_loop(self):
+        interval = self.coalescing.interval_ms / 1000
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(self._flush_needed.wait(), timeout=interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._flush_needed.clear()
+                await self.flush()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Error flushing events to client: %s", e)
+            self._flusher = None
+            unregister_client(self)
+
+    def _record(self, events, frame):
+        # JSON is serialised with ensure_ascii, so the text length is the payload size in bytes
+        events_sent, frames_sent, bytes_sent = _delivery_metrics[self.mode]
+        events_sent.inc(events)
+        frames_sent.inc()
+        bytes_sent.inc(len(frame))
+
+
+class SubscriptionIndex:
+    """
+    Index of connected clients keyed by their most selective filter.
+
+    Each client sits in exactly one bucket: by user id if it filters on users, otherwise by location if it
+    filters on locations, otherwise in the "all" or "fraud only" bucket. Delivering an event only visits the
+    buckets for the event's user id and location plus the unkeyed buckets, so the cost grows with the number
+    of matching clients instead of with the total number of clients.
+    """
+
+    def __init__(self):
+        self.clients = set()
+        self.by_user = {}
+        self.by_location = {}
+        self.unkeyed_all = set()
+        self.unkeyed_fraud_only = set()
+
+    def __len__(self):
+        return len(self.clients)
+
+    def _buckets(self, connection):
+        subscription = connection.subscription
+        if subscription.user_ids is not None:
+            return [self.by_user.setdefault(user_id, set()) for user_id in subscription.user_ids]
+        if subscription.locations is not None:
+            return [self.by_location.setdefault(location, set()) for location in subscription.locations]
+        return [self.unkeyed_fraud_only if subscription.fraud_only else self.unkeyed_all]
+
+    def add(self, connection):
+        self.clients.add(connection)
+        for bucket in self._buckets(connection):
+            bucket.add(connection)
+
+    def remove(self, connection):
+        if connection not in self.clients:
+            return
+        self.clients.discard(connection)
+        subscription = connection.subscription
+        for keys, index in ((subscription.user_ids, self.by_user), (subscription.locations, self.by_location)):
+            for key in keys or ():
+                bucket = index.get(key)
+                if bucket is not None:
+                    bucket.discard(connection)
+                    if not bucket:
+                        del index[key]
+        self.unkeyed_all.discard(connection)
+        self.unkeyed_fraud_only.discard(connection)
+
+    def update(self, connection, subscription):
+        """
+        Replace a client's subscription and re-index it.
+        """
+        self.remove(connection)
+        connection.subscription = subscription
+        self.add(connection)
+
+    def match(self, transaction_data):
+        """
+        Find the clients whose subscription matches a transaction.
+
+        Args:
+            transaction_data (dict): The scored transaction.
+
+        Returns:
+            list[ClientConnection]: The matching clients.
+        """
+        candidates = []
+        candidates.extend(self.by_user.get(transaction_data.get("user_id"), ()))
+        candidates.extend(self.by_location.get(transaction_data.get("location"), ()))
+        candidates.extend(self.unkeyed_all)
+        if transaction_data.get("is_fraud"):
+            candidates.extend(self.unkeyed_fraud_only)
+        # Clients indexed by one key may still filter on the other fields
+        return [connection for connection in candidates if connection.subscription.matches(transaction_data)]
+
+
+# Index of the WebSocket clients connected to this process
+subscription_index = SubscriptionIndex()
+
+
+def register_client(websocket: WebSocket, subscription=None, coalescing=None):
+    """
+    Register an accepted WebSocket so it receives the transactions matching its subscription.
+
     Args:
-        websocket (WebSocket): The WebSocket object representing the client's connection.
-    
-    Workflow:
-    1. Accept the WebSocket connection.
-    2. Add the client to the `connected_clients` list.
-    3. Keep the connection alive by listening for any message from the client.
-    4. Handle disconnection gracefully by removing the client from the `connected_clients` list.
-    """
-    await websocket.accept()  # Accept the WebSocket connection
-    connected_clients.append(websocket)  # Add the connected client to the list
-    logger.info(f'Client connected. Total clients: {len(connected_clients)}')  # Log the number of clients connected
-    
-    try:
-        # Keep the connection alive by receiving text (this could be a heartbeat or any other data)
-        while True:
-            await websocket.receive_text()
-    except WebSocketDisconnect:
-        # Handle WebSocket disconnection and remove the client from the list
-        connected_clients.remove(websocket)
-        logger.error(f'Client disconnected. Total clients: {len(connected_clients)}')
-        await websocket.close()  # Close the WebSocket connection
+        websocket (WebSocket): The accepted WebSocket connection.
+        subscription (Subscription, optional): Initial subscription; every transaction if omitted.
+        coalescing (CoalescingPolicy, optional): Batch events into array frames; one frame per event if omitted.
+
+    Returns:
+        ClientConnection: The registered connection.
+    """
+    connection = ClientConnection(websocket, subscription, coalescing)
+    connection.start()
+    subscription_index.add(connection)
+    logger.info('Client connected. Total clients: %d', len(subscription_index))
+    return connection
+
+
+def unregister_client(connection: ClientConnection):
+    """
+    Remove a client from the subscription index.
+
+    Args:
+        connection (ClientConnection): The connection to remove.
+    """
+    connection.stop()
+    subscription_index.remove(connection)
+    logger.info('Client disconnected. Total clients: %d', len(subscription_index))
+
+
+async def receive_client_messages(connection: ClientConnection):
+    """
+    Listen for messages from a client until it disconnects, applying subscription updates.
+
+    Any JSON object containing `user_ids`, `locations` or `fraud_only` replaces the client's subscription and
+    is acknowledged with `{"type": "subscribed", "filters": {...}}`. Other messages (e.g. heartbeats) are ignored.
+
+    Args:
+        connection (ClientConnection): The client connection.
+
+    Raises:
+        WebSocketDisconnect: When the client disconnects.
+    """
+    while True:
+        text = await connection.websocket.receive_text()
+        try:
+            message = json.loads(text)
+        except json.JSONDecodeError:
+            continue  # Plain-text heartbeats keep the connection alive
+        if not isinstance(message, dict) or not {"user_ids", "locations", "fraud_only"} & message.keys():
+            continue
+
+        try:
+            subscription = Subscription.from_message(message)
+        except ValueError as e:
+            await connection.websocket.send_json({"type": "error", "detail": str(e)})
+            continue
+        subscription_index.update(connection, subscription)
+        await connection.websocket.send_json({"type": "subscribed", "filters": subscription.to_dict()})
 
 
 async def notify_clients(transaction_data: dict):
     """
-    Notify all connected WebSocket clients with the given transaction data.
-    
-    This function loops through the list of connected WebSocket clients and sends the provided transaction 
-    data in JSON format. If any client cannot be reached, it is removed from the list.
-    
+    Notify the connected WebSocket clients whose subscription matches the given transaction data.
+
+    The transaction is serialised to JSON once and the same text is sent to every matching client.
+    If any client cannot be reached, it is removed from the index.
+
     Args:
         transaction_data (dict): The transaction data to be sent to the clients in JSON format.
-    
+
     Workflow:
-    1. Loop through all connected clients.
-    2. Attempt to send the transaction data to each client.
-    3. If a client cannot be notified (e.g., due to a disconnection), remove the client from the list.
+    1. Look up the matching clients in the subscription index.
+    2. Attempt to send the transaction data to each of them.
+    3. If a client cannot be notified (e.g., due to a disconnection), remove the client from the index.
+    4. Observe the delivery and end-to-end latency of the transaction's trace, which is not sent to clients.
     """
-    logger.info(f'Notifying {len(connected_clients)} clients')  # Log the number of clients to notify
-    
-    for client in connected_clients:
+    if is_data_version_event(transaction_data):
+        return  # A cache invalidation notice, not a transaction
+
+    trace = transaction_data.get(TRACE_KEY)
+    if trace is not None:
+        # The trace is for the metrics of this process, not for the clients
+        transaction_data = {key: value for key, value in transaction_data.items() if key != TRACE_KEY}
+
+    recipients = subscription_index.match(transaction_data)
+    logger.debug('Notifying %d of %d clients', len(recipients), len(subscription_index))  # Log the number of clients to notify
+    if not recipients:
+        return
+
+    message = json.dumps(transaction_data, separators=(",", ":"))
+    for connection in recipients:
         try:
-            logger.info(f'Sending data to client: {transaction_data}')  # Log the data being sent
-            await client.send_json(transaction_data)  # Send the transaction data in JSON format
+            logger.debug('Sending data to client: %s', message)  # Log the data being sent
+            await connection.send(message)  # Send the transaction data in JSON format
         except Exception as e:
-            # Log the error and remove the client from the list if an exception occurs
-            logger.error(f"Error notifying client: {e}")
-            connected_clients.remove(client)  # Remove the client from the list
+            # Log the error and remove the client from the index if an exception occurs
+            logger.error("Error notifying client: %s", e)
+            unregister_client(connection)
+
+    if trace is not None:
+        record_delivered(trace)
@@ -0,0 +1,241 @@
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import timeit
+import warnings
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.consumers import kafka_consumer
+from app.services import db_service
+from app.services.fraud_detection_service import get_fraud_model
+from app.utils import preprocessing
+from app.utils.database import Base
+from app.utils.websocket_manager import ClientConnection, notify_clients, subscription_index
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+BASELINE_PATH = os.path.join(BACKEND_DIR, "benchmarks", "baseline.json")
+
+SIZES = (1, 100, 10000)
+DEFAULT_TOLERANCE = 1.0  # Fail when a case takes more than twice its baseline; shared hosts are noisy
+LOCATIONS = ["San Francisco", "Los Angeles", "Chicago", "Houston", "New York"]
+NOW = datetime(2024, 9, 22, 12, 0, 0)
+
+# In-memory SQLite database shared by the preprocessing and persistence helpers, instead of PostgreSQL
+engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+Base.metadata.create_all(bind=engine)
+BenchSession = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+preprocessing.SessionLocal = BenchSession
+db_service.SessionLocal = BenchSession
+
+# Per-transaction log lines and the scaler's feature-name warning would dominate the output, not the timings
+logging.disable(logging.INFO)
+warnings.filterwarnings("ignore", message="X does not have valid feature names")
+
+keys = itertools.count()
+
+
+def make_transactions(n, seed=42):
+    """
+    Deterministic synthetic transactions spread over 1000 users and the last day.
+    """
+    rng = random.Random(seed)
+    return [
+        {
+            "user_id": f"user_{rng.randrange(1000)}",
+            "amount": round(rng.uniform(1, 5000), 2),
+            "location": rng.choice(LOCATIONS),
+            "time": (NOW - timedelta(seconds=rng.randrange(86400))).isoformat(),
+        }
+        for _ in range(n)
+    ]
+
+
+def seed_history(rows=10000):
+    """
+    Fill the database with a day of history so the frequency lookups of the preprocessing have data to count.
+    """
+    db = BenchSession()
+    try:
+        db.add_all(db_service.build_transaction(data, False) for data in make_transactions(rows, seed=7))
+        db.commit()
+    finally:
+        db.close()
+
+
+class FakeWebSocket:
+    """
+    WebSocket stand-in that accepts every frame immediately, so only the fan-out itself is measured.
+    """
+
+    async def send_text(self, message):
+        pass
+
+
+# Each case prepares its input for `n` rows/clients outside the timing and returns the callable that is timed
+
+def bench_preprocess_transaction(n):
+    transactions = make_transactions(n)
+    if n == 1:
+        return lambda: preprocessing.preprocess_transaction(transactions[0])
+    return lambda: preprocessing.preprocess_transactions(transactions)
+
+
+def bench_fraud_model_predict(n):
+    model, _ = get_fraud_model()
+    features = np.random.default_rng(42).standard_normal((n, model.n_features_in_))
+    return lambda: model.predict(features)
+
+
+def bench_safe_json_deserializer(n):
+    messages = [json.dumps(data).encode("utf-8") for data in make_transactions(n)]
+    deserialize = kafka_consumer.safe_json_deserializer
+    return lambda: [deserialize(m) for m in messages]
+
+
+def bench_save_transaction_to_db(n):
+    transactions = make_transactions(n)
+
+    def run():
+        for data in transactions:
+            # A fresh key per call, so every save is a real insert rather than a rejected duplicate
+            db_service.save_transaction_to_db({**data, "idempotency_key": f"bench-{next(keys)}"}, False)
+    return run
+
+
+def bench_notify_clients(n):
+    loop = asyncio.new_event_loop()
+    for connection in list(subscription_index.clients):
+        subscription_index.remove(connection)
+    for _ in range(n):
+        subscription_index.add(ClientConnection(FakeWebSocket()))
+    event = {**make_transactions(1)[0], "id": 1, "is_fraud": False}
+    return lambda: loop.run_until_complete(notify_clients(event))
+
+
+CASES = {
+    "preprocess_transaction": bench_preprocess_transaction,
+    "fraud_model.predict": bench_fraud_model_predict,
+    "safe_json_deserializer": bench_safe_json_deserializer,
+    "save_transaction_to_db": bench_save_transaction_to_db,
+    "notify_clients": bench_notify_clients,
+}
+
+
+def measure(setup, n, repeat=7):
+    """
+    Time one case like `timeit`: calibrate the loop count to at least 0.2s, then keep the best of `repeat` runs.
+
+    Returns:
+        float: Seconds per call of the case, i.e. per batch of `n` rows/clients.
+    """
+    timer = timeit.Timer(setup(n))
+    number, elapsed = timer.autorange()
+    if elapsed > 2:
+        repeat = 2  # The 10k cases take seconds per call already
+    return min([elapsed] + timer.repeat(repeat=repeat - 1, number=number)) / number
+
+
+def run_suite(selected, sizes):
+    """
+    Run the selected cases at every size.
+
+    Returns:
+        dict: Case name ("function[n]") to its timing.
+    """
+    results = {}
+    for name in selected:
+        for n in sizes:
+            seconds = measure(CASES[name], n)
+            results[f"{name}[{n}]"] = {"seconds": seconds, "per_item_us": seconds / n * 1e6}
+            print(f"{name + f'[{n}]':<36} {seconds * 1e3:>12.3f} ms {seconds / n * 1e6:>12.2f} us/item", flush=True)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compare timings against the baseline.
+
+    Returns:
+        list[str]: The cases that regressed past the tolerance.
+    """
+    regressions = []
+    print(f"\n{'case':<36} {'baseline ms':>12} {'current ms':>12} {'change':>8}")
+    for case, result in results.items():
+        expected = baseline["cases"].get(case)
+        if expected is None:
+            print(f"{case:<36} {'-':>12} {result['seconds'] * 1e3:>12.3f} {'new':>8}")
+            continue
+        limit = expected.get("tolerance", tolerance)
+        change = result["seconds"] / expected["seconds"] - 1
+        failed = change > limit
+        if failed:
+            regressions.append(case)
+        print(f"{case:<36} {expected['seconds'] * 1e3:>12.3f} {result['seconds'] * 1e3:>12.3f} {change:>+8.0%}"
+              + ("  REGRESSION" if failed else ""))
+    return regressions
+
+
+if __name__ == "__main__":
+    """
+    Microbenchmarks of the hot-path functions, run offline against SQLite, fakes and the real model artifacts:
+
+        python -m benchmarks.microbench                    # compare with benchmarks/baseline.json
+        python -m benchmarks.microbench --update-baseline  # record new baselines
+
+    Exits with status 1 when a case is slower than its baseline by more than the tolerance.
+    """
+    parser = argparse.ArgumentParser(description="Run the hot-path microbenchmarks")
+    parser.add_argument("--only", action="append", choices=sorted(CASES), help="Run only this function (repeatable)")
+    parser.add_argument("--sizes", type=lambda value: [int(n) for n in value.split(",")], default=list(SIZES),
+                        help="Comma-separated rows/clients per call (default: 1,100,10000)")
+    parser.add_argument("--tolerance", type=float, help="Allowed slowdown as a fraction (default: the baseline's)")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline JSON file")
+    parser.add_argument("--update-baseline", action="store_true", help="Write the results as the new baseline")
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    seed_history()
+    results = run_suite(args.only or list(CASES), args.sizes)
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(),
+                    "processor": platform.machine(), "cpus": os.cpu_count()},
+        "cases": results,
+    }
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+
+    if args.update_baseline:
+        baseline = {"tolerance": args.tolerance or DEFAULT_TOLERANCE, "cases": {}}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as baseline_file:
+                baseline = json.load(baseline_file)
+        # Per-case tolerances already in the baseline are kept
+        for case, result in results.items():
+            baseline["cases"][case] = {**baseline["cases"].get(case, {}), **result}
+        baseline.update(timestamp=report["timestamp"], machine=report["machine"])
+        if args.tolerance is not None:
+            baseline["tolerance"] = args.tolerance
+        with open(args.baseline, "w") as baseline_file:
+            json.dump(baseline, baseline_file, indent=2)
+        print(f"\nBaseline written to {args.baseline}")
+        sys.exit(0)
+
+    with open(args.baseline) as baseline_file:
+        baseline = json.load(baseline_file)
+    tolerance = args.tolerance if args.tolerance is not None else baseline.get("tolerance", DEFAULT_TOLERANCE)
+    regressions = compare(results, baseline, tolerance)
+    if regressions:
+        print(f"\n{len(regressions)} case(s) regressed by more than {tolerance:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+    print("\nNo regressions")
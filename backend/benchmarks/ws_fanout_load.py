@@ -0,0 +1,265 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import urllib.request
+from datetime import datetime, timezone
+import websockets
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+class ClientStats:
+    """
+    Delivery statistics of one simulated WebSocket client.
+    """
+
+    def __init__(self, slow):
+        self.slow = slow
+        self.latencies = []
+        self.received = 0
+        self.connected = False
+        self.evicted = False
+        self.error = None
+
+
+async def run_client(url, stats, slow_delay, stop, handshake_limit):
+    """
+    Connect one client and record the latency of every transaction event until `stop` is set.
+
+    Slow readers sleep `slow_delay` seconds after every frame, so their socket buffers fill up and the
+    server has to cope with a client that cannot keep up.
+    """
+    try:
+        async with handshake_limit:
+            connection = await websockets.connect(url, max_size=None, open_timeout=30,
+                                                  compression="deflate", ping_interval=None)
+    except Exception as e:
+        stats.error = f"connect: {e}"
+        return
+
+    stats.connected = True
+    try:
+        while not stop.is_set():
+            try:
+                frame = await asyncio.wait_for(connection.recv(), timeout=0.5)
+            except asyncio.TimeoutError:
+                continue
+            received_at = time.time()
+            payload = json.loads(frame)
+            # Coalesced clients receive arrays of events
+            for event in payload if isinstance(payload, list) else [payload]:
+                if "sent_at" in event:
+                    stats.latencies.append(received_at - event["sent_at"])
+                    stats.received += 1
+            if stats.slow:
+                await asyncio.sleep(slow_delay)
+    except websockets.ConnectionClosed:
+        # The server closed the connection while the test was running
+        stats.evicted = not stop.is_set()
+    finally:
+        await connection.close()
+
+
+class ProcessSampler:
+    """
+    Samples CPU time and resident memory of a process from /proc (Linux only).
+    """
+
+    def __init__(self, pid, interval=0.5):
+        self.pid = pid
+        self.interval = interval
+        self.ticks = os.sysconf("SC_CLK_TCK")
+        self.samples = []  # (wall time, cpu seconds, rss bytes)
+
+    def sample(self):
+        with open(f"/proc/{self.pid}/stat") as stat_file:
+            fields = stat_file.read().rsplit(")", 1)[1].split()
+        cpu_seconds = (int(fields[11]) + int(fields[12])) / self.ticks  # utime + stime
+        with open(f"/proc/{self.pid}/status") as status_file:
+            rss_kb = next(int(line.split()[1]) for line in status_file if line.startswith("VmRSS:"))
+        self.samples.append((time.monotonic(), cpu_seconds, rss_kb * 1024))
+
+    async def run(self, stop):
+        while not stop.is_set():
+            try:
+                self.sample()
+            except (FileNotFoundError, ProcessLookupError, StopIteration):
+                return
+            await asyncio.sleep(self.interval)
+
+    def summary(self):
+        if len(self.samples) < 2:
+            return {}
+        usage = [
+            (cpu_b - cpu_a) / (t_b - t_a) * 100
+            for (t_a, cpu_a, _), (t_b, cpu_b, _) in zip(self.samples, self.samples[1:]) if t_b > t_a
+        ]
+        rss = [sample[2] for sample in self.samples]
+        return {
+            "cpu_percent_avg": round(sum(usage) / len(usage), 1),
+            "cpu_percent_max": round(max(usage), 1),
+            "rss_mb_start": round(rss[0] / 2**20, 1),
+            "rss_mb_peak": round(max(rss) / 2**20, 1),
+        }
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def http(method, url):
+    request = urllib.request.Request(url, method=method)
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.loads(response.read())
+
+
+def wait_for_server(base_url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            return http("GET", f"{base_url}/bench/status")
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server at {base_url} did not start within {timeout}s")
+
+
+async def run_load_test(args):
+    """
+    Connect the clients, inject events at the requested rate and collect the results.
+
+    Returns:
+        dict: The JSON-serialisable report.
+    """
+    base_url = f"http://{args.host}:{args.port}"
+    query = [f"coalesce_ms={args.coalesce_ms}"] if args.coalesce_ms else []
+    if args.coalesce_max:
+        query.append(f"coalesce_max={args.coalesce_max}")
+    ws_url = f"ws://{args.host}:{args.port}/api/ws" + ("?" + "&".join(query) if query else "")
+
+    server = None
+    if not args.no_server:
+        server = subprocess.Popen([sys.executable, "-m", "benchmarks.ws_fanout_server", "--host", args.host,
+                                   "--port", str(args.port)], cwd=BACKEND_DIR)
+    try:
+        wait_for_server(base_url)
+        sampler = ProcessSampler(server.pid) if server else None
+
+        random.seed(args.seed)
+        stats = [ClientStats(slow=random.random() < args.slow_fraction) for _ in range(args.clients)]
+        stop = asyncio.Event()
+        handshake_limit = asyncio.Semaphore(args.connect_concurrency)
+        sampler_task = asyncio.create_task(sampler.run(stop)) if sampler else None
+
+        connect_started = time.monotonic()
+        client_tasks = [asyncio.create_task(run_client(ws_url, s, args.slow_delay, stop, handshake_limit)) for s in stats]
+        # Wait until the server sees every client that managed to connect
+        while time.monotonic() - connect_started < args.connect_timeout:
+            status = await asyncio.to_thread(http, "GET", f"{base_url}/bench/status")
+            failed = sum(1 for s in stats if s.error)
+            if status["clients"] + failed >= args.clients:
+                break
+            await asyncio.sleep(0.5)
+        connect_seconds = time.monotonic() - connect_started
+
+        await asyncio.to_thread(http, "POST", f"{base_url}/bench/inject?rate={args.rate}&duration={args.duration}")
+        await asyncio.sleep(0.5)
+        while (await asyncio.to_thread(http, "GET", f"{base_url}/bench/status"))["running"]:
+            await asyncio.sleep(0.5)
+        await asyncio.sleep(args.drain)
+        final_status = await asyncio.to_thread(http, "GET", f"{base_url}/bench/status")
+
+        stop.set()
+        await asyncio.gather(*client_tasks, return_exceptions=True)
+        if sampler_task:
+            await sampler_task
+    finally:
+        if server:
+            server.terminate()
+            server.wait(timeout=30)
+
+    connected = [s for s in stats if s.connected]
+    latencies = sorted(latency for s in connected for latency in s.latencies)
+    injected = final_status["injected"]
+    expected = injected * len(connected)
+    received = sum(s.received for s in connected)
+
+    def latency_summary(values):
+        values = sorted(values)
+        return {f"p{int(q * 100)}_ms": round(percentile(values, q) * 1000, 2) if values else None
+                for q in (0.5, 0.9, 0.99)} | {"max_ms": round(values[-1] * 1000, 2) if values else None}
+
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": {
+            "clients": args.clients,
+            "slow_fraction": args.slow_fraction,
+            "slow_delay_seconds": args.slow_delay,
+            "rate_per_second": args.rate,
+            "duration_seconds": args.duration,
+            "coalesce_ms": args.coalesce_ms,
+            "coalesce_max": args.coalesce_max,
+        },
+        "connections": {
+            "connected": len(connected),
+            "failed": sum(1 for s in stats if s.error),
+            "evicted": sum(1 for s in connected if s.evicted),
+            "connect_seconds": round(connect_seconds, 2),
+        },
+        "events": {
+            "injected": injected,
+            "injector_fell_behind": final_status["behind"],
+            "expected_deliveries": expected,
+            "delivered": received,
+            "dropped": expected - received,
+        },
+        "latency": latency_summary(latencies),
+        "latency_fast_clients": latency_summary([l for s in connected if not s.slow for l in s.latencies]),
+        "latency_slow_clients": latency_summary([l for s in connected if s.slow for l in s.latencies]),
+        "server": sampler.summary() if sampler else {},
+    }
+
+
+if __name__ == "__main__":
+    """
+    WebSocket fan-out load test. Starts the API with a synthetic event injector, connects the clients and
+    writes a JSON report, e.g.:
+
+        python -m benchmarks.ws_fanout_load --clients 2000 --slow-fraction 0.05 --rate 500 --duration 30
+
+    Thousands of clients need a matching open-file limit (`ulimit -n 65536`).
+    """
+    parser = argparse.ArgumentParser(description="Load test the /api/ws fan-out")
+    parser.add_argument("--clients", type=int, default=1000, help="Concurrent WebSocket clients")
+    parser.add_argument("--slow-fraction", type=float, default=0.0, help="Share of clients that read slowly")
+    parser.add_argument("--slow-delay", type=float, default=0.05, help="Seconds a slow client sleeps after each frame")
+    parser.add_argument("--rate", type=float, default=100, help="Injected events per second")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds of event injection")
+    parser.add_argument("--coalesce-ms", type=int, help="Ask the server for coalesced frames every N ms")
+    parser.add_argument("--coalesce-max", type=int, help="Ask the server for coalesced frames of up to N events")
+    parser.add_argument("--drain", type=float, default=2.0, help="Seconds to keep reading after injection ends")
+    parser.add_argument("--connect-concurrency", type=int, default=200, help="Concurrent handshakes")
+    parser.add_argument("--connect-timeout", type=float, default=120, help="Seconds to wait for all clients to connect")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--no-server", action="store_true", help="Target an already running benchmarks.ws_fanout_server")
+    parser.add_argument("--seed", type=int, default=1, help="Seed choosing the slow clients")
+    parser.add_argument("--output", help="Report path (default: benchmarks/results/ws_fanout_<time>.json)")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_load_test(args))
+
+    output = args.output or os.path.join(
+        BACKEND_DIR, "benchmarks", "results", f"ws_fanout_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as report_file:
+        json.dump(report, report_file, indent=2)
+    print(json.dumps(report, indent=2))
+    print(f"Report written to {output}")
@@ -0,0 +1,110 @@
+import argparse
+import asyncio
+import itertools
+import os
+import time
+
+# The load test only exercises the WebSocket fan-out: no consumer, no Kafka, no metrics port collisions
+os.environ.setdefault("RUN_CONSUMER_IN_API", "false")
+os.environ.setdefault("EVENT_BUS_BACKEND", "local")
+
+import uvicorn
+from fastapi import Query
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.main import app
+from app.routes.transaction import get_db
+from app.utils.config import WS_PER_MESSAGE_DEFLATE
+from app.utils.database import Base
+from app.utils.event_bus import get_event_bus
+from app.utils.websocket_manager import subscription_index
+from app.utils.logging_config import setup_logging
+import logging
+
+# Initialize logging for this module
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Empty in-memory database so the initial snapshot sent to each client does not need PostgreSQL
+engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+Base.metadata.create_all(bind=engine)
+BenchSession = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def get_bench_db():
+    db = BenchSession()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+app.dependency_overrides[get_db] = get_bench_db
+
+# State of the current injection run, reported back to the load generator
+injection = {"running": False, "injected": 0, "behind": 0}
+
+
+async def inject_events(rate, duration, fraud_ratio):
+    """
+    Publish synthetic scored transactions on the event bus at a fixed rate.
+
+    Each event carries `sent_at` (epoch seconds) so clients on the same host can measure delivery latency.
+    """
+    bus = get_event_bus()
+    interval = 1.0 / rate
+    ids = itertools.count(1)
+    start = time.perf_counter()
+    next_send = start
+    injection.update(running=True, injected=0, behind=0)
+    try:
+        while time.perf_counter() - start < duration:
+            event_id = next(ids)
+            await bus.publish({
+                "id": event_id,
+                "amount": 100.0,
+                "location": "Chicago",
+                "user_id": f"user_{event_id % 1000}",
+                "time": "2024-09-22T12:34:56",
+                "is_fraud": (event_id % 100) < fraud_ratio * 100,
+                "sent_at": time.time(),
+            })
+            injection["injected"] += 1
+            next_send += interval
+            delay = next_send - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                # Fan-out is slower than the requested rate
+                injection["behind"] += 1
+                await asyncio.sleep(0)
+    finally:
+        injection["running"] = False
+
+
+@app.post("/bench/inject")
+async def start_injection(rate: float = Query(..., gt=0), duration: float = Query(..., gt=0),
+                          fraud_ratio: float = Query(0.05, ge=0, le=1)):
+    asyncio.create_task(inject_events(rate, duration, fraud_ratio))
+    return {"status": "started"}
+
+
+@app.get("/bench/status")
+async def injection_status():
+    return {**injection, "clients": len(subscription_index)}
+
+
+if __name__ == "__main__":
+    """
+    Fan-out target started by the load generator (benchmarks/ws_fanout_load.py):
+
+        python -m benchmarks.ws_fanout_server --port 8765
+    """
+    parser = argparse.ArgumentParser(description="Serve the API with a synthetic event injector for load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning", ws="websockets",
+                ws_per_message_deflate=WS_PER_MESSAGE_DEFLATE, backlog=4096)
@@ -0,0 +1,28 @@
+"""Add transaction idempotency key
+
+Revision ID: 7c2f4a91d3e8
+Revises: 333b55c62650
+Create Date: 2026-10-19 09:12:41.503218
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c2f4a91d3e8'
+down_revision: Union[str, None] = '333b55c62650'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('transactions', sa.Column('idempotency_key', sa.String(length=128), nullable=True))
+    op.create_index(op.f('ix_transactions_idempotency_key'), 'transactions', ['idempotency_key'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_transactions_idempotency_key'), table_name='transactions')
+    op.drop_column('transactions', 'idempotency_key')
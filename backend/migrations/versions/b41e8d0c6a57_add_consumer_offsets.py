@@ -0,0 +1,33 @@
+"""Add consumer offsets
+
+Revision ID: b41e8d0c6a57
+Revises: 7c2f4a91d3e8
+Create Date: 2026-10-19 10:03:17.284611
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b41e8d0c6a57'
+down_revision: Union[str, None] = '7c2f4a91d3e8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('consumer_offsets',
+    sa.Column('group_id', sa.String(), nullable=False),
+    sa.Column('topic', sa.String(), nullable=False),
+    sa.Column('partition', sa.Integer(), nullable=False),
+    sa.Column('offset', sa.BigInteger(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('group_id', 'topic', 'partition')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('consumer_offsets')
@@ -0,0 +1,33 @@
+"""Add transaction search indexes
+
+Revision ID: e5a9c1f07b32
+Revises: b41e8d0c6a57
+Create Date: 2026-10-19 11:42:08.617394
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a9c1f07b32'
+down_revision: Union[str, None] = 'b41e8d0c6a57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Build without locking out the consumer's inserts; CONCURRENTLY cannot run inside a transaction
+    with op.get_context().autocommit_block():
+        op.create_index('ix_transactions_fraud_time', 'transactions', ['time', 'id'], unique=False,
+                        postgresql_where=sa.text('is_fraud = true'), postgresql_concurrently=True)
+        op.create_index('ix_transactions_location_time', 'transactions', ['location', 'time', 'id'], unique=False,
+                        postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_transactions_location_time', table_name='transactions', postgresql_concurrently=True)
+        op.drop_index('ix_transactions_fraud_time', table_name='transactions', postgresql_concurrently=True)
@@ -2,12 +2,13 @@
 import pytest
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 from app.utils.database import Base
 
 @pytest.fixture(scope='function')
 def test_db():
-    # Set up an in-memory SQLite database
-    engine = create_engine('sqlite:///:memory:')
+    # Set up an in-memory SQLite database, shared across threads so routes run by the TestClient see the same tables
+    engine = create_engine('sqlite:///:memory:', connect_args={"check_same_thread": False}, poolclass=StaticPool)
     TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
     
     # Create all the tables in the database
@@ -0,0 +1,53 @@
+# test/test_app_startup.py
+
+import json
+import os
+import subprocess
+import sys
+from unittest.mock import patch, AsyncMock
+from fastapi.testclient import TestClient
+from app.main import app
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+def test_importing_app_has_no_heavy_side_effects():
+    # Import the app in a fresh interpreter so modules loaded by other tests do not interfere
+    code = (
+        "import json, sys, app.main, app.utils.metrics as metrics; "
+        "print(json.dumps({'sklearn': 'sklearn' in sys.modules, "
+        "'consumer': 'app.consumers.kafka_consumer' in sys.modules, "
+        "'metrics_port': metrics._metrics_server_port}))"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, capture_output=True, text=True, check=True)
+
+    loaded = json.loads(result.stdout.strip().splitlines()[-1])
+    assert loaded == {'sklearn': False, 'consumer': False, 'metrics_port': None}
+
+def test_lifespan_skips_consumer_when_disabled():
+    with patch('app.main.RUN_CONSUMER_IN_API', False), \
+            patch('app.main.start_metrics_server'), \
+            patch('app.consumers.kafka_consumer.bootstrap_consumer') as mock_bootstrap, \
+            patch('app.consumers.kafka_consumer.consume_with_retry_lanes', new_callable=AsyncMock) as mock_consume:
+        with TestClient(app) as client:
+            assert client.get("/api/health").status_code == 200
+
+    mock_bootstrap.assert_not_called()
+    mock_consume.assert_not_called()
+
+def test_lifespan_bootstraps_consumer_when_enabled():
+    with patch('app.main.RUN_CONSUMER_IN_API', True), \
+            patch('app.main.start_metrics_server'), \
+            patch('app.consumers.kafka_consumer.bootstrap_consumer') as mock_bootstrap, \
+            patch('app.consumers.kafka_consumer.consume_with_retry_lanes', new_callable=AsyncMock) as mock_consume:
+        with TestClient(app):
+            pass
+
+    mock_bootstrap.assert_called_once()
+    mock_consume.assert_called_once()
+
+def test_metrics_endpoint_serves_prometheus_text():
+    response = TestClient(app).get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "db_query_duration_seconds" in response.text
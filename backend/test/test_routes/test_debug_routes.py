@@ -0,0 +1,42 @@
+# test/test_debug_routes.py
+
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from app.main import app
+
+client = TestClient(app)
+
+ADMIN_HEADERS = {"X-Admin-Token": "secret"}
+
+def test_debug_routes_hidden_without_admin_token():
+    with patch('app.utils.config.ADMIN_TOKEN', None):
+        response = client.get("/api/debug/profile?seconds=0.1", headers=ADMIN_HEADERS)
+    assert response.status_code == 404
+
+def test_debug_routes_reject_wrong_token():
+    with patch('app.utils.config.ADMIN_TOKEN', 'secret'):
+        response = client.get("/api/debug/memory", headers={"X-Admin-Token": "wrong"})
+    assert response.status_code == 403
+
+def test_profile_returns_collapsed_stacks():
+    with patch('app.utils.config.ADMIN_TOKEN', 'secret'):
+        response = client.get("/api/debug/profile?seconds=0.2", headers=ADMIN_HEADERS)
+
+    assert response.status_code == 200
+    lines = response.text.splitlines()
+    assert lines
+    # Every line is "frame;frame;... count"
+    stack, count = lines[0].rsplit(" ", 1)
+    assert ";" in stack
+    assert int(count) > 0
+
+def test_memory_reports_growth_between_snapshots():
+    with patch('app.utils.config.ADMIN_TOKEN', 'secret'):
+        first = client.get("/api/debug/memory", headers=ADMIN_HEADERS).json()
+        second = client.get("/api/debug/memory?top=5", headers=ADMIN_HEADERS).json()
+        stopped = client.delete("/api/debug/memory", headers=ADMIN_HEADERS).json()
+
+    assert first["status"] == "tracing started"
+    assert second["status"] == "tracing"
+    assert len(second["top_allocations"]) <= 5
+    assert stopped["status"] == "tracing stopped"
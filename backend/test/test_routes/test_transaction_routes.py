@@ -1,6 +1,10 @@
 import pytest
+from unittest.mock import patch
 from fastapi.testclient import TestClient
 from app.main import app
+from app.routes import transaction as transaction_route
+from app.utils.config import KAFKA_LOW_PRIORITY_TOPIC
+from app.utils.rate_limiter import UserRateLimiter
 
 client = TestClient(app)
 
@@ -14,7 +18,8 @@ def test_post_transaction():
     }
 
     # Send POST request to the transaction route
-    response = client.post("/api/transaction", json=transaction_data)
+    with patch('app.routes.transaction.send_transaction_to_kafka', return_value=True):
+        response = client.post("/api/transaction", json=transaction_data)
 
     # Check if the response status code is 200 OK
     assert response.status_code == 200
@@ -23,3 +28,167 @@ def test_post_transaction():
     response_data = response.json()
     assert response_data["status"] == "transaction sent to Kafka"
     assert response_data["transaction"]["amount"] == transaction_data["amount"]
+
+def test_post_transaction_returns_503_when_publish_fails():
+    transaction_data = {
+        "amount": 200,
+        "location": "Los Angeles",
+        "user_id": "user456",
+        "time": "2024-09-22T15:30:00"
+    }
+
+    # The producer reports a failed publish (e.g. the broker is unreachable)
+    with patch('app.routes.transaction.send_transaction_to_kafka', return_value=False):
+        response = client.post("/api/transaction", json=transaction_data)
+
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
+
+def test_get_transactions_is_cached_until_the_data_version_changes(test_db):
+    from datetime import datetime
+    from prometheus_client import REGISTRY
+    from app.routes.transaction import get_db, transactions_cache
+    from app.utils.models import Transaction
+    from app.utils.response_cache import bump_data_version
+
+    def sample(result):
+        return REGISTRY.get_sample_value('response_cache_requests_total', {'endpoint': '/api/transactions', 'result': result}) or 0
+
+    test_db.add(Transaction(user_id="user_1", amount=10.0, location="Chicago", time=datetime(2024, 9, 22, 12), is_fraud=False))
+    test_db.commit()
+    app.dependency_overrides[get_db] = lambda: test_db
+    transactions_cache.clear()
+    hits, misses = sample('hit'), sample('miss')
+    try:
+        first = client.get("/api/transactions")
+        assert first.status_code == 200
+        assert first.json() == [{"id": 1, "user_id": "user_1", "amount": 10.0, "location": "Chicago",
+                                 "time": "2024-09-22T12:00:00", "is_fraud": False, "idempotency_key": None}]
+        etag = first.headers["ETag"]
+
+        # Nothing changed: the poll is answered from the cache without a body
+        with patch.object(test_db, 'query', side_effect=AssertionError("the cache should answer")):
+            revalidated = client.get("/api/transactions", headers={"If-None-Match": etag})
+        assert revalidated.status_code == 304 and revalidated.content == b""
+        assert (sample('hit') - hits, sample('miss') - misses) == (1, 1)
+
+        # The consumer persisted a batch: the history is queried again
+        test_db.add(Transaction(user_id="user_2", amount=20.0, location="Houston", time=datetime(2024, 9, 22, 13), is_fraud=True))
+        test_db.commit()
+        bump_data_version()
+        changed = client.get("/api/transactions", headers={"If-None-Match": etag})
+        assert changed.status_code == 200 and len(changed.json()) == 2
+        assert changed.headers["ETag"] != etag
+    finally:
+        app.dependency_overrides.clear()
+
+def test_score_transaction_returns_decision_and_probability():
+    from app.routes.transaction import score_batcher
+
+    transaction_data = {"amount": 120, "location": "Chicago", "user_id": "user789", "time": "2024-09-22T15:30:00"}
+    scored = []
+
+    def handler(transactions):
+        scored.extend(transactions)
+        return [{"is_fraud": False, "probability": 0.12, "decided_by": "model"} for _ in transactions]
+
+    with patch.object(score_batcher, 'handler', handler):
+        response = client.post("/api/score", json=transaction_data)
+
+    assert response.status_code == 200
+    assert response.json() == {"is_fraud": False, "probability": 0.12, "decided_by": "model"}
+    assert scored == [{**transaction_data, "amount": 120.0, "idempotency_key": None}]
+
+def test_recent_transactions_are_served_from_the_buffer(test_db):
+    from datetime import datetime
+    from app.routes.transaction import get_db, transactions_cache
+    from app.utils.models import Transaction
+    from app.utils.transaction_buffer import transaction_buffer
+
+    for i in range(1, 6):
+        test_db.add(Transaction(user_id=f"user_{i}", amount=float(i), location="Chicago",
+                                time=datetime(2024, 9, 22, 12, i), is_fraud=i % 2 == 0))
+    test_db.commit()
+    app.dependency_overrides[get_db] = lambda: test_db
+    transactions_cache.clear()
+    transaction_buffer.clear()
+    try:
+        # The cold buffer is warmed from the database on the first recent read
+        latest = client.get("/api/transactions?limit=2")
+        assert [t["id"] for t in latest.json()] == [4, 5]
+        assert latest.json()[0] == {"id": 4, "user_id": "user_4", "amount": 4.0, "location": "Chicago",
+                                    "time": "2024-09-22T12:04:00", "is_fraud": True, "idempotency_key": None}
+
+        with patch.object(test_db, 'query', side_effect=AssertionError("the buffer should answer")):
+            fraud = client.get("/api/transactions?fraud_only=true&since_id=1")
+        assert [t["id"] for t in fraud.json()] == [2, 4]
+
+        # Ranges older than the buffer are read from the database
+        transaction_buffer.floor = 3
+        assert [t["id"] for t in client.get("/api/transactions?since_id=1").json()] == [2, 3, 4, 5]
+        assert client.get("/api/transactions?limit=0").status_code == 422
+    finally:
+        app.dependency_overrides.clear()
+        transaction_buffer.clear()
+
+
+def test_user_over_rate_is_rejected_or_demoted():
+    transaction_data = {
+        "amount": 50,
+        "location": "Denver",
+        "user_id": "hot-user",
+        "time": "2024-09-22T15:30:00"
+    }
+
+    with patch.object(transaction_route, 'ingest_rate_limiter', UserRateLimiter("/api/transaction", rate=0.01, burst=1)), \
+            patch('app.routes.transaction.send_transaction_to_kafka', return_value=True) as mock_send:
+        assert client.post("/api/transaction", json=transaction_data).status_code == 200
+        response = client.post("/api/transaction", json=transaction_data)
+        assert response.status_code == 429
+        assert int(response.headers["Retry-After"]) >= 1
+
+        # In low-priority mode the transaction is accepted and published to the low-priority topic
+        with patch('app.routes.transaction.RATE_LIMIT_OVERFLOW', 'low_priority'):
+            response = client.post("/api/transaction", json=transaction_data)
+
+    assert response.status_code == 200
+    assert response.json()["status"] == "transaction queued at low priority"
+    assert mock_send.call_count == 2
+    assert mock_send.call_args.args[2] == KAFKA_LOW_PRIORITY_TOPIC
+
+
+def test_search_filters_and_pages_the_history(test_db):
+    from datetime import datetime
+    from app.routes.transaction import get_db
+    from app.utils.models import Transaction
+
+    for day in range(1, 6):
+        test_db.add(Transaction(user_id="user_1", amount=100.0 * day, location="Chicago",
+                                time=datetime(2024, 9, day, 12), is_fraud=day != 2))
+        test_db.add(Transaction(user_id="user_2", amount=50.0, location="Houston",
+                                time=datetime(2024, 9, day, 13), is_fraud=True))
+    test_db.commit()
+    app.dependency_overrides[get_db] = lambda: test_db
+    try:
+        pages, cursor = [], None
+        while True:
+            params = {"user_id": "user_1", "is_fraud": "true", "start": "2024-09-02T00:00:00Z", "limit": 2}
+            if cursor:
+                params["cursor"] = cursor
+            body = client.get("/api/transactions/search", params=params).json()
+            pages.append([t["time"] for t in body["transactions"]])
+            cursor = body["next_cursor"]
+            if cursor is None:
+                break
+
+        chicago = client.get("/api/transactions/search?location=Chicago&min_amount=250&end=2024-09-05T00:00:00").json()
+        unfiltered = client.get("/api/transactions/search?is_fraud=false")
+        bad_cursor = client.get("/api/transactions/search?user_id=user_1&cursor=not-a-cursor")
+    finally:
+        app.dependency_overrides.clear()
+
+    assert pages == [["2024-09-05T12:00:00", "2024-09-04T12:00:00"], ["2024-09-03T12:00:00"]]
+    assert [t["amount"] for t in chicago["transactions"]] == [400.0, 300.0]
+    # Searches that no index can answer are refused
+    assert unfiltered.status_code == 400
+    assert bad_cursor.status_code == 400
@@ -0,0 +1,50 @@
+# test/test_admission.py
+
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from app.main import app
+from app.routes.transaction import ingest_admission
+from app.utils.admission import AdmissionController
+
+client = TestClient(app)
+
+def test_rejects_when_limit_reached():
+    controller = AdmissionController("test", initial_limit=2, min_limit=1, max_limit=4)
+
+    assert controller.try_acquire()
+    assert controller.try_acquire()
+    # Third concurrent request exceeds the limit
+    assert not controller.try_acquire()
+    assert controller.in_flight == 2
+
+def test_limit_adapts_to_latency():
+    controller = AdmissionController("test", initial_limit=8, min_limit=2, max_limit=16, target_latency_ms=100)
+
+    # Slow publishes shrink the limit multiplicatively
+    controller.try_acquire()
+    controller.release(0.5)
+    assert controller.limit < 8
+
+    # Fast publishes grow it back additively
+    shrunk = controller.limit
+    for _ in range(20):
+        controller.try_acquire()
+        controller.release(0.01)
+    assert controller.limit > shrunk
+    assert controller.limit <= 16
+
+def test_post_transaction_returns_429_when_shedding():
+    transaction_data = {
+        "amount": 200,
+        "location": "Los Angeles",
+        "user_id": "user456",
+        "time": "2024-09-22T15:30:00"
+    }
+
+    with patch.object(ingest_admission, 'try_acquire', return_value=False), \
+            patch('app.routes.transaction.send_transaction_to_kafka') as mock_send:
+        response = client.post("/api/transaction", json=transaction_data)
+
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    mock_send.assert_not_called()
@@ -0,0 +1,80 @@
+# test/test_db_metrics.py
+
+import logging
+import pytest
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from app.utils.db_metrics import InstrumentedQueuePool, instrument_engine, query_name
+from app.utils.database import Base
+from app.utils.models import Transaction
+from datetime import datetime
+
+
+def sample(name, labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+@pytest.fixture
+def engine(tmp_path):
+    # A file database so every pooled connection sees the same tables
+    engine = create_engine(f"sqlite:///{tmp_path / 'metrics.db'}", poolclass=InstrumentedQueuePool,
+                           pool_size=2, max_overflow=1)
+    instrument_engine(engine, pool_name="test", slow_query_ms=10000)
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+def test_pool_gauges_and_checkout_wait(engine):
+    checkouts_before = sample('db_pool_checkout_wait_seconds_count', {'pool': 'test'})
+
+    first = engine.connect()
+    second = engine.connect()
+    assert sample('db_pool_checked_out', {'pool': 'test'}) == 2
+
+    third = engine.connect()  # Beyond pool_size: an overflow connection
+    assert sample('db_pool_checked_out', {'pool': 'test'}) == 3
+    assert sample('db_pool_overflow', {'pool': 'test'}) == 1
+
+    for connection in (first, second, third):
+        connection.close()
+    assert sample('db_pool_checked_out', {'pool': 'test'}) == 0
+    assert sample('db_pool_checkout_wait_seconds_count', {'pool': 'test'}) == checkouts_before + 3
+    assert sample('db_pool_connect_seconds_count', {'pool': 'test'}) >= 1
+
+
+def test_statements_are_timed_by_query_name(engine):
+    named_before = sample('db_query_duration_seconds_count', {'query': 'probe'})
+    inserts_before = sample('db_query_duration_seconds_count', {'query': 'insert_transactions'})
+
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1").execution_options(query_name="probe"))
+
+    db = sessionmaker(bind=engine)()
+    db.add(Transaction(user_id="user_1", amount=10.0, location="Chicago", time=datetime(2024, 9, 22)))
+    db.commit()
+    db.close()
+
+    assert sample('db_query_duration_seconds_count', {'query': 'probe'}) == named_before + 1
+    # Unnamed ORM writes fall back to the verb and the table
+    assert sample('db_query_duration_seconds_count', {'query': 'insert_transactions'}) == inserts_before + 1
+
+
+def test_slow_queries_are_logged_with_sql_and_parameters(tmp_path, caplog):
+    engine = create_engine(f"sqlite:///{tmp_path / 'slow.db'}", poolclass=InstrumentedQueuePool)
+    instrument_engine(engine, pool_name="slow", slow_query_ms=0)
+
+    with caplog.at_level(logging.WARNING, logger="app.utils.db_metrics"):
+        with engine.connect() as connection:
+            connection.execute(text("SELECT :value").execution_options(query_name="slow_probe"), {"value": 42})
+    engine.dispose()
+
+    message = next(record.getMessage() for record in caplog.records if "slow_probe" in record.getMessage())
+    assert "SELECT ?" in message
+    assert "42" in message
+
+
+def test_query_name_fallback():
+    assert query_name("BEGIN", None) == "other"
+    assert query_name("select 1", None) == "select"
@@ -1,8 +1,10 @@
 # test/test_db_service.py
 
 import pytest
+from datetime import datetime
 from unittest.mock import MagicMock
-from app.services.db_service import save_transaction_to_db
+from sqlalchemy import text
+from app.services.db_service import save_transaction_to_db, build_search_query, search_transactions
 from app.utils.models import Transaction
 
 @pytest.fixture
@@ -33,3 +35,109 @@ def test_save_transaction_to_db(mock_db_session):
     mock_db_session.add.assert_called_once()
     mock_db_session.commit.assert_called_once()
     mock_db_session.refresh.assert_called_once()
+
+def test_save_transactions_batch_records_offsets(test_db):
+    from app.services.db_service import save_transactions_batch, get_committed_offsets, build_transaction
+
+    def make_transaction(key, amount, is_fraud):
+        return build_transaction({
+            'amount': amount,
+            'location': 'Chicago',
+            'user_id': 'user123',
+            'time': '2024-09-22T12:34:56',
+            'idempotency_key': key
+        }, is_fraud)
+
+    saved = save_transactions_batch(
+        [make_transaction('k1', 10, False), make_transaction('k2', 20, True)],
+        {('transactions', 0): 2},
+        'test-group',
+        db=test_db
+    )
+    assert [t.idempotency_key for t in saved] == ['k1', 'k2']
+
+    # A redelivered row is skipped while the rest of the batch and the offsets are still saved
+    saved = save_transactions_batch(
+        [make_transaction('k2', 20, True), make_transaction('k3', 30, False)],
+        {('transactions', 0): 4},
+        'test-group',
+        db=test_db
+    )
+    assert [t.idempotency_key for t in saved] == ['k3']
+    assert test_db.query(Transaction).count() == 3
+    assert get_committed_offsets('test-group', db=test_db) == {('transactions', 0): 4}
+
+def test_save_transactions_batch_skips_rows_violating_other_constraints(test_db):
+    from app.services.db_service import save_transactions_batch, build_transaction
+
+    valid = build_transaction({'amount': 10, 'location': 'Chicago', 'user_id': 'user123',
+                               'time': '2024-09-22T12:34:56', 'idempotency_key': 'k1'}, False)
+    missing_location = build_transaction({'amount': 20, 'location': None, 'user_id': 'user123',
+                                      'time': '2024-09-22T12:35:56', 'idempotency_key': 'k2'}, False)
+
+    saved = save_transactions_batch([missing_location, valid], {('transactions', 0): 2}, 'test-group', db=test_db)
+
+    assert [t.idempotency_key for t in saved] == ['k1']
+    assert test_db.query(Transaction).count() == 1
+
+def test_recent_idempotency_keys_oldest_first(test_db):
+    from app.services.db_service import save_transactions_batch, build_transaction, recent_idempotency_keys
+
+    rows = [build_transaction({'amount': 10 + i, 'location': 'Chicago', 'user_id': 'user123',
+                               'time': '2024-09-22T12:34:56', 'idempotency_key': f'k{i}'}, False) for i in range(4)]
+    save_transactions_batch(rows, {}, 'test-group', db=test_db)
+
+    assert recent_idempotency_keys(3, db=test_db) == ['k1', 'k2', 'k3']
+
+def test_upsert_transactions_rescores_existing_rows(test_db):
+    from app.services.db_service import upsert_transactions, build_transaction
+
+    def make_transaction(key, is_fraud):
+        return build_transaction({'amount': 10, 'location': 'Chicago', 'user_id': 'user123',
+                                  'time': '2024-09-22T12:34:56', 'idempotency_key': key}, is_fraud)
+
+    upsert_transactions([make_transaction('k1', False), make_transaction('k2', False)], db=test_db)
+    upsert_transactions([make_transaction('k2', True), make_transaction('k3', True)], db=test_db)
+
+    rows = {t.idempotency_key: t.is_fraud for t in test_db.query(Transaction).all()}
+    assert rows == {'k1': False, 'k2': True, 'k3': True}
+
+
+def explain(db, query):
+    # SQLite's query plan of a search query, one line per step
+    compiled = query.statement.compile(db.get_bind(), compile_kwargs={"literal_binds": True})
+    return [row[-1] for row in db.execute(text(f"EXPLAIN QUERY PLAN {compiled}"))]
+
+
+def test_search_filters_are_index_backed(test_db):
+    since = datetime(2024, 9, 15)
+    after = (datetime(2024, 9, 22), 42)
+    searches = {
+        "ix_transactions_fraud_time": dict(is_fraud=True, start=since),
+        "ix_transactions_location_time": dict(location="Chicago", start=since, min_amount=100),
+        "ix_transactions_user_id": dict(user_id="user_1", is_fraud=True, start=since),
+    }
+    for index, filters in searches.items():
+        for page in (None, after):
+            plan = explain(test_db, build_search_query(test_db, 100, page, **filters))
+            assert any(f"USING INDEX {index}" in step for step in plan), (filters, plan)
+            assert not any(step.startswith("SCAN transactions") and "INDEX" not in step for step in plan), plan
+
+    # Both indexes also return the rows in page order, with no sort step
+    for filters in (searches["ix_transactions_fraud_time"], searches["ix_transactions_location_time"]):
+        assert not any("TEMP B-TREE" in step for step in explain(test_db, build_search_query(test_db, 100, **filters)))
+
+
+def test_search_pages_by_time_then_id(test_db):
+    for i in range(6):
+        test_db.add(Transaction(user_id="user_1", amount=10.0 * i, location="Chicago",
+                                time=datetime(2024, 9, 22, 12, i // 2), is_fraud=i != 3))
+    test_db.commit()
+
+    first = search_transactions(2, db=test_db, location="Chicago", is_fraud=True)
+    second = search_transactions(2, (first[-1].time, first[-1].id), db=test_db, location="Chicago", is_fraud=True)
+    last = search_transactions(2, (second[-1].time, second[-1].id), db=test_db, location="Chicago", is_fraud=True)
+
+    # Transactions 5 and 6 share a time: the id breaks the tie, transaction 4 is not fraudulent
+    assert [t.id for t in first + second + last] == [6, 5, 3, 2, 1]
+    assert [t.id for t in search_transactions(10, db=test_db, user_id="user_1", min_amount=20, max_amount=40)] == [5, 4, 3]
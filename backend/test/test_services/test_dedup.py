@@ -0,0 +1,56 @@
+# test/test_dedup.py
+
+from app.utils.dedup import BloomFilter, DuplicateCache, compute_idempotency_key
+
+TRANSACTION = {
+    'amount': 100,
+    'location': 'New York',
+    'user_id': 'user123',
+    'time': '2024-09-22T12:34:56'
+}
+
+def test_idempotency_key_is_stable():
+    assert compute_idempotency_key(TRANSACTION) == compute_idempotency_key(dict(TRANSACTION, amount=100.0))
+    assert compute_idempotency_key(TRANSACTION) != compute_idempotency_key(dict(TRANSACTION, amount=101))
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=1000, fp_rate=0.01)
+    keys = [f"key-{i}" for i in range(1000)]
+    for key in keys:
+        bloom.add(key)
+
+    assert all(key in bloom for key in keys)
+    false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+    assert false_positives < 500  # Well within an order of magnitude of the 1% target
+
+def test_duplicate_cache_lookup_outcomes():
+    cache = DuplicateCache(max_size=2, bloom_capacity=100, fp_rate=0.001)
+    cache.warm_up([])
+
+    assert cache.check('a') is False
+    cache.add('a')
+    assert cache.check('a') is True
+
+    # Evicted from the LRU but still in the Bloom filter: the database has to decide
+    cache.add('b')
+    cache.add('c')
+    assert cache.check('a') is None
+
+def test_cold_cache_defers_unknown_keys_to_database():
+    cache = DuplicateCache(max_size=10, bloom_capacity=100, fp_rate=0.001)
+
+    # Before warm-up another process may have persisted the key: the database has to decide
+    assert cache.check('persisted-elsewhere') is None
+
+    cache.warm_up(['persisted-elsewhere'])
+    assert cache.check('persisted-elsewhere') is True
+    assert cache.check('new-key') is False
+
+def test_bloom_filter_keeps_headroom_over_lru():
+    cache = DuplicateCache(max_size=100, bloom_capacity=10, fp_rate=0.01)
+
+    assert cache.bloom.capacity == 200
+    for i in range(1000):
+        cache.add(f"key-{i}")
+    # A rebuild leaves the filter half full, so it is not rebuilt again on the next add
+    assert cache.bloom.count < cache.bloom.capacity
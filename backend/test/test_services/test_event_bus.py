@@ -0,0 +1,70 @@
+# test/test_event_bus.py
+
+import asyncio
+import json
+import pytest
+from app.utils.event_bus import LocalEventBus, PostgresEventBus
+
+EVENT = {"id": 1, "amount": 10.0, "location": "Chicago", "user_id": "user1", "time": "2024-09-22T12:34:56", "is_fraud": False}
+
+@pytest.mark.asyncio
+async def test_local_bus_delivers_to_every_subscriber():
+    bus = LocalEventBus()
+    received = []
+
+    async def first(event):
+        received.append(("first", event))
+
+    async def failing(event):
+        raise RuntimeError("subscriber error")
+
+    async def last(event):
+        received.append(("last", event))
+
+    for callback in (first, failing, last):
+        bus.subscribe(callback)
+
+    await bus.publish(EVENT)
+
+    # A failing subscriber does not prevent delivery to the others
+    assert received == [("first", EVENT), ("last", EVENT)]
+
+@pytest.mark.asyncio
+async def test_postgres_bus_dispatches_notifications():
+    bus = PostgresEventBus("postgresql://unused")
+    received = []
+
+    async def subscriber(event):
+        received.append(event)
+    bus.subscribe(subscriber)
+
+    # Simulate asyncpg invoking the listener with a NOTIFY payload
+    bus._on_notify(None, 1234, bus.channel, json.dumps(EVENT))
+    bus._on_notify(None, 1234, bus.channel, "not json")
+    await asyncio.sleep(0)
+
+    assert received == [EVENT]
+    await asyncio.sleep(0)  # Let the done callbacks run
+    assert not bus._tasks  # Finished dispatch tasks are released
+
+@pytest.mark.asyncio
+async def test_postgres_bus_publish_failure_is_logged_and_connection_reset():
+    bus = PostgresEventBus("postgresql://unused")
+
+    class BrokenConnection:
+        closed = False
+        def is_closed(self):
+            return self.closed
+        async def execute(self, *args):
+            raise ConnectionError("server closed the connection unexpectedly")
+        async def close(self):
+            self.closed = True
+
+    connection = BrokenConnection()
+    bus._publish_conn = connection
+
+    # The error does not reach the caller and the next publish reconnects
+    await bus.publish(EVENT)
+
+    assert connection.closed
+    assert bus._publish_conn is None
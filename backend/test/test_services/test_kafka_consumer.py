@@ -1,50 +1,342 @@
 # test/test_kafka_consumer.py
 
 import pytest
-from unittest.mock import patch, MagicMock
-from app.consumers.kafka_consumer import consume_transactions
+from unittest.mock import patch, MagicMock, AsyncMock
+from aiokafka import TopicPartition
+from prometheus_client import REGISTRY
+from sqlalchemy.exc import OperationalError
+from app.consumers import kafka_consumer
+from app.consumers.kafka_consumer import consume_transactions, OffsetSeekListener, bootstrap_consumer
+from app.utils.user_activity import UserActivityStore
 import asyncio
 
+
+@pytest.fixture(autouse=True)
+def no_database_lookups():
+    # Keys the duplicate cache cannot rule out are reported as new instead of querying PostgreSQL
+    with patch('app.consumers.kafka_consumer.transaction_exists', return_value=False):
+        yield
+
+
+def mock_consumer_batches(mock_kafka_consumer, batches, stop_event):
+    """
+    Configure the mocked AIOKafkaConsumer to return the given batches from `getmany`,
+    then set `stop_event` so `consume_transactions` returns.
+    """
+    # Mock the start, stop and commit methods to return awaitables
+    async def mock_noop(*args, **kwargs):
+        return None
+    mock_kafka_consumer().start.side_effect = mock_noop
+    mock_kafka_consumer().stop.side_effect = mock_noop
+    mock_kafka_consumer().commit.side_effect = mock_noop
+
+    # Mock getmany to hand out one batch per call
+    remaining = list(batches)
+    async def mock_getmany(*args, **kwargs):
+        if remaining:
+            return remaining.pop(0)
+        stop_event.set()
+        return {}
+    mock_kafka_consumer().getmany.side_effect = mock_getmany
+
+
 @pytest.mark.asyncio
 @patch('app.consumers.kafka_consumer.AIOKafkaConsumer')
-@patch('app.consumers.kafka_consumer.save_transaction_to_db')
+@patch('app.consumers.kafka_consumer.save_transactions_batch')
 @patch('app.consumers.kafka_consumer.fraud_model')
-@patch('app.consumers.kafka_consumer.preprocess_transaction')
+@patch('app.consumers.kafka_consumer.preprocess_transactions')
 async def test_consume_transactions(
-        mock_preprocess_transaction, mock_fraud_model, 
-        mock_save_transaction, mock_kafka_consumer):
+        mock_preprocess_transactions, mock_fraud_model,
+        mock_save_transactions, mock_kafka_consumer):
 
-    # Mock Kafka consumer's async message stream
+    # Mock Kafka consumer's message batch
+    tp = TopicPartition('transactions', 0)
     mock_message = MagicMock()
+    mock_message.offset = 41
     mock_message.value = {
         'amount': 100,
         'location': 'New York',
         'user_id': 'user123',
         'time': '2024-09-22T12:34:56'
     }
-
-    # Mock the start method to return an awaitable
-    async def mock_start():
-        return None
-    mock_kafka_consumer().start.side_effect = mock_start
-
-    # Mock the stop method to return an awaitable
-    async def mock_stop():
-        return None
-    mock_kafka_consumer().stop.side_effect = mock_stop
-
-    # Mock the async for loop in Kafka consumer
-    async def mock_aiter():
-        yield mock_message
-    mock_kafka_consumer().__aiter__.side_effect = mock_aiter
+    stop_event = asyncio.Event()
+    mock_consumer_batches(mock_kafka_consumer, [{tp: [mock_message]}], stop_event)
 
     # Mock the fraud detection and preprocessing functions
-    mock_preprocess_transaction.return_value = [1, 2, 3]  # Dummy processed data
+    mock_preprocess_transactions.return_value = [1, 2, 3]  # Dummy processed data
     mock_fraud_model.predict.return_value = [0]  # No fraud detected
+    mock_save_transactions.return_value = []
 
     # Call the async function to be tested
-    await consume_transactions()
+    await consume_transactions(stop_event)
+
+    # Ensure the transaction and its next offset are saved together
+    mock_save_transactions.assert_called_once()
+    rows, offsets, group_id = mock_save_transactions.call_args.args
+    assert [(row.user_id, row.is_fraud) for row in rows] == [('user123', False)]
+    assert offsets == {('transactions', 0): 42}
+    assert group_id == 'transaction-consumers'
+    mock_fraud_model.predict.assert_called_once()
+
+    # Offsets are committed to Kafka only after the batch was persisted
+    mock_kafka_consumer().commit.assert_called_once_with({tp: 42})
+
+
+@pytest.mark.asyncio
+@patch('app.consumers.kafka_consumer.AIOKafkaConsumer')
+@patch('app.consumers.kafka_consumer.save_transactions_batch')
+@patch('app.consumers.kafka_consumer.fraud_model')
+@patch('app.consumers.kafka_consumer.preprocess_transactions')
+async def test_consume_transactions_skips_redelivered_message(
+        mock_preprocess_transactions, mock_fraud_model,
+        mock_save_transactions, mock_kafka_consumer):
+
+    # The same transaction delivered twice (e.g. after a rebalance)
+    tp = TopicPartition('transactions', 0)
+    def make_message(offset):
+        message = MagicMock()
+        message.offset = offset
+        message.value = {
+            'amount': 250,
+            'location': 'Chicago',
+            'user_id': 'user-redelivered',
+            'time': '2024-09-22T12:34:56',
+            'idempotency_key': 'redelivered-key'
+        }
+        return message
+
+    stop_event = asyncio.Event()
+    mock_consumer_batches(mock_kafka_consumer, [{tp: [make_message(1), make_message(2)]}], stop_event)
+
+    mock_preprocess_transactions.return_value = [1, 2, 3]
+    mock_fraud_model.predict.return_value = [0]
+    mock_save_transactions.return_value = []
+
+    await consume_transactions(stop_event)
+
+    # Only the first delivery is scored and saved, but both offsets are consumed
+    mock_fraud_model.predict.assert_called_once()
+    scored, offsets, _ = mock_save_transactions.call_args.args
+    assert len(scored) == 1
+    assert offsets == {('transactions', 0): 3}
+
+
+@pytest.mark.asyncio
+@patch('app.consumers.kafka_consumer.CONSUMER_RETRY_BACKOFF_SECONDS', 0)
+@patch('app.consumers.kafka_consumer.AIOKafkaConsumer')
+@patch('app.consumers.kafka_consumer.save_transactions_batch')
+@patch('app.consumers.kafka_consumer.fraud_model')
+@patch('app.consumers.kafka_consumer.preprocess_transactions')
+async def test_failed_batch_is_not_committed(
+        mock_preprocess_transactions, mock_fraud_model,
+        mock_save_transactions, mock_kafka_consumer):
+
+    tp = TopicPartition('transactions', 3)
+    mock_message = MagicMock()
+    mock_message.offset = 10
+    mock_message.value = {
+        'amount': 75,
+        'location': 'Houston',
+        'user_id': 'user-db-down',
+        'time': '2024-09-22T12:34:56'
+    }
+    stop_event = asyncio.Event()
+    mock_consumer_batches(mock_kafka_consumer, [{tp: [mock_message]}], stop_event)
+
+    mock_preprocess_transactions.return_value = [1, 2, 3]
+    mock_fraud_model.predict.return_value = [1]
+    mock_save_transactions.side_effect = RuntimeError("database unavailable")
+
+    await consume_transactions(stop_event)
+
+    # The consumer rewinds to the start of the batch instead of committing past it
+    mock_kafka_consumer().commit.assert_not_called()
+    mock_kafka_consumer().seek.assert_called_once_with(tp, 10)
+
+
+@pytest.mark.asyncio
+@patch('app.consumers.kafka_consumer.AIOKafkaConsumer')
+@patch('app.consumers.kafka_consumer.save_transactions_batch')
+@patch('app.consumers.kafka_consumer.fraud_model')
+@patch('app.consumers.kafka_consumer.preprocess_transactions')
+async def test_batch_is_scored_by_rules_then_one_model_call(
+        mock_preprocess_transactions, mock_fraud_model,
+        mock_save_transactions, mock_kafka_consumer):
 
-    # Ensure the transaction is saved to the DB
-    mock_save_transaction.assert_called_once_with(mock_message.value, False)
+    tp = TopicPartition('transactions', 1)
+    def make_message(offset, value):
+        message = MagicMock()
+        message.offset = offset
+        message.value = value
+        return message
+
+    # Above the hard limit (decided by a rule), two left to the model, and one malformed message
+    over_limit = {'amount': 20000, 'location': 'Chicago', 'user_id': 'user-a', 'time': '2024-09-22T15:30:00.250000+00:00'}
+    regular_1 = {'amount': 120, 'location': 'Chicago', 'user_id': 'user-b', 'time': '2024-09-22T15:30:00'}
+    regular_2 = {'amount': 130, 'location': 'Houston', 'user_id': 'user-c', 'time': '2024-09-22T15:31:00'}
+    malformed = {'amount': 50, 'location': 'Chicago', 'user_id': 'user-d', 'time': 'yesterday'}
+    stop_event = asyncio.Event()
+    mock_consumer_batches(mock_kafka_consumer, [{tp: [
+        make_message(0, over_limit), make_message(1, regular_1), make_message(2, malformed), make_message(3, regular_2)
+    ]}], stop_event)
+
+    mock_preprocess_transactions.return_value = [[0], [0]]
+    mock_fraud_model.predict.return_value = [0, 1]
+    mock_save_transactions.return_value = []
+
+    await consume_transactions(stop_event)
+
+    # Only the undecided transactions reach preprocessing and the model, in one call
+    mock_preprocess_transactions.assert_called_once()
+    transactions, user_activity = mock_preprocess_transactions.call_args.args
+    assert transactions == [regular_1, regular_2]
+    assert isinstance(user_activity, UserActivityStore)  # The consumer's per-user history answers frequencies first
     mock_fraud_model.predict.assert_called_once()
+    scored, offsets, _ = mock_save_transactions.call_args.args
+    assert [(row.user_id, row.is_fraud) for row in scored] == [('user-a', True), ('user-b', False), ('user-c', True)]
+    assert offsets == {('transactions', 1): 4}
+
+
+@pytest.mark.asyncio
+@patch('app.consumers.kafka_consumer.CONSUMER_RETRY_BACKOFF_SECONDS', 0)
+@patch('app.consumers.kafka_consumer.AIOKafkaConsumer')
+@patch('app.consumers.kafka_consumer.save_transactions_batch')
+@patch('app.consumers.kafka_consumer.fraud_model')
+@patch('app.consumers.kafka_consumer.preprocess_transactions')
+async def test_database_error_while_scoring_replays_batch(
+        mock_preprocess_transactions, mock_fraud_model,
+        mock_save_transactions, mock_kafka_consumer):
+
+    tp = TopicPartition('transactions', 2)
+    mock_message = MagicMock()
+    mock_message.offset = 7
+    mock_message.value = {'amount': 75, 'location': 'Houston', 'user_id': 'user-freq', 'time': '2024-09-22T12:34:56'}
+    stop_event = asyncio.Event()
+    mock_consumer_batches(mock_kafka_consumer, [{tp: [mock_message]}], stop_event)
+
+    # The frequency query fails because the database is restarting
+    mock_preprocess_transactions.side_effect = OperationalError("SELECT count(*)", {}, Exception("connection refused"))
+    processed_before = REGISTRY.get_sample_value('transactions_processed_total')
+
+    await consume_transactions(stop_event)
+
+    # The message is neither persisted, counted nor committed past; the batch is replayed instead
+    mock_save_transactions.assert_not_called()
+    mock_kafka_consumer().commit.assert_not_called()
+    mock_kafka_consumer().seek.assert_called_once_with(tp, 7)
+    assert REGISTRY.get_sample_value('transactions_processed_total') == processed_before
+
+
+@pytest.mark.asyncio
+@patch('app.consumers.kafka_consumer.recent_idempotency_keys', return_value=['persisted-key'])
+@patch('app.consumers.kafka_consumer.get_committed_offsets')
+async def test_offset_seek_listener_positions_partitions_from_db(mock_get_committed_offsets, mock_recent_keys):
+    recorded, unrecorded = TopicPartition('transactions', 0), TopicPartition('transactions', 1)
+    mock_get_committed_offsets.return_value = {('transactions', 0): 120}
+    consumer = MagicMock()
+    bootstrap_consumer()
+
+    await OffsetSeekListener(consumer, 'transaction-consumers').on_partitions_assigned([recorded, unrecorded])
+
+    # Only partitions with a DB-recorded offset are moved; the others keep Kafka's committed position
+    mock_get_committed_offsets.assert_called_once_with('transaction-consumers')
+    consumer.seek.assert_called_once_with(recorded, 120)
+
+    # The duplicate cache now knows the keys persisted before the assignment
+    assert kafka_consumer.duplicate_cache.check('persisted-key') is True
+
+
+@pytest.mark.asyncio
+async def test_lag_monitor_exports_lag_per_partition_and_rate():
+    first, second = TopicPartition('transactions', 0), TopicPartition('transactions', 1)
+    consumer = MagicMock()
+    consumer.assignment.return_value = {first, second}
+
+    async def end_offsets(partitions):
+        return {first: 500, second: 80}
+
+    async def position(tp):
+        return {first: 350, second: 80}[tp]
+
+    consumer.end_offsets.side_effect = end_offsets
+    consumer.position.side_effect = position
+
+    monitor = kafka_consumer.LagMonitor(consumer, interval=0)
+    monitor.record(40)
+    await monitor.maybe_update()
+
+    assert REGISTRY.get_sample_value('kafka_consumer_lag', {'topic': 'transactions', 'partition': '0'}) == 150
+    assert REGISTRY.get_sample_value('kafka_consumer_lag', {'topic': 'transactions', 'partition': '1'}) == 0
+    assert REGISTRY.get_sample_value('kafka_consumer_processing_rate') > 0
+
+    # A revoked partition is no longer reported by this consumer
+    await OffsetSeekListener(consumer, 'transaction-consumers').on_partitions_revoked([first])
+    assert REGISTRY.get_sample_value('kafka_consumer_lag', {'topic': 'transactions', 'partition': '0'}) is None
+
+
+@pytest.mark.asyncio
+@patch('app.consumers.kafka_consumer.save_transactions_batch')
+@patch('app.consumers.kafka_consumer.preprocess_transactions')
+async def test_failed_batch_goes_to_the_retry_lane_and_malformed_messages_to_the_dlq(
+        mock_preprocess_transactions, mock_save_transactions):
+    bootstrap_consumer()
+    tp = TopicPartition('transactions', 5)
+    valid, malformed = MagicMock(), MagicMock()
+    valid.offset, valid.headers = 20, []
+    valid.value = {'amount': 75, 'location': 'Houston', 'user_id': 'user-retry', 'time': '2024-09-22T12:34:56'}
+    malformed.offset, malformed.headers, malformed.value = 21, [], None  # Not valid JSON
+    consumer = MagicMock()
+    consumer.commit = AsyncMock()
+    failures = MagicMock()
+    failures.route = AsyncMock()
+
+    # The database is down while computing the frequency feature
+    mock_preprocess_transactions.side_effect = OperationalError("SELECT count(*)", {}, Exception("connection refused"))
+
+    persisted = await kafka_consumer.process_batch(consumer, {tp: [valid, malformed]}, failures)
+
+    # The malformed message is dead-lettered with its own error, the other one retried; the partition moves on
+    assert persisted is False
+    routed = failures.route.call_args.args[0]
+    assert [(message.offset, type(error).__name__) for _, message, error in routed] == [
+        (21, 'TypeError'), (20, 'OperationalError')]
+    consumer.seek.assert_not_called()
+    consumer.commit.assert_called_once_with({tp: 22})
+
+
+@pytest.mark.asyncio
+@patch('app.consumers.kafka_consumer.CONSUMER_RETRY_BACKOFF_SECONDS', 0)
+@patch('app.consumers.kafka_consumer.save_transactions_batch')
+@patch('app.consumers.kafka_consumer.preprocess_transactions')
+async def test_batch_is_replayed_when_the_failure_lanes_are_unavailable(
+        mock_preprocess_transactions, mock_save_transactions):
+    bootstrap_consumer()
+    tp = TopicPartition('transactions', 6)
+    message = MagicMock()
+    message.offset, message.headers = 30, []
+    message.value = {'amount': 75, 'location': 'Houston', 'user_id': 'user-retry', 'time': '2024-09-22T12:34:56'}
+    consumer = MagicMock()
+    consumer.commit = AsyncMock()
+    failures = MagicMock()
+    failures.route = AsyncMock(side_effect=ConnectionError("broker unavailable"))
+    mock_preprocess_transactions.side_effect = OperationalError("SELECT count(*)", {}, Exception("connection refused"))
+
+    await kafka_consumer.process_batch(consumer, {tp: [message]}, failures)
+
+    consumer.commit.assert_not_called()
+    consumer.seek.assert_called_once_with(tp, 30)
+
+
+@patch('app.consumers.kafka_consumer.preprocess_transactions')
+def test_score_with_probability_reports_the_deciding_stage(mock_preprocess_transactions):
+    bootstrap_consumer()
+    over_limit = {'amount': 20000, 'location': 'Chicago', 'user_id': 'user-a', 'time': '2024-09-22T15:30:00'}
+    regular = {'amount': 120, 'location': 'Chicago', 'user_id': 'user-b', 'time': '2024-09-22T15:30:00'}
+    mock_preprocess_transactions.return_value = [[0.0] * kafka_consumer.fraud_model.n_features_in_]
+
+    over_limit_result, regular_result = kafka_consumer.score_with_probability([over_limit, regular])
+
+    assert over_limit_result == {'is_fraud': True, 'probability': 1.0, 'decided_by': 'rules'}
+    assert regular_result['decided_by'] == 'model'
+    assert 0 <= regular_result['probability'] <= 1
+    assert regular_result['is_fraud'] == bool(kafka_consumer.fraud_model.predict(mock_preprocess_transactions.return_value)[0])
@@ -18,5 +18,17 @@ def test_send_transaction_to_kafka(mock_kafka_producer):
     # Check if KafkaProducer's send method was called with correct arguments
     mock_kafka_producer().send.assert_called_with(
         'transactions',
-        transaction_data
+        transaction_data,
+        key='user123',  # Keyed by user so a user's transactions stay on one partition
+        headers=None
     )
+
+@patch('app.producers.kafka_producer.KafkaProducer')
+def test_send_transaction_to_kafka_carries_the_trace(mock_kafka_producer):
+    from app.utils.tracing import trace_from_headers
+
+    trace = {'id': 'abc', 'ingest': 1700000000.0}
+    send_transaction_to_kafka({'amount': 100, 'user_id': 'user123'}, trace)
+
+    headers = mock_kafka_producer().send.call_args.kwargs['headers']
+    assert trace_from_headers(headers) == trace
@@ -0,0 +1,37 @@
+# test/test_logging_config.py
+
+import json
+import logging
+from app.utils.logging_config import JsonFormatter, RateLimitFilter, TransactionSamplingFilter, PER_TRANSACTION
+
+def make_record(level=logging.INFO, name='app.test', msg='Consumed transaction: %s', args=({'amount': 1},), extra=None):
+    record = logging.LogRecord(name, level, __file__, 1, msg, args, None)
+    for key, value in (extra or {}).items():
+        setattr(record, key, value)
+    return record
+
+def test_rate_limit_drops_excess_info_records():
+    rate_limit = RateLimitFilter(rate=5)
+
+    passed = sum(rate_limit.filter(make_record()) for _ in range(50))
+    assert passed <= 6
+
+    # Errors are never dropped
+    assert rate_limit.filter(make_record(level=logging.ERROR))
+
+def test_sampling_only_applies_to_per_transaction_records():
+    sampler = TransactionSamplingFilter(sample_rate=0.0)
+
+    assert not sampler.filter(make_record(extra=PER_TRANSACTION))
+    assert sampler.filter(make_record())
+    assert sampler.filter(make_record(level=logging.ERROR, extra=PER_TRANSACTION))
+
+def test_json_formatter_emits_structured_fields():
+    record = make_record(extra={'partition': 3})
+
+    entry = json.loads(JsonFormatter().format(record))
+
+    assert entry['level'] == 'INFO'
+    assert entry['logger'] == 'app.test'
+    assert entry['message'] == "Consumed transaction: {'amount': 1}"
+    assert entry['partition'] == 3
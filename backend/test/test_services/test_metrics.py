@@ -0,0 +1,43 @@
+# test/test_metrics.py
+
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+
+def run_python(code, multiproc_dir):
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(multiproc_dir)}
+    return subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, env=env, capture_output=True,
+                          text=True, check=True).stdout
+
+
+def test_metrics_are_aggregated_across_processes(tmp_path):
+    # Two "workers" each count transactions and hold admission slots
+    worker = (
+        "from app.consumers.kafka_consumer import transactions_processed; "
+        "from app.utils.admission import admission_in_flight; "
+        "transactions_processed.inc(3); admission_in_flight.labels(route='/api/transaction').inc(2)"
+    )
+    run_python(worker, tmp_path)
+    run_python(worker, tmp_path)
+
+    exposition = run_python("from app.utils.metrics import render_metrics; print(render_metrics().decode())", tmp_path)
+
+    assert "transactions_processed_total 6.0" in exposition
+    # Both workers exited without being marked dead, so their live gauges still count
+    assert 'admission_in_flight{route="/api/transaction"} 4.0' in exposition
+
+
+def test_dead_processes_leave_live_gauges(tmp_path):
+    code = (
+        "import os; from app.utils.admission import admission_in_flight; "
+        "from app.utils.metrics import mark_process_dead; "
+        "admission_in_flight.labels(route='/api/transaction').inc(2); mark_process_dead(os.getpid())"
+    )
+    run_python(code, tmp_path)
+
+    exposition = run_python("from app.utils.metrics import render_metrics; print(render_metrics().decode())", tmp_path)
+
+    assert 'admission_in_flight{route="/api/transaction"}' not in exposition
@@ -0,0 +1,58 @@
+# test/test_micro_batcher.py
+
+import asyncio
+import time
+import pytest
+from app.utils.micro_batcher import MicroBatcher
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_are_scored_in_one_batch():
+    batches = []
+
+    def handler(items):
+        batches.append(list(items))
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher("test", handler, window_ms=5, max_batch_size=64)
+    results = await asyncio.gather(*(batcher.submit(i) for i in range(10)))
+    await batcher.stop()
+
+    assert results == [i * 2 for i in range(10)]
+    assert batches == [list(range(10))]
+
+
+@pytest.mark.asyncio
+async def test_full_batch_starts_without_waiting_for_the_window():
+    batcher = MicroBatcher("test-full", lambda items: items, window_ms=10, max_batch_size=2)
+    batcher.window = 5.0  # Far longer than the test may take: only a full batch can start
+    start = time.perf_counter()
+    assert await asyncio.gather(batcher.submit("a"), batcher.submit("b")) == ["a", "b"]
+    await batcher.stop()
+    assert time.perf_counter() - start < 1
+
+
+@pytest.mark.asyncio
+async def test_latency_slo_caps_the_wait_by_the_batch_service_time():
+    batcher = MicroBatcher("test-slo", lambda items: items, window_ms=8, latency_slo_ms=10)
+    assert batcher.wait_budget() == pytest.approx(0.008)
+    batcher.service_time = 0.007  # Batches take 7 ms: only 3 ms are left to wait
+    assert batcher.wait_budget() == pytest.approx(0.003)
+    batcher.service_time = 0.05  # Slower than the SLO: no waiting at all
+    assert batcher.wait_budget() == 0
+
+
+@pytest.mark.asyncio
+async def test_handler_errors_fail_every_request_of_the_batch():
+    def handler(items):
+        raise RuntimeError("model unavailable")
+
+    batcher = MicroBatcher("test-error", handler, window_ms=1)
+    results = await asyncio.gather(batcher.submit(1), batcher.submit(2), return_exceptions=True)
+    await batcher.stop()
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_window_is_limited_to_a_few_milliseconds():
+    with pytest.raises(ValueError):
+        MicroBatcher("test-window", lambda items: items, window_ms=50)
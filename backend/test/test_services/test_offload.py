@@ -0,0 +1,73 @@
+# test/test_offload.py
+
+import asyncio
+import logging
+import threading
+import time
+import pytest
+from prometheus_client import REGISTRY
+from app.utils.loop_monitor import LoopLagMonitor
+from app.utils.offload import OffloadPool
+
+
+def sample(name, labels=None):
+    return REGISTRY.get_sample_value(name, labels or {}) or 0
+
+
+@pytest.mark.asyncio
+async def test_offload_pool_runs_calls_off_the_loop():
+    pool = OffloadPool("test-run", 2)
+    loop_thread = threading.get_ident()
+    try:
+        thread = await pool.run(threading.get_ident)
+        assert thread != loop_thread
+        assert await pool.run(lambda a, b=0: a + b, 1, b=2) == 3
+        with pytest.raises(ZeroDivisionError):
+            await pool.run(lambda: 1 / 0)
+        assert sample("offload_pool_busy", {"pool": pool.name}) == 0
+        assert sample("offload_pool_queued", {"pool": pool.name}) == 0
+    finally:
+        pool.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_offload_pool_is_bounded_and_cancels_queued_calls():
+    pool = OffloadPool("test-bounded", 1)
+    release = threading.Event()
+    try:
+        running = asyncio.ensure_future(pool.run(release.wait, 5))
+        queued = asyncio.ensure_future(pool.run(lambda: "never"))
+        await asyncio.sleep(0.05)
+        # One thread: the second call waits for the first
+        assert sample("offload_pool_busy", {"pool": pool.name}) == 1
+        assert sample("offload_pool_queued", {"pool": pool.name}) == 1
+
+        queued.cancel()
+        await asyncio.gather(queued, return_exceptions=True)
+        assert sample("offload_pool_queued", {"pool": pool.name}) == 0
+
+        release.set()
+        assert await running is True
+        assert sample("offload_pool_busy", {"pool": pool.name}) == 0
+    finally:
+        pool.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_loop_monitor_reports_blocking_call(caplog):
+    monitor = LoopLagMonitor(interval_ms=10, threshold_ms=50)
+    before = sample("event_loop_blocked_total")
+    monitor.start()
+    try:
+        await asyncio.sleep(0.05)
+        with caplog.at_level(logging.WARNING, logger="app.utils.loop_monitor"):
+            time.sleep(0.3)  # Blocks the event loop
+            await asyncio.sleep(0.05)
+    finally:
+        await monitor.stop()
+
+    assert sample("event_loop_blocked_total") == before + 1
+    blocked = [r for r in caplog.records if "Event loop blocked" in r.getMessage()]
+    assert len(blocked) == 1
+    # The stack points at the blocking call
+    assert "test_loop_monitor_reports_blocking_call" in blocked[0].getMessage()
@@ -0,0 +1,100 @@
+# test/test_rate_limiter.py
+
+import pytest
+from unittest.mock import MagicMock, AsyncMock
+from aiokafka import TopicPartition
+from prometheus_client import REGISTRY
+from app.consumers.kafka_consumer import fetch_prioritized
+from app.utils.rate_limiter import UserRateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def count(name, labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_bucket_allows_a_burst_then_refills_at_the_rate():
+    clock = FakeClock()
+    limiter = UserRateLimiter("test-burst", rate=2, burst=3, clock=clock)
+
+    assert [limiter.try_acquire("user_1") for _ in range(4)] == [True, True, True, False]
+    # Other users have their own bucket
+    assert limiter.try_acquire("user_2")
+    # Half a token is missing after 0.25s, so a retry is due in 1s at the earliest
+    clock.now += 0.25
+    assert not limiter.try_acquire("user_1")
+    assert limiter.retry_after("user_1") == 1
+    clock.now += 0.5
+    assert limiter.try_acquire("user_1")
+    assert count('rate_limit_requests_total', {'route': 'test-burst', 'result': 'limited'}) == 2
+
+
+def test_idle_buckets_are_dropped_and_max_users_bounds_memory():
+    clock = FakeClock()
+    limiter = UserRateLimiter("test-evict", rate=1, burst=2, max_users=2, clock=clock)
+
+    limiter.try_acquire("user_1")
+    clock.now += 5  # user_1's bucket is full again: dropping it changes no decision
+    limiter.try_acquire("user_2")
+    assert list(limiter.slots) == ["user_2"]
+    assert count('rate_limit_bucket_evictions_total', {'route': 'test-evict'}) == 0
+
+    limiter.try_acquire("user_3")
+    limiter.try_acquire("user_4")
+    # user_2 was the least recently seen and not idle yet
+    assert list(limiter.slots) == ["user_3", "user_4"]
+    assert len(limiter.tokens) == 2  # Slots are reused
+    assert count('rate_limit_bucket_evictions_total', {'route': 'test-evict'}) == 1
+
+
+def test_hot_users_are_exported_per_window():
+    clock = FakeClock()
+    limiter = UserRateLimiter("test-hot", rate=100, burst=100, hot_keys=1, hot_window=60, clock=clock)
+
+    for _ in range(5):
+        limiter.try_acquire("noisy")
+    limiter.try_acquire("quiet")
+    clock.now += 60
+    limiter.try_acquire("quiet")
+
+    assert count('rate_limit_hot_user_requests', {'route': 'test-hot', 'user_id': 'noisy'}) == 5
+    assert REGISTRY.get_sample_value('rate_limit_hot_user_requests', {'route': 'test-hot', 'user_id': 'quiet'}) is None
+
+    # The next window has a new hottest user and the previous one is removed
+    clock.now += 60
+    limiter.try_acquire("quiet")
+    assert REGISTRY.get_sample_value('rate_limit_hot_user_requests', {'route': 'test-hot', 'user_id': 'noisy'}) is None
+    assert count('rate_limit_hot_user_requests', {'route': 'test-hot', 'user_id': 'quiet'}) == 1
+
+
+def test_zero_rate_disables_the_limiter():
+    limiter = UserRateLimiter("test-disabled", rate=0, burst=1)
+    assert all(limiter.try_acquire("user_1") for _ in range(10))
+    assert not limiter.slots
+
+
+@pytest.mark.asyncio
+async def test_low_priority_partitions_only_fill_spare_batch_capacity():
+    main, low = TopicPartition('transactions', 0), TopicPartition('transactions.low-priority', 0)
+    consumer = MagicMock()
+    consumer.assignment.return_value = {main, low}
+    consumer.getmany = AsyncMock(side_effect=[{main: ['m1', 'm2']}, {low: ['l1']}])
+
+    batch = await fetch_prioritized(consumer, timeout_ms=100, max_records=3)
+
+    assert batch == {main: ['m1', 'm2'], low: ['l1']}
+    first, second = consumer.getmany.call_args_list
+    assert first.args == (main,) and first.kwargs == {'timeout_ms': 100, 'max_records': 3}
+    assert second.args == (low,) and second.kwargs == {'timeout_ms': 0, 'max_records': 1}
+
+    # A full batch of the main topic leaves nothing for the low-priority topic
+    consumer.getmany = AsyncMock(return_value={main: ['m1', 'm2', 'm3']})
+    assert await fetch_prioritized(consumer, timeout_ms=100, max_records=3) == {main: ['m1', 'm2', 'm3']}
+    assert consumer.getmany.call_count == 1
@@ -0,0 +1,47 @@
+# test/test_redrive_dlq.py
+
+import pytest
+from unittest.mock import patch, MagicMock, AsyncMock
+from aiokafka import TopicPartition
+from app.consumers.redrive_dlq import redrive
+
+
+def make_dlq_record(offset, value, failure):
+    record = MagicMock()
+    record.topic, record.partition, record.offset = 'transactions.dlq', 0, offset
+    record.key, record.value = b'user-1', value
+    record.headers = [('x-failure', failure.encode()), ('x-error-type', b'OperationalError'),
+                      ('x-origin-topic', b'transactions'), ('x-origin-partition', b'2'), ('x-origin-offset', b'9')]
+    return record
+
+
+@pytest.mark.asyncio
+@patch('app.consumers.redrive_dlq.AIOKafkaProducer')
+@patch('app.consumers.redrive_dlq.AIOKafkaConsumer')
+async def test_redrive_republishes_matching_messages_and_commits(mock_kafka_consumer, mock_kafka_producer):
+    tp = TopicPartition('transactions.dlq', 0)
+    consumer = mock_kafka_consumer.return_value
+    consumer.start = consumer.stop = consumer.topics = AsyncMock()
+    consumer.commit = AsyncMock()
+    consumer.partitions_for_topic.return_value = {0}
+    consumer.end_offsets = AsyncMock(return_value={tp: 3})
+    consumer.position = AsyncMock(return_value=0)
+    consumer.getmany = AsyncMock(return_value={tp: [
+        make_dlq_record(0, b'{"user_id": "user-1"}', 'transient'),
+        make_dlq_record(1, None, 'permanent'),  # The original bytes were not JSON
+        make_dlq_record(2, b'{"user_id": "user-1", "amount": "x"}', 'permanent'),
+    ]})
+    producer = mock_kafka_producer.return_value
+    producer.start = producer.stop = AsyncMock()
+    async def acknowledged():
+        return None
+    producer.send = AsyncMock(side_effect=lambda *args, **kwargs: acknowledged())
+
+    counts = await redrive(failure='transient')
+
+    assert counts == {'redriven': 1, 'undeserializable': 1, 'filtered': 1}
+    topic = producer.send.call_args.args[0]
+    kwargs = producer.send.call_args.kwargs
+    assert (topic, kwargs['value'], kwargs['key']) == ('transactions', b'{"user_id": "user-1"}', b'user-1')
+    assert dict(kwargs['headers'])['x-redriven-from'] == b'transactions.dlq[0]@0'
+    consumer.commit.assert_called_once_with({tp: 3})
@@ -0,0 +1,43 @@
+# test/test_replay.py
+
+import pytest
+from unittest.mock import patch, MagicMock, AsyncMock
+from aiokafka import TopicPartition
+from app.consumers.replay import replay
+
+
+def make_record(offset, amount):
+    record = MagicMock()
+    record.offset = offset
+    record.value = {'amount': amount, 'location': 'Chicago', 'user_id': f'user-{offset}', 'time': '2024-09-22T12:34:56'}
+    return record
+
+
+@pytest.mark.asyncio
+@patch('app.consumers.replay.upsert_transactions')
+@patch('app.consumers.replay.predict_fraud')
+@patch('app.consumers.replay.AIOKafkaConsumer')
+async def test_replay_stops_at_end_offset_without_publishing(mock_kafka_consumer, mock_predict_fraud, mock_upsert):
+    tp = TopicPartition('transactions', 0)
+    consumer = mock_kafka_consumer.return_value
+    consumer.start = AsyncMock()
+    consumer.stop = AsyncMock()
+    consumer.partitions_for_topic.return_value = {0}
+    consumer.beginning_offsets = AsyncMock(return_value={tp: 0})
+    consumer.end_offsets = AsyncMock(return_value={tp: 10})
+    # The fetch returns messages past the requested end offset, which must not be replayed
+    consumer.getmany = AsyncMock(return_value={tp: [make_record(3, 20000), make_record(4, 50), make_record(5, 60)]})
+    mock_predict_fraud.side_effect = lambda transactions: [False] * len(transactions)
+    mock_upsert.side_effect = lambda rows: len(rows)
+
+    with patch('app.utils.event_bus.LocalEventBus.publish') as mock_publish:
+        progress = await replay(from_offset=3, to_offset=5, workers=2)
+
+    # One fetch covers the range, the rule stage decides the first message and the model the second
+    consumer.getmany.assert_called_once()
+    consumer.seek.assert_called_once_with(tp, 3)
+    rows = mock_upsert.call_args.args[0]
+    assert [(row.user_id, row.is_fraud) for row in rows] == [('user-3', True), ('user-4', False)]
+    assert progress.messages == 2 and progress.written == 2
+    mock_publish.assert_not_called()
+    consumer.stop.assert_called_once()
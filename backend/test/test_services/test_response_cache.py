@@ -0,0 +1,42 @@
+# test/test_response_cache.py
+
+from app.utils.response_cache import ResponseCache, bump_data_version, current_data_version, etag_for, etag_matches
+
+
+def test_cache_evicts_least_recently_used_responses_beyond_its_size():
+    cache = ResponseCache("test", max_bytes=10)
+    version = current_data_version()
+    cache.put("a", b"aaaa", version)
+    cache.put("b", b"bbbb", version)
+    assert cache.get("a") is not None  # "b" is now the least recently used
+
+    cache.put("c", b"cccc", version)
+    assert cache.get("b") is None
+    assert cache.get("a").body == b"aaaa" and cache.get("c").body == b"cccc"
+    assert cache.size == 8
+
+    # Too large to keep, but still served with its ETag
+    assert cache.put("d", b"d" * 11, version).etag == etag_for(b"d" * 11)
+    assert cache.get("d") is None
+
+
+def test_entries_are_stale_once_the_data_version_moves():
+    cache = ResponseCache("test-version")
+    cache.put("a", b"[]", current_data_version())
+    assert cache.get("a") is not None
+
+    bump_data_version()
+    assert cache.get("a") is None
+
+    # Versions received from other processes never move the version back
+    current = current_data_version()
+    assert bump_data_version(current - 1) == current
+
+
+def test_if_none_match_comparison():
+    etag = etag_for(b"[]")
+    assert etag_matches(etag, etag)
+    assert etag_matches(f'"other", W/{etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('"other"', etag)
+    assert not etag_matches(None, etag)
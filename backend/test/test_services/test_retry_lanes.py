@@ -0,0 +1,93 @@
+# test/test_retry_lanes.py
+
+import asyncio
+import json
+import pytest
+from unittest.mock import MagicMock
+from aiokafka import TopicPartition
+from sqlalchemy.exc import IntegrityError, OperationalError
+from app.consumers.retry_lanes import (
+    FailureRouter, PERMANENT, TRANSIENT, attempt_of, classify_failure, header, not_before_of, retry_delay,
+)
+
+
+class FakeProducer:
+    """
+    Records sent messages; every send is acknowledged immediately.
+    """
+
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, topic, value=None, key=None, headers=None):
+        self.sent.append({'topic': topic, 'value': value, 'key': key, 'headers': dict(headers or [])})
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(None)
+        return future
+
+
+def make_message(offset, value, headers=()):
+    message = MagicMock()
+    message.offset = offset
+    message.value = value
+    message.key = b'user-1'
+    message.headers = list(headers)
+    return message
+
+
+def test_failures_are_classified():
+    assert classify_failure(ValueError("bad time")) == PERMANENT
+    assert classify_failure(TypeError("Expected a transaction object")) == PERMANENT
+    assert classify_failure(IntegrityError("INSERT", {}, Exception("check constraint"))) == PERMANENT
+    assert classify_failure(OperationalError("SELECT 1", {}, Exception("connection refused"))) == TRANSIENT
+    assert classify_failure(TimeoutError()) == TRANSIENT
+
+
+def test_retry_delay_doubles_per_attempt():
+    assert [retry_delay(attempt, base=5) for attempt in (1, 2, 3)] == [5, 10, 20]
+
+
+@pytest.mark.asyncio
+async def test_router_retries_transient_failures_with_backoff_then_dead_letters():
+    producer = FakeProducer()
+    router = FailureRouter(producer, max_attempts=2, backoff_base=5)
+    tp = TopicPartition('transactions', 3)
+    message = make_message(42, {'user_id': 'user-1', 'amount': 10}, [('x-trace', b'{"id":"t","ingest":1.0}')])
+
+    await router.route([(tp, message, OperationalError("INSERT", {}, Exception("connection refused")))])
+
+    retried = producer.sent[0]
+    assert retried['topic'] == 'transactions.retry.1'
+    assert json.loads(retried['value']) == message.value and retried['key'] == b'user-1'
+    assert retried['headers']['x-attempt'] == b'1'
+    assert retried['headers']['x-error-type'] == b'OperationalError'
+    assert (retried['headers']['x-origin-topic'], retried['headers']['x-origin-offset']) == (b'transactions', b'42')
+    assert retried['headers']['x-trace'] == b'{"id":"t","ingest":1.0}'  # Latency is still measured from the ingest
+
+    # The retried copy fails again in the retry topic, then once more after the last attempt
+    second = make_message(0, message.value, retried['headers'].items())
+    assert attempt_of(second) == 1 and not_before_of(second) > 0
+    await router.route([(TopicPartition('transactions.retry.1', 0), second, TimeoutError("statement timeout"))])
+    third = make_message(0, message.value, producer.sent[1]['headers'].items())
+    await router.route([(TopicPartition('transactions.retry.2', 0), third, TimeoutError("statement timeout"))])
+
+    assert [sent['topic'] for sent in producer.sent] == ['transactions.retry.1', 'transactions.retry.2', 'transactions.dlq']
+    dead = producer.sent[2]['headers']
+    assert dead['x-failure'] == b'transient'
+    # The origin is still the first delivery, not the retry topic
+    assert (dead['x-origin-topic'], dead['x-origin-partition'], dead['x-origin-offset']) == (b'transactions', b'3', b'42')
+
+
+@pytest.mark.asyncio
+async def test_router_dead_letters_permanent_failures_and_undeserializable_values():
+    producer = FakeProducer()
+    router = FailureRouter(producer)
+    tp = TopicPartition('transactions', 0)
+
+    await router.route([(tp, make_message(7, None), TypeError("Expected a transaction object, got NoneType"))])
+
+    sent = producer.sent[0]
+    assert sent['topic'] == 'transactions.dlq'
+    assert sent['value'] is None
+    assert sent['headers']['x-failure'] == b'permanent'
+    assert header(make_message(0, None, sent['headers'].items()), 'x-origin-offset') == '7'
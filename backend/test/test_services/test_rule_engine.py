@@ -0,0 +1,49 @@
+# test/test_rule_engine.py
+
+import pytest
+import yaml
+from app.services.rule_engine import compile_rules, load_rule_set, FRAUD, LEGIT, UNDECIDED
+
+RULES = yaml.safe_load("""
+rules:
+  - name: hard_limit
+    decision: fraud
+    when:
+      amount: {gte: 10000}
+  - name: trusted_small
+    decision: legit
+    when:
+      user_id: {in: [user_1, user_2]}
+      amount: {lt: 50}
+""")
+
+def make_transaction(amount, user_id='user_9', location='New York'):
+    return {'amount': amount, 'location': location, 'user_id': user_id, 'time': '2024-09-22T12:34:56'}
+
+def test_evaluate_batch():
+    rule_set = compile_rules(RULES)
+
+    decisions = rule_set.evaluate([
+        make_transaction(20000),
+        make_transaction(10, user_id='user_1'),
+        make_transaction(10, user_id='user_9'),
+        make_transaction(100, user_id='user_2'),
+    ])
+
+    assert list(decisions) == [FRAUD, LEGIT, UNDECIDED, UNDECIDED]
+
+def test_decide_single_transaction():
+    rule_set = compile_rules(RULES)
+
+    assert rule_set.decide(make_transaction(15000)) is True
+    assert rule_set.decide(make_transaction(5, user_id='user_2')) is False
+    assert rule_set.decide(make_transaction(500)) is None
+
+def test_invalid_rule_is_rejected():
+    with pytest.raises(ValueError):
+        compile_rules({'rules': [{'name': 'bad', 'decision': 'fraud', 'when': {'amount': {'approx': 1}}}]})
+
+def test_missing_rules_file_scores_everything(tmp_path):
+    rule_set = load_rule_set(str(tmp_path / 'missing.yaml'))
+
+    assert rule_set.decide(make_transaction(20000)) is None
@@ -0,0 +1,99 @@
+# test/test_tracing.py
+
+import json
+import time
+import pytest
+from unittest.mock import patch, MagicMock, AsyncMock
+from aiokafka import TopicPartition
+from prometheus_client import REGISTRY
+from app.consumers import kafka_consumer
+from app.utils import tracing
+from app.utils.tracing import TRACE_KEY, TraceExporter, hop_durations, start_trace, trace_headers
+from app.utils.websocket_manager import ClientConnection, Subscription, notify_clients, subscription_index
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_text(self, message):
+        self.sent.append(json.loads(message))
+
+
+def count(name, labels=None):
+    return REGISTRY.get_sample_value(name, labels or {}) or 0
+
+
+def test_hops_are_measured_between_stamped_stages():
+    trace = {"id": "t", "ingest": 100.0, "published": 100.01, "consumed": 100.5, "persisted": 100.52}
+    durations = hop_durations(trace)
+
+    assert set(durations) == {"ingest", "broker", "processing"}
+    assert durations["broker"] == pytest.approx(0.49)
+    # Clock skew between hosts never yields a negative hop
+    assert hop_durations({"persisted": 10.0, "notified": 9.5}) == {"delivery": 0.0}
+
+
+@pytest.mark.asyncio
+@patch('app.consumers.kafka_consumer.transaction_exists', return_value=False)
+@patch('app.consumers.kafka_consumer.score_transactions', return_value=[False])
+@patch('app.consumers.kafka_consumer.save_transactions_batch')
+async def test_trace_travels_from_the_kafka_headers_to_the_websocket_fan_out(mock_save_transactions, *_):
+    def save(rows, offsets, group_id, rejected=None):
+        for i, row in enumerate(rows, start=1):
+            row.id = i
+        return rows
+    mock_save_transactions.side_effect = save
+
+    kafka_consumer.bootstrap_consumer()
+    trace = start_trace()
+    trace["ingest"] -= 1  # Published 10ms after ingest, well before the consumer runs
+    tp = TopicPartition('transactions', 7)
+    message = MagicMock()
+    message.offset, message.timestamp = 50, int((trace["ingest"] + 0.01) * 1000)
+    message.headers = trace_headers(trace)
+    message.value = {'amount': 75, 'location': 'Houston', 'user_id': 'user-traced', 'time': '2024-09-22T12:34:56'}
+    consumer = MagicMock()
+    consumer.commit = AsyncMock()
+    bus = MagicMock()
+    bus.publish = AsyncMock()
+    broker_hops = count('transaction_hop_latency_seconds_count', {'hop': 'broker'})
+
+    with patch('app.consumers.kafka_consumer.get_event_bus', return_value=bus):
+        assert await kafka_consumer.process_batch(consumer, {tp: [message]}) is True
+
+    event = bus.publish.call_args_list[0].args[0]
+    stamped = event[TRACE_KEY]
+    assert stamped["id"] == trace["id"]
+    assert stamped["ingest"] <= stamped["published"] <= stamped["consumed"] <= stamped["persisted"]
+    assert count('transaction_hop_latency_seconds_count', {'hop': 'broker'}) == broker_hops + 1
+
+    # The API process observes the delivery and does not forward the trace to clients
+    connection = ClientConnection(FakeWebSocket(), Subscription(user_ids=['user-traced']))
+    subscription_index.add(connection)
+    delivered = count('transaction_e2e_latency_seconds_count')
+    try:
+        await notify_clients(event)
+    finally:
+        subscription_index.remove(connection)
+
+    assert connection.websocket.sent[0]["user_id"] == 'user-traced'
+    assert TRACE_KEY not in connection.websocket.sent[0]
+    assert count('transaction_e2e_latency_seconds_count') == delivered + 1
+
+
+def test_sampled_traces_are_exported_as_json_lines(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    now = time.time()
+    trace = {"id": "t1", "ingest": now - 0.2, "published": now - 0.19, "consumed": now - 0.1, "persisted": now - 0.05}
+
+    with patch.object(tracing, 'trace_exporter', TraceExporter(str(path), sample_rate=1.0)):
+        tracing.record_delivered(trace, notified=now)
+    with patch.object(tracing, 'trace_exporter', TraceExporter(str(path), sample_rate=0.0)):
+        tracing.record_delivered(dict(trace, id="t2"), notified=now)
+
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [record["id"] for record in records] == ["t1"]
+    assert records[0]["e2e"] == pytest.approx(0.2)
+    assert records[0]["hops"]["delivery"] == pytest.approx(0.05)
+    assert list(records[0]["stages"]) == ["ingest", "published", "consumed", "persisted", "notified"]
@@ -0,0 +1,56 @@
+# test/test_train_fraud_model.py
+
+import json
+import pickle
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from app.fraud_detection.train_fraud_model import select_model, train_model
+
+
+def result(accuracy, single_p99, batch_p99=1.0, artifact_bytes=1000):
+    return {"accuracy": accuracy, "single_row": {"p50_ms": single_p99 / 2, "p99_ms": single_p99},
+            "batch": {"p50_ms": batch_p99 / 2, "p99_ms": batch_p99}, "artifact_bytes": artifact_bytes}
+
+
+def test_most_accurate_candidate_within_the_budget_is_selected():
+    results = {
+        "big_forest": result(0.95, single_p99=25.0),
+        "small_forest": result(0.90, single_p99=4.0, artifact_bytes=5000),
+        "linear": result(0.90, single_p99=0.2),
+        "boosting": result(0.93, single_p99=6.0, batch_p99=300.0),
+    }
+
+    # Ties on accuracy go to the faster candidate
+    assert select_model(results, latency_budget_ms=10) == "boosting"
+    assert select_model(results, latency_budget_ms=10, batch_latency_budget_ms=100) == "linear"
+    assert select_model(results, latency_budget_ms=50) == "big_forest"
+    assert select_model(results, latency_budget_ms=0.1) is None
+
+
+def test_training_writes_the_selected_model_and_the_report(tmp_path):
+    candidates = {
+        "random_forest_5": RandomForestClassifier(n_estimators=5, random_state=42),
+        "logistic_regression": LogisticRegression(max_iter=1000),
+    }
+
+    selected = train_model(output_dir=str(tmp_path), candidates=candidates, latency_budget_ms=1000,
+                           batch_latency_budget_ms=0, repeats=20)
+
+    report = json.loads((tmp_path / "model_selection_report.json").read_text())
+    assert report["selected"] == selected
+    assert set(report["candidates"]) == set(candidates)
+    for measured in report["candidates"].values():
+        assert 0 <= measured["accuracy"] <= 1
+        assert 0 < measured["single_row"]["p50_ms"] <= measured["single_row"]["p99_ms"]
+        assert measured["batch"]["p99_ms"] > 0 and measured["artifact_bytes"] > 0 and measured["memory_bytes"] > 0
+    with open(tmp_path / "fraud_detection_model.pkl", "rb") as model_file:
+        assert type(pickle.load(model_file)) is type(candidates[selected])
+    assert (tmp_path / "scaler.pkl").exists()
+
+    # Nothing is replaced when no candidate fits
+    (tmp_path / "fraud_detection_model.pkl").unlink()
+    with pytest.raises(RuntimeError):
+        train_model(output_dir=str(tmp_path), candidates=candidates, latency_budget_ms=0.000001, repeats=20)
+    assert not (tmp_path / "fraud_detection_model.pkl").exists()
+    assert json.loads((tmp_path / "model_selection_report.json").read_text())["selected"] is None
@@ -0,0 +1,96 @@
+# test/test_transaction_buffer.py
+
+from datetime import datetime, timedelta
+import pytest
+from app.utils.transaction_buffer import TransactionRingBuffer, observe_transactions
+from app.utils.response_cache import DATA_VERSION_KEY
+
+
+def event(id, is_fraud=False, user_id=None, location="Chicago"):
+    return {
+        "id": id,
+        "amount": float(id),
+        "location": location,
+        "user_id": user_id or f"user_{id}",
+        "time": (datetime(2024, 9, 22) + timedelta(minutes=id)).isoformat(),
+        "is_fraud": is_fraud,
+        "idempotency_key": f"key-{id}",
+    }
+
+
+def ids(rows):
+    return [row["id"] for row in rows]
+
+
+def test_cold_buffer_falls_back_until_warmed():
+    buffer = TransactionRingBuffer(capacity=10)
+    buffer.append([event(1), event(2)])
+    assert buffer.query(limit=1) is None
+
+    buffer.warm_up([event(1), event(2)], complete=True)
+    assert buffer.query(limit=1) == [event(2)]
+    assert ids(buffer.query()) == [1, 2]
+
+
+def test_latest_since_and_fraud_only_queries():
+    buffer = TransactionRingBuffer(capacity=10)
+    buffer.warm_up([event(i, is_fraud=i % 3 == 0) for i in range(1, 8)], complete=True)
+
+    assert ids(buffer.query(limit=3)) == [5, 6, 7]
+    assert ids(buffer.query(since_id=4)) == [5, 6, 7]
+    assert ids(buffer.query(fraud_only=True)) == [3, 6]
+    assert ids(buffer.query(limit=1, fraud_only=True)) == [6]
+    assert ids(buffer.query(limit=5, since_id=5)) == [6, 7]
+
+
+def test_ranges_below_the_floor_fall_back():
+    buffer = TransactionRingBuffer(capacity=4)
+    # Only the latest rows of a larger table were loaded
+    buffer.warm_up([event(i) for i in range(7, 11)], complete=False)
+    assert buffer.floor == 6
+
+    assert ids(buffer.query(limit=4)) == [7, 8, 9, 10]
+    assert buffer.query(limit=5) is None  # Needs row 6 or older
+    assert buffer.query(since_id=5) is None
+    assert buffer.query() is None  # The whole history
+
+    # New rows overwrite the oldest slots and raise the floor
+    buffer.append([event(11), event(12)])
+    assert buffer.floor == 8
+    assert ids(buffer.query(since_id=8)) == [9, 10, 11, 12]
+    assert buffer.query(since_id=7) is None
+
+
+def test_duplicate_events_and_warm_up_merge():
+    buffer = TransactionRingBuffer(capacity=10)
+    buffer.append([event(3), event(3)])
+    buffer.warm_up([event(1), event(2), event(3)], complete=True)
+    buffer.append([event(2), event(4)])
+
+    assert ids(buffer.query()) == [1, 2, 3, 4]
+
+
+def test_buffer_asks_for_a_resync():
+    buffer = TransactionRingBuffer(capacity=10, resync_seconds=0)
+    buffer.warm_up([event(1)], complete=True)
+    assert not buffer.warm
+    assert buffer.query(limit=1) is None
+
+
+def test_interned_values_are_compacted():
+    buffer = TransactionRingBuffer(capacity=2)
+    buffer.warm_up([], complete=True)
+    buffer.append([event(i) for i in range(1, 20)])
+
+    assert len(buffer.users) <= 2 * buffer.capacity
+    assert [row["user_id"] for row in buffer.query(since_id=17)] == ["user_18", "user_19"]
+
+
+@pytest.mark.asyncio
+async def test_subscriber_ignores_data_version_events():
+    from app.utils.transaction_buffer import transaction_buffer
+    transaction_buffer.clear()
+    await observe_transactions({DATA_VERSION_KEY: 1})
+    await observe_transactions(event(1))
+    assert transaction_buffer.size == 1
+    transaction_buffer.clear()
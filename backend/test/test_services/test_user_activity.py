@@ -0,0 +1,114 @@
+# test/test_user_activity.py
+
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import patch, MagicMock
+from aiokafka import TopicPartition
+from kafka.partitioner.default import DefaultPartitioner
+from app.consumers import kafka_consumer
+from app.consumers.kafka_consumer import OffsetSeekListener
+from app.utils.preprocessing import preprocess_transactions
+from app.utils.user_activity import UserActivityStore, partition_for_user
+
+NOW = datetime(2024, 9, 22, 12, 0, 0)
+PARTITIONS = 4
+
+
+def users_by_partition():
+    # A few user ids for every partition
+    users = {}
+    for i in range(100):
+        users.setdefault(partition_for_user(f"user_{i}", PARTITIONS), []).append(f"user_{i}")
+    return users
+
+
+def test_partition_matches_the_producer_partitioner():
+    for user_id in ("user_1", "user_42", "ünïcode"):
+        expected = DefaultPartitioner()(user_id.encode('utf-8'), list(range(PARTITIONS)), list(range(PARTITIONS)))
+        assert partition_for_user(user_id, PARTITIONS) == expected
+
+
+def test_store_answers_frequency_for_owned_users_only():
+    users = users_by_partition()
+    owned, other = users[0][0], users[1][0]
+    since = NOW - timedelta(hours=24)
+    rows = [
+        (owned, NOW - timedelta(hours=30)),  # Outside the window of a transaction at NOW
+        (owned, NOW - timedelta(hours=2)),
+        (owned, NOW - timedelta(hours=1)),
+        (other, NOW - timedelta(hours=1)),
+    ]
+    store = UserActivityStore()
+    store.load([0], PARTITIONS, rows, since - timedelta(hours=12))
+
+    assert store.frequency(owned, NOW) == 2
+    assert other not in store.times
+    assert store.frequency(other, NOW) is None  # Partition 1 is not owned: ask the database
+
+    store.record(owned, NOW)
+    store.record(other, NOW)  # Ignored
+    assert store.frequency(owned, NOW) == 3
+    assert other not in store.times
+
+    # A transaction whose window starts before the loaded range cannot be answered from memory
+    assert store.frequency(owned, NOW - timedelta(hours=20)) is None
+
+
+def test_drop_and_prune_forget_users():
+    users = users_by_partition()
+    first, second = users[0][0], users[2][0]
+    store = UserActivityStore()
+    store.load([0, 2], PARTITIONS, [(first, NOW - timedelta(hours=1)), (second, NOW - timedelta(hours=3))],
+               NOW - timedelta(hours=24))
+
+    store.drop([2])
+    assert store.frequency(second, NOW) is None
+    assert second not in store.times
+
+    store.prune(now=NOW + timedelta(hours=23, minutes=30))
+    assert first not in store.times
+    # The window now starts where the pruned data ended
+    assert store.frequency(first, NOW + timedelta(hours=24)) == 0
+    assert store.frequency(first, NOW + timedelta(hours=23)) is None
+
+
+@patch('app.utils.preprocessing.get_transaction_frequency', return_value=7)
+@patch('app.utils.preprocessing.SessionLocal')
+def test_preprocessing_uses_the_store_before_the_database(mock_session, mock_db_frequency):
+    users = users_by_partition()
+    owned, other = users[0][0], users[1][0]
+    store = UserActivityStore()
+    store.load([0], PARTITIONS, [(owned, NOW - timedelta(hours=1))], NOW - timedelta(hours=48))
+
+    transactions = [
+        {'user_id': owned, 'amount': 10.0, 'location': 'Chicago', 'time': NOW.isoformat()},
+        {'user_id': other, 'amount': 10.0, 'location': 'Chicago', 'time': NOW.isoformat()},
+    ]
+    with patch('app.utils.preprocessing.load_scaler') as mock_scaler:
+        mock_scaler().transform.side_effect = lambda X: X
+        features = preprocess_transactions(transactions, store)
+
+    assert features[0][1] == 1  # From memory
+    assert features[1][1] == 7  # From the database
+    mock_db_frequency.assert_called_once()
+
+
+@pytest.mark.asyncio
+@patch('app.consumers.kafka_consumer.recent_idempotency_keys', return_value=[])
+@patch('app.consumers.kafka_consumer.get_committed_offsets', return_value={})
+@patch('app.consumers.kafka_consumer.recent_user_activity')
+async def test_rebalance_loads_and_drops_partition_users(mock_recent_activity, mock_offsets, mock_keys):
+    users = users_by_partition()
+    mock_recent_activity.return_value = [(users[0][0], datetime.utcnow()), (users[3][0], datetime.utcnow())]
+    consumer = MagicMock()
+    consumer.partitions_for_topic.return_value = set(range(PARTITIONS))
+    listener = OffsetSeekListener(consumer, 'transaction-consumers')
+
+    with patch.object(kafka_consumer, 'user_activity', UserActivityStore()) as store:
+        await listener.on_partitions_assigned([TopicPartition('transactions', 0)])
+        assert set(store.times) == {users[0][0]}
+        assert store.owns(users[0][0]) and not store.owns(users[3][0])
+
+        await listener.on_partitions_revoked([TopicPartition('transactions', 0)])
+        assert store.times == {}
+        assert not store.owns(users[0][0])
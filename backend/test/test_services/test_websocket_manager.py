@@ -0,0 +1,141 @@
+# test/test_websocket_manager.py
+
+import asyncio
+import json
+from datetime import datetime
+import pytest
+from unittest.mock import MagicMock
+from fastapi import WebSocketDisconnect
+from fastapi.testclient import TestClient
+from app.main import app
+from app.routes.transaction import get_db
+from app.utils.models import Transaction
+from app.utils.transaction_buffer import transaction_buffer
+from app.utils.websocket_manager import (
+    ClientConnection,
+    CoalescingPolicy,
+    Subscription,
+    SubscriptionIndex,
+    notify_clients,
+    subscription_index,
+)
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+        self.frames = 0
+
+    async def send_text(self, message):
+        self.frames += 1
+        self.sent.append(json.loads(message))
+
+
+def make_event(user_id='user_1', location='Chicago', is_fraud=False):
+    return {"id": 1, "amount": 10.0, "location": location, "user_id": user_id,
+            "time": "2024-09-22T12:34:56", "is_fraud": is_fraud}
+
+
+def test_index_matches_on_all_filters():
+    index = SubscriptionIndex()
+    everyone = ClientConnection(FakeWebSocket())
+    fraud_only = ClientConnection(FakeWebSocket(), Subscription(fraud_only=True))
+    user_1 = ClientConnection(FakeWebSocket(), Subscription(user_ids=['user_1']))
+    user_1_fraud = ClientConnection(FakeWebSocket(), Subscription(user_ids=['user_1'], fraud_only=True))
+    chicago = ClientConnection(FakeWebSocket(), Subscription(locations=['Chicago']))
+    for connection in (everyone, fraud_only, user_1, user_1_fraud, chicago):
+        index.add(connection)
+
+    assert set(index.match(make_event())) == {everyone, user_1, chicago}
+    assert set(index.match(make_event(is_fraud=True))) == {everyone, fraud_only, user_1, user_1_fraud, chicago}
+    assert set(index.match(make_event(user_id='user_2', location='Houston'))) == {everyone}
+
+    index.update(everyone, Subscription(locations=['Houston']))
+    index.remove(chicago)
+    assert set(index.match(make_event(user_id='user_2', location='Houston'))) == {everyone}
+    assert index.match(make_event(user_id='user_2', location='Chicago')) == []
+    assert 'Chicago' not in index.by_location
+
+
+@pytest.mark.asyncio
+async def test_notify_clients_only_sends_to_matching_subscribers():
+    matching = ClientConnection(FakeWebSocket(), Subscription(user_ids=['user_7']))
+    other = ClientConnection(FakeWebSocket(), Subscription(user_ids=['user_8']))
+    subscription_index.add(matching)
+    subscription_index.add(other)
+    try:
+        await notify_clients(make_event(user_id='user_7'))
+    finally:
+        subscription_index.remove(matching)
+        subscription_index.remove(other)
+
+    assert matching.websocket.sent == [make_event(user_id='user_7')]
+    assert other.websocket.sent == []
+
+
+def test_websocket_subscription_handshake(test_db):
+    test_db.add_all([
+        Transaction(amount=10.0, location='Chicago', user_id='user_1', time=datetime(2024, 9, 22, 12), is_fraud=False),
+        Transaction(amount=20.0, location='Houston', user_id='user_2', time=datetime(2024, 9, 22, 13), is_fraud=True),
+    ])
+    test_db.commit()
+    app.dependency_overrides[get_db] = lambda: test_db
+    try:
+        with TestClient(app).websocket_connect("/api/ws?user_ids=user_1") as websocket:
+            snapshot = websocket.receive_json()
+            websocket.send_json({"user_ids": ["user_1"], "fraud_only": True})
+            ack = websocket.receive_json()
+    finally:
+        app.dependency_overrides.clear()
+        transaction_buffer.clear()
+
+    # The initial subscription filters the history: user_2's transaction is not sent
+    assert snapshot["user_id"] == 'user_1'
+    assert ack == {"type": "subscribed", "filters": {"user_ids": ["user_1"], "locations": None, "fraud_only": True}}
+    assert len(subscription_index) == 0
+
+
+def test_websocket_closes_with_internal_error_when_snapshot_fails():
+    broken_db = MagicMock()
+    broken_db.query.side_effect = RuntimeError("database unavailable")
+    app.dependency_overrides[get_db] = lambda: broken_db
+    transaction_buffer.clear()  # A cold buffer reads the snapshot from the database
+    try:
+        with TestClient(app).websocket_connect("/api/ws") as websocket:
+            with pytest.raises(WebSocketDisconnect) as excinfo:
+                websocket.receive_json()
+    finally:
+        app.dependency_overrides.clear()
+
+    assert excinfo.value.code == 1011
+
+
+@pytest.mark.asyncio
+async def test_coalescing_client_receives_array_frames():
+    connection = ClientConnection(FakeWebSocket(), coalescing=CoalescingPolicy(interval_ms=20, max_events=3))
+    connection.start()
+    try:
+        for user_id in ('user_1', 'user_2', 'user_3', 'user_4'):
+            await connection.send(json.dumps(make_event(user_id=user_id)))
+        await asyncio.sleep(0.1)
+    finally:
+        connection.stop()
+
+    # Frames hold at most coalesce_max events
+    assert connection.websocket.frames == 2
+    assert [[event['user_id'] for event in frame] for frame in connection.websocket.sent] == [
+        ['user_1', 'user_2', 'user_3'], ['user_4']]
+
+
+def test_invalid_coalescing_parameters_are_rejected():
+    with pytest.raises(ValueError):
+        CoalescingPolicy.from_query_params({"coalesce_ms": "soon"})
+    with pytest.raises(ValueError):
+        CoalescingPolicy.from_query_params({"coalesce_max": "0"})
+    assert CoalescingPolicy.from_query_params({}) is None
+    assert CoalescingPolicy.from_query_params({"coalesce_max": "50"}).max_events == 50
+
+    with pytest.raises(WebSocketDisconnect) as excinfo:
+        with TestClient(app).websocket_connect("/api/ws?coalesce_ms=soon"):
+            pass
+    assert excinfo.value.code == 1008